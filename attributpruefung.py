@@ -13,7 +13,7 @@ def check_missing_fields(
     Diese Funktion prueft, ob alle Pflichtfelder vorhanden sind
     This function checks if all required fields are present
     :param str layer_key
-    :param QgsVectorLayer layer
+    :param featureStore layer
     :param dict pflichtfelder
     :param str feldname_gross_klein_ignorieren
     :return: list missing_fields
@@ -40,7 +40,7 @@ def handle_test_missing_fields(
     Diese Funktion fuegt die fehlenden Felder in das report_dict ein
     This function adds the missing fields to the report_dict
     :param str layer_key
-    :param QgsVectorLayer layer
+    :param featureStore layer
     :param layerReport report_object
     :param dict pflichtfelder
     :param dict params_processing
@@ -67,15 +67,17 @@ def handle_tests_attributes(
     layer_key,
     layer,
     report_object,
-    params_processing
+    params_processing,
+    pipeline
 ):
     """
-    Fuehrt die Attributpruefungen durch
-    This function performs the attribute tests
+    Registriert die Attributpruefungen in der Pipeline des Layers
+    This function registers the attribute tests
     :param str layer_key
-    :param QgsVectorLayer layer
+    :param featureStore layer
     :param layerReport report_object
     :param dict params_processing
+    :param layerPipeline pipeline
     """
     missing_fields = report_object.get_report_entry([
        layer_key,
@@ -96,101 +98,133 @@ def handle_tests_attributes(
             + 'Der Attributtest für dieses Feld wird übersprungen'
         )
     else:
-        feedback.setProgressText('-- Attribute')
         check_primary_and_foreign_key(
             layer_key,
-            layer,
             ereign_gew_id_field,
             report_object,
             params_processing,
-            feedback
+            pipeline
         )
 
 
 def check_primary_and_foreign_key(
     layer_key,
-    layer,
     ereign_gew_id_field,
     report_object,
     params_processing,
-    feedback
+    pipeline
 ):
     """
     Pruef korrekt primary keys bei Gewaessern und foreign keys bei Ereignissen
     :param str layer_key
-    :param QgsVectorLayer layer
     :param str ereign_gew_id_field
     :param layerReport report_object
     :param dict params_processing
-    :param QgsProcessingFeedback feedback
+    :param layerPipeline pipeline
     """
-    layer_steps = params_processing['layer_dict'][layer_key]['steps']
     if layer_key == 'gewaesser':
-        list_primary_key_empty = []
-        prim_key_dict = {}
-        for i, feature in enumerate(layer.getFeatures()):
-            feedback.setProgress(int((i+1) * layer_steps))
-            if feedback.isCanceled():
-                break
-            ft_key = feature.attribute(ereign_gew_id_field)
-            if ft_key in params_processing['emptystrdef']:
-                # fehlender Primaerschluessel
-                list_primary_key_empty.append(feature.id())
+        visitor = primaryKeyVisitor(
+            layer_key,
+            ereign_gew_id_field,
+            report_object,
+            params_processing
+        )
+    else:  # Attributtest für Ereignisse
+        if params_processing['gew_primary_key_missing']:
+            params_processing['feedback'].pushWarning(
+                'Die Zuordnung der Ereignisse über den Gewässernamen kann '
+                + 'nicht geprüft werden, weil das Feld \"'
+                + ereign_gew_id_field
+                + '\" im Gewässerlayer fehlt.'
+            )
+            return
+        visitor = foreignKeyVisitor(
+            layer_key,
+            ereign_gew_id_field,
+            report_object,
+            params_processing
+        )
+    pipeline.register('-- Attribute', visitor.visit, visitor.finish)
+
+
+class primaryKeyVisitor:
+    """
+    Prueft fehlende und mehrfache Primaerschluessel im Gewaesserlayer
+    """
+    def __init__(self, layer_key, ereign_gew_id_field, report_object, params_processing):
+        self.layer_key = layer_key
+        self.ereign_gew_id_field = ereign_gew_id_field
+        self.report_object = report_object
+        self.emptystrdef = params_processing['emptystrdef']
+        self.list_primary_key_empty = []
+        self.prim_key_dict = {}
+
+    def visit(self, feature):
+        ft_key = feature.attribute(self.ereign_gew_id_field)
+        if ft_key in self.emptystrdef:
+            # fehlender Primaerschluessel
+            self.list_primary_key_empty.append(feature.id())
+        else:
+            # mehrfache Primaerschluessel ? -> Liste an eindeutigen keys
+            if ft_key in self.prim_key_dict.keys():
+                self.prim_key_dict[ft_key].append(feature.id())
             else:
-                # mehrfache Primaerschluessel ? -> Liste an eindeutigen keys
-                if ft_key in prim_key_dict.keys():
-                    prim_key_dict[ft_key].append(feature.id())
-                else:
-                    prim_key_dict[ft_key] = [feature.id()]
+                self.prim_key_dict[ft_key] = [feature.id()]
+
+    def finish(self):
         list_primary_key_duplicat = [
-            lst for lst in prim_key_dict.values() if len(lst) > 1
+            lst for lst in self.prim_key_dict.values() if len(lst) > 1
         ]
-        report_object.add_attribute_entry(
-            layer_key,
+        self.report_object.add_attribute_entry(
+            self.layer_key,
             'primary_key_empty',
-            list_primary_key_empty
+            self.list_primary_key_empty
         )
-        report_object.add_attribute_entry(
-            layer_key,
+        self.report_object.add_attribute_entry(
+            self.layer_key,
             'primary_key_duplicat',
             list_primary_key_duplicat
         )
 
-    else:  # Attributtest für Ereignisse
-        list_gew_key_empty = []
-        list_gew_key_invalid = []
+
+class foreignKeyVisitor:
+    """
+    Prueft fehlende und ungueltige Gewaesserschluessel bei Ereignissen
+    """
+    def __init__(self, layer_key, ereign_gew_id_field, report_object, params_processing):
+        self.layer_key = layer_key
+        self.ereign_gew_id_field = ereign_gew_id_field
+        self.report_object = report_object
+        self.emptystrdef = params_processing['emptystrdef']
         layer_gew = params_processing['layer_dict']['gewaesser']['layer']
-        if params_processing['gew_primary_key_missing']:
-            feedback.pushWarning(
-                'Die Zuordnung der Ereignisse über den Gewässernamen kann '
-                + 'nicht geprüft werden, weil das Feld \"'
-                + ereign_gew_id_field
-                + '\" im Gewässerlayer fehlt.'
-            )
+        # Menge der vergebenen Gewaesserschluessel (ohne NULL, nicht hashbar)
+        self.gew_keys = set()
+        for gew_id in layer_gew.ids():
+            gew_key = layer_gew.attribute(gew_id, ereign_gew_id_field)
+            if not gew_key in self.emptystrdef:
+                self.gew_keys.add(gew_key)
+        self.list_gew_key_empty = []
+        self.list_gew_key_invalid = []
+
+    def visit(self, feature):
+        ft_key = feature.attribute(self.ereign_gew_id_field)
+        if ft_key in self.emptystrdef:
+            # fehlender Gewaesserschluessel
+            self.list_gew_key_empty.append(feature.id())
         else:
-            list_gew_keys = [
-                gew_ft.attribute(ereign_gew_id_field) for gew_ft in layer_gew.getFeatures()
-            ]
-            for i, feature in enumerate(layer.getFeatures()):
-                feedback.setProgress(int((i+1) * layer_steps))
-                if feedback.isCanceled():
-                    break
-                ft_key = feature.attribute(ereign_gew_id_field)
-                if ft_key in params_processing['emptystrdef']:
-                    # fehlender Gewaesserschluessel
-                    list_gew_key_empty.append(feature.id())
-                else:
-                    if not ft_key in list_gew_keys:
-                        # Der angegebene Gewaesserschluessel(=Gewaessername)
-                        # ist nicht im Gewaesserlayer vergeben
-                        list_gew_key_invalid.append(feature.id())
-            report_object.add_attribute_entry(
-                layer_key,
-                'gew_key_empty',
-                list_gew_key_empty
-            )
-            report_object.add_attribute_entry(
-                layer_key,
-                'gew_key_invalid',
-                list_gew_key_invalid
-            )
\ No newline at end of file
+            if not ft_key in self.gew_keys:
+                # Der angegebene Gewaesserschluessel(=Gewaessername)
+                # ist nicht im Gewaesserlayer vergeben
+                self.list_gew_key_invalid.append(feature.id())
+
+    def finish(self):
+        self.report_object.add_attribute_entry(
+            self.layer_key,
+            'gew_key_empty',
+            self.list_gew_key_empty
+        )
+        self.report_object.add_attribute_entry(
+            self.layer_key,
+            'gew_key_invalid',
+            self.list_gew_key_invalid
+        )
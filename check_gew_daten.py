@@ -41,8 +41,13 @@ from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingException,
     QgsProcessingOutputFile,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
     QgsProcessingParameterFileDestination,
-    QgsProcessingParameterVectorLayer
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterVectorLayer,
+    QgsFeatureRequest,
+    QgsVectorLayerFeatureSource
 )
 
 from .attributpruefung import (
@@ -51,8 +56,7 @@ from .attributpruefung import (
 )
 
 from .check_gew_report import (
-    create_layers_from_report_dict,
-    save_layer_to_file,
+    gpkgReportWriter,
     layerReport
 )
 
@@ -62,20 +66,49 @@ from .config_tools import (
 )
 
 from .defaults import (
+    duplikate_modus,
     file_config_user,
+    kachelgroesse_inkrementell,
     output_layer_prefixes
 )
 
 from .geometriepruefungen import (
+    get_gew_collection,
     handle_tests_single_geometries,
     handle_tests_geoms_comparisons
 )
 
+from .kachel_pruefung import prozessPool
+
+from .inkrementell import (
+    delete_kacheln,
+    get_fingerprint_table,
+    get_geaenderte_kacheln,
+    get_pruefparameter,
+    handle_fingerprints,
+    open_report_inkrementell,
+    save_fingerprints
+)
+
+from .kachelung import run_kachel_pruefung
+
+from .pruefpipeline import (
+    layerPipeline,
+    run_parallel
+)
+
 from .hilfsfunktionen import (
     simpleTimeStepLogger,
     handle_rl_and_dl
 )
 
+from .layer_cache import (
+    featureStore,
+    spatialIndexRegistry
+)
+
+from .stationierung_index import get_stationierung_index
+
 class checkGewaesserDaten(QgsProcessingAlgorithm):
     """
     Prueft Gewaesserdaten
@@ -87,6 +120,12 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
     LAYER_SCHAECHTE = 'LAYER_SCHAECHTE'
     REPORT = 'REPORT'
     REPORT_OUT = 'REPORT_OUT'
+    DUPLIKATE_RICHTUNG = 'DUPLIKATE_RICHTUNG'
+    SEGMENT_INDEX = 'SEGMENT_INDEX'
+    PARALLEL = 'PARALLEL'
+    PROZESSE = 'PROZESSE'
+    KACHELGROESSE = 'KACHELGROESSE'
+    INKREMENTELL = 'INKREMENTELL'
     
     if (int(Qgis.version().split('.')[0]) == 3 and int(Qgis.version().split('.')[1]) >= 36) or (int(Qgis.version().split('.')[0]) > 3):
         newer_qgis_version = True
@@ -156,6 +195,69 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
                 'Geopackage (*.gpkg)'                #'Textdatei (*.txt)',
             )
         )
+
+        # Erweiterte Parameter
+        param_duplikate_richtung = QgsProcessingParameterBoolean(
+            self.DUPLIKATE_RICHTUNG,
+            self.tr('Duplikate: Linien mit umgekehrter Stützpunktreihenfolge als Duplikate werten'),
+            defaultValue=False
+        )
+        param_duplikate_richtung.setFlags(
+            param_duplikate_richtung.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_duplikate_richtung)
+        param_segment_index = QgsProcessingParameterBoolean(
+            self.SEGMENT_INDEX,
+            self.tr('Spatial Index auf Ebene der Liniensegmente (für sehr lange Gewässerlinien)'),
+            defaultValue=False
+        )
+        param_segment_index.setFlags(
+            param_segment_index.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_segment_index)
+        param_parallel = QgsProcessingParameterBoolean(
+            self.PARALLEL,
+            self.tr('Layer parallel prüfen (Ereignislayer nach den Gewässern gleichzeitig)'),
+            defaultValue=False
+        )
+        param_parallel.setFlags(
+            param_parallel.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_parallel)
+        param_prozesse = QgsProcessingParameterNumber(
+            self.PROZESSE,
+            self.tr('Anzahl der Prozesse für Geometrieprüfungen in Kacheln (0: ohne Prozess-Pool)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=0,
+            minValue=0
+        )
+        param_prozesse.setFlags(
+            param_prozesse.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_prozesse)
+        param_kachelgroesse = QgsProcessingParameterNumber(
+            self.KACHELGROESSE,
+            self.tr('Kachelgröße in m für sehr große Datensätze (0: ohne Kacheln)'),
+            type=QgsProcessingParameterNumber.Double,
+            defaultValue=0,
+            minValue=0
+        )
+        param_kachelgroesse.setFlags(
+            param_kachelgroesse.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_kachelgroesse)
+        param_inkrementell = QgsProcessingParameterBoolean(
+            self.INKREMENTELL,
+            self.tr(
+                'Inkrementell prüfen: nur geänderte Objekte und ihre Umgebung neu prüfen '
+                + '(die Reportdatei der letzten Prüfung wird aktualisiert)'
+            ),
+            defaultValue=False
+        )
+        param_inkrementell.setFlags(
+            param_inkrementell.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(param_inkrementell)
         if not self.newer_qgis_version:
             self.addOutput(
                 QgsProcessingOutputFile(
@@ -181,12 +283,26 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
         layer_wehre = self.parameterAsVectorLayer(parameters, self.LAYER_WEHRE, context)
         layer_schaechte = self.parameterAsVectorLayer(parameters, self.LAYER_SCHAECHTE, context)
         reportdatei = self.parameterAsString(parameters, self.REPORT, context)
+        duplikate_richtung_ignorieren = self.parameterAsBool(parameters, self.DUPLIKATE_RICHTUNG, context)
+        segment_index = self.parameterAsBool(parameters, self.SEGMENT_INDEX, context)
+        parallel = self.parameterAsBool(parameters, self.PARALLEL, context)
+        n_prozesse = self.parameterAsInt(parameters, self.PROZESSE, context)
+        kachelgroesse = self.parameterAsDouble(parameters, self.KACHELGROESSE, context)
+        inkrementell = self.parameterAsBool(parameters, self.INKREMENTELL, context)
+        if inkrementell and kachelgroesse == 0:
+            # die inkrementelle Pruefung verwendet die Kacheln
+            kachelgroesse = kachelgroesse_inkrementell
+        if kachelgroesse > 0:
+            # in Kacheln werden die Layer nacheinander geprueft
+            parallel = False
 
 
         # Zusammenfassendes dictionary fuer Prozessparameter, die an Funktionen uebergeben werden
         feedback.setProgressText('Vorbereitung der Tests')
         layer_dict = {}
+        dict_layers = {}  # {layer_key: QgsVectorLayer}, fuer die Pruefung in Kacheln
         list_crs = []
+        dict_load_tasks = {}  # nur bei paralleler Pruefung: {layer_key: function(feedback)}
         list_layer_types = [
             'gewaesser',
             'rohrleitungen',
@@ -205,14 +321,32 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
             ]
         ):
             if layer:
+                dict_layers[layer_key] = layer
                 list_crs.append(layer.crs().authid())
                 ft_count = layer.featureCount() if layer.featureCount() else 0
                 layer_steps = 100.0/ft_count if ft_count != 0 else 0
                 layer_dict[layer_key] = {
-                    'layer': layer,
+                    'layer': None,
                     'count': ft_count,
                     'steps': layer_steps
                 }
+                if parallel:
+                    # die FeatureSource wird hier erstellt und im Thread gelesen
+                    dict_load_tasks[layer_key] = (
+                        lambda worker_feedback, layer=layer, source=QgsVectorLayerFeatureSource(layer):
+                        featureStore(layer, worker_feedback, source)
+                    )
+                elif kachelgroesse > 0:
+                    # nur Attribute; die Geometrien werden je Kachel geladen
+                    layer_dict[layer_key]['layer'] = featureStore(
+                        layer,
+                        feedback,
+                        request=QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+                    )
+                else:
+                    layer_dict[layer_key]['layer'] = featureStore(layer, feedback)  # einmalig geladen, ersetzt den QgsVectorLayer
+        for layer_key, store in run_parallel(dict_load_tasks, feedback).items():
+            layer_dict[layer_key]['layer'] = store
         if len(set(list_crs)) == 1:
             crs_out = list_crs[0]  # fuer die Ergebnisausgabe
         else:
@@ -220,148 +354,290 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
                 'Alle Layer müssen im gleichen Koordinatenbezugssystem gespeichert sein!'
             )
 
-        # Dictionary fuer immer wiederkehrende Parameter
-        # User config laden
-        user_config_dict = get_config_from_json(file_config_user)
-        params_processing = {
-            'layer_dict': layer_dict,  # zu pruefende Layer
-            'feedback': feedback,  # QgsProcessingFeedback fuer Statusinfos waehrend des Durchlaufs
-            'ereign_gew_id_field': user_config_dict['check_layer_defaults']['primaerschluessel_gew'],  # Name des Felds mit dem Primaerschluessel: "gu_cd" oder "ba_cd"
-            'feldname_gross_klein_ignorieren': user_config_dict['check_layer_defaults']['feldname_gross_klein_ignorieren'],
-            'gew_primary_key_missing': False,
-            'field_merged_id': 'merged_id',  # Feldname fuer neue ID, wenn rl und dl vorhanden
-            'emptystrdef': [NULL, ''],  # moegliche "Leer"-Definitionen für Zeichenketten
-            'n_layer': len(layer_dict) # Anzahl der zu bearbeitenden Layer
-        }
-
-        # dictionary fuer Feedback / Fehlermeldungen
-        report_object = layerReport(layer_dict)
-
-        # rl und dl zusammenfassen fuer gemeinsame Auswertung, wenn beide vorhanden      
-        handle_rl_and_dl(
-            layer_rohrleitungen,
-            layer_durchlaesse,
-            params_processing,
-            report_object
-        )
-        feedback.setProgressText('Abgeschlossen \n ')
-        timeLogger.log_time('Vorbereitung')
-
-
-        # Hauptfunktion
-        def main_check(
-            layer_key,
-            report_object,
-            params_processing,
-            i_run
-        ):
-            """
-            Diese Hauptfunktion wird durchlaufen, um die Vektorobjekte aller Layer zu pruefen (Attribute + Geometrien)
-            :param str key
-            :param layerReport report_object
-            :param dict params_processing
-            :param int i_run: Zaehler fuers feedback
-            """
-            feedback = params_processing['feedback']
-            key = layer_key
-            layer = params_processing['layer_dict'][layer_key]['layer']
-            layer_steps = params_processing['layer_dict'][layer_key]['steps']
-
-            feedback.setProgressText(
-                output_layer_prefixes[key] + '-Layer \"'
-                + layer.name() + '\" (' + str(i_run+1) + '/'
-                + str(params_processing['n_layer'])
-                + '):')
-
-            # Sind die pflichtfelder vorhanden?
-            feedback.setProgressText('> Prüfe benötigte Attributfelder...')
-            handle_test_missing_fields(
-                layer_key,
-                layer,
-                report_object,
-                user_config_dict['check_layer_defaults']['pflichtfelder'],
-                params_processing
-            )
-            timeLogger.log_time(layer_key+'_Fields')
-
-
-            # Pruefroutinen fuer Attribute
-            feedback.setProgressText('> Prüfe alle Einzelobjekte...')
-            handle_tests_attributes(
-                layer_key,
-                layer,
-                report_object,
-                params_processing
-            )
-            timeLogger.log_time(layer_key+'_Attr')
+        # Prozess-Pool fuer Geometriepruefungen; wird auch bei Fehlern und Abbruch beendet
+        prozess_pool = prozessPool(n_prozesse) if n_prozesse > 0 else None
+        try:
+            # Dictionary fuer immer wiederkehrende Parameter
+            # User config laden
+            user_config_dict = get_config_from_json(file_config_user)
+            params_processing = {
+                'layer_dict': layer_dict,  # zu pruefende Layer
+                'feedback': feedback,  # QgsProcessingFeedback fuer Statusinfos waehrend des Durchlaufs
+                'ereign_gew_id_field': user_config_dict['check_layer_defaults']['primaerschluessel_gew'],  # Name des Felds mit dem Primaerschluessel: "gu_cd" oder "ba_cd"
+                'feldname_gross_klein_ignorieren': user_config_dict['check_layer_defaults']['feldname_gross_klein_ignorieren'],
+                'gew_primary_key_missing': False,
+                'field_merged_id': 'merged_id',  # Feldname fuer neue ID, wenn rl und dl vorhanden
+                'emptystrdef': [NULL, ''],  # moegliche "Leer"-Definitionen für Zeichenketten
+                'n_layer': len(layer_dict), # Anzahl der zu bearbeitenden Layer
+                'index_registry': spatialIndexRegistry(segment_index),  # jeder Spatial Index wird nur einmal erstellt
+                'duplikate_modus': duplikate_modus,  # 'hash' oder 'paarweise'
+                'duplikate_richtung_ignorieren': duplikate_richtung_ignorieren,
+                'prozess_pool': prozess_pool,  # Geometriepruefungen in Kacheln
+                'fingerabdruecke': get_fingerprint_table() if inkrementell else None  # inkrementelle Pruefung
+            }
+
+            # dictionary fuer Feedback / Fehlermeldungen
+            report_object = layerReport(layer_dict)
+
+            # rl und dl zusammenfassen fuer gemeinsame Auswertung, wenn beide vorhanden
+            # (in Kacheln je Kachel)
+            if kachelgroesse == 0:
+                handle_rl_and_dl(
+                    layer_rohrleitungen,
+                    layer_durchlaesse,
+                    params_processing,
+                    report_object
+                )
+            feedback.setProgressText('Abgeschlossen \n ')
+            timeLogger.log_time('Vorbereitung')
 
 
-            # Pruefroutinen fuer Geometrien
-            feedback.setProgressText('-- Geometrien')
-            # fuer alle Layer: Einzelgeometrien pruefen (leer, Multigeometrien und Selbstueberschneidungen)
-            handle_tests_single_geometries(
-                layer,
-                layer_key,
-                layer_steps,
-                report_object,
-                feedback
-            )
-            timeLogger.log_time((layer_key+'_handle_tests_single_geometries'))
-            # Geometrien pruefen durch Vergleich mit anderen Geometrien
-            handle_tests_geoms_comparisons(
+            # Hauptfunktion
+            def main_check(
                 layer_key,
                 report_object,
-                params_processing
-            )
-            timeLogger.log_time((key+'_geom_comp_others'))
-            feedback.setProgressText('Abgeschlossen \n ')
-
-
-        # run test
-        feedback.setProgressText('Tests fuer einzelne Layer')
-        feedback.setProgressText('-------------------------')
-        i = 0
-        for key in list_layer_types:
-            if key in params_processing['layer_dict'].keys():
-                main_check(
-                    key,
+                params_processing,
+                i_run,
+                teil=None
+            ):
+                """
+                Diese Hauptfunktion wird durchlaufen, um die Vektorobjekte aller Layer zu pruefen (Attribute + Geometrien)
+                :param str key
+                :param layerReport report_object
+                :param dict params_processing
+                :param int i_run: Zaehler fuers feedback
+                :param str teil: fuer die Pruefung in Kacheln: 'attribute' (Attribute und Einzelgeometrien,
+                    Durchlauf ueber den gesamten Layer) oder 'geometrien' (Vergleiche von Geometrien);
+                    None: alle Pruefungen
+                """
+                feedback = params_processing['feedback']
+                key = layer_key
+                layer = params_processing['layer_dict'][layer_key]['layer']
+                layer_steps = params_processing['layer_dict'][layer_key]['steps']
+
+                feedback.setProgressText(
+                    output_layer_prefixes[key] + '-Layer \"'
+                    + layer.name() + '\" (' + str(i_run+1) + '/'
+                    + str(params_processing['n_layer'])
+                    + '):')
+
+                if teil == 'geometrien':
+                    pipeline = layerPipeline(layer, layer_steps, feedback)
+                    list_pipelines = handle_tests_geoms_comparisons(
+                        layer_key,
+                        report_object,
+                        params_processing,
+                        pipeline
+                    )
+                    for pipeline_i in list_pipelines:
+                        pipeline_i.run()
+                    return
+
+                # Sind die pflichtfelder vorhanden?
+                feedback.setProgressText('> Prüfe benötigte Attributfelder...')
+                handle_test_missing_fields(
+                    layer_key,
+                    layer,
+                    report_object,
+                    user_config_dict['check_layer_defaults']['pflichtfelder'],
+                    params_processing
+                )
+                timeLogger.log_time(layer_key+'_Fields')
+
+
+                # Alle Pruefroutinen fuer Einzelobjekte werden in einer Pipeline
+                # registriert, die den Layer nur einmal durchlaeuft
+                feedback.setProgressText('> Prüfe alle Einzelobjekte...')
+                if teil == 'attribute':
+                    # der Layer selbst wird durchlaufen, ohne die Geometrien zu speichern
+                    pipeline = layerPipeline(layer.source_layer(), layer_steps, feedback)
+                else:
+                    pipeline = layerPipeline(layer, layer_steps, feedback)
+
+                # Pruefroutinen fuer Attribute
+                handle_tests_attributes(
+                    layer_key,
+                    layer,
                     report_object,
                     params_processing,
-                    i
+                    pipeline
                 )
-                i = i+1
 
+                # Fingerabdruecke fuer die inkrementelle Pruefung
+                if teil == 'attribute' and params_processing['fingerabdruecke'] is not None:
+                    handle_fingerprints(
+                        layer_key,
+                        layer.source_layer(),
+                        user_config_dict['check_layer_defaults']['pflichtfelder'],
+                        params_processing,
+                        pipeline
+                    )
+
+                # Pruefroutinen fuer Geometrien
+                # fuer alle Layer: Einzelgeometrien pruefen (leer, Multigeometrien und Selbstueberschneidungen)
+                handle_tests_single_geometries(
+                    layer_key,
+                    report_object,
+                    pipeline,
+                    params_processing['prozess_pool'] if teil is None else None
+                )
+                # Geometrien pruefen durch Vergleich mit anderen Geometrien
+                if teil == 'attribute':
+                    list_pipelines = [pipeline]
+                else:
+                    list_pipelines = handle_tests_geoms_comparisons(
+                        layer_key,
+                        report_object,
+                        params_processing,
+                        pipeline
+                    )
+
+                # Durchlauf
+                for pipeline_i in list_pipelines:
+                    pipeline_i.run()
+                timeLogger.log_time((key+'_pipeline'))
+                feedback.setProgressText('Abgeschlossen \n ')
+
+
+            # run test
+            feedback.setProgressText('Tests fuer einzelne Layer')
+            feedback.setProgressText('-------------------------')
+            list_keys = [key for key in list_layer_types if key in params_processing['layer_dict'].keys()]
+            if kachelgroesse > 0:
+                # Attribute und Einzelgeometrien fuer die gesamten Layer
+                for i, key in enumerate(list_keys):
+                    main_check(
+                        key,
+                        report_object,
+                        params_processing,
+                        i,
+                        teil='attribute'
+                    )
+            elif not parallel:
+                for i, key in enumerate(list_keys):
+                    main_check(
+                        key,
+                        report_object,
+                        params_processing,
+                        i
+                    )
+            else:
+                # Die Gewaesser zuerst (Netz, Index und Stationierung werden von den
+                # anderen Layern verwendet), danach die uebrigen Layer gleichzeitig;
+                # rl und dl in einer Aufgabe, weil sie den zusammengefassten Layer teilen
+                if 'gewaesser' in list_keys:
+                    main_check(
+                        'gewaesser',
+                        report_object,
+                        params_processing,
+                        0
+                    )
+                    params_processing['line_references'] = get_stationierung_index(
+                        params_processing['layer_dict']['gewaesser']['layer'],
+                        feedback
+                    )
+                    if params_processing['prozess_pool'] is not None:
+                        get_gew_collection(params_processing)
+                list_groups = [
+                    [key for key in group if key in list_keys]
+                    for group in [['rohrleitungen', 'durchlaesse'], ['wehre'], ['schaechte']]
+                ]
+
+                def check_group(group, report_object, worker_feedback):
+                    params_worker = dict(params_processing, feedback=worker_feedback)
+                    for key in group:
+                        if worker_feedback.isCanceled():
+                            break
+                        main_check(
+                            key,
+                            report_object,
+                            params_worker,
+                            list_keys.index(key)
+                        )
+
+                run_parallel(
+                    {
+                        group[0]: (
+                            lambda worker_feedback, group=group, report_object=report_object:
+                            check_group(group, report_object, worker_feedback)
+                        )
+                        for group in list_groups if len(group) > 0
+                    },
+                    feedback
+                )
 
-        # Ausgabe:
-        # 1 report_dict bereinigen
-        if not test_output_all:
-            feedback.setProgressText('Bereinige Fehlerliste...')
-            report_dict_prepared = report_object.prepare_report_dict(feedback)
-            feedback.setProgressText('Abgeschlossen \n ')
-            
 
-        # 2 Ausgabe schreiben
-        feedback.setProgressText('Generiere Layer / Ausgabe...')
-        vector_layer_list, list_messages = create_layers_from_report_dict(
-            report_dict_prepared,
-            crs_out, feedback
-        )
-        feedback.setProgressText('Abgeschlossen \n ')
+            # Ausgabe:
+            # 1 report_dict bereinigen
+            if not test_output_all:
+                feedback.setProgressText('Bereinige Fehlerliste...')
+                report_dict_prepared = report_object.prepare_report_dict(feedback)
+                feedback.setProgressText('Abgeschlossen \n ')
+            
 
-        if len(vector_layer_list) > 0:
-            feedback.setProgressText('Speichere Layer in Datei...')
-            save_layer_to_file(vector_layer_list, reportdatei)   
-            feedback.setProgressText('Abgeschlossen \n ')     
+            # 2 Ausgabe schreiben (die Datei wird nur bei Fehlern erstellt)
+            feedback.setProgressText('Speichere Fehler in Datei...')
+            report_writer = gpkgReportWriter(reportdatei, crs_out)
+            kachel_ids = None  # alle Kacheln pruefen
+            if inkrementell:
+                pruefparameter = get_pruefparameter(
+                    dict_layers,
+                    params_processing,
+                    user_config_dict['check_layer_defaults']['pflichtfelder'],
+                    kachelgroesse,
+                    crs_out
+                )
+                df_fingerabdruecke = params_processing['fingerabdruecke'].to_df()
+                df_fingerabdruecke_alt = open_report_inkrementell(report_writer, pruefparameter, feedback)
+            list_messages = report_writer.write_report_dict(report_dict_prepared, feedback)
+            feedback.setProgressText('Abgeschlossen \n ')
             timeLogger.log_time('WriteLayer')
 
-        if is_test_version:
-            feedback.setProgressText(' \nDauer der Schritte:')
-            timing_txt = timeLogger.report_time_logs()
-            feedback.setProgressText('\n'.join(timing_txt))
+            if inkrementell and df_fingerabdruecke_alt is not None:
+                # nur Kacheln mit geaenderten Objekten werden neu geprueft
+                kachel_ids = get_geaenderte_kacheln(
+                    df_fingerabdruecke_alt,
+                    df_fingerabdruecke,
+                    kachelgroesse
+                )
+                feedback.setProgressText(
+                    'Inkrementelle Prüfung: ' + str(len(kachel_ids)) + ' Kacheln mit Änderungen'
+                )
+                delete_kacheln(report_writer, kachel_ids)
+            if kachelgroesse > 0:
+                # Vergleiche von Geometrien in Kacheln, die Ergebnisse werden je Kachel angehaengt
+                feedback.setProgressText('Tests in Kacheln')
+                feedback.setProgressText('-------------------------')
+                run_kachel_pruefung(
+                    dict_layers,
+                    main_check,
+                    params_processing,
+                    kachelgroesse,
+                    report_writer,
+                    kachel_ids
+                )
+                feedback.setProgressText('Abgeschlossen \n ')
+                timeLogger.log_time('Kacheln')
+            if inkrementell:
+                if feedback.isCanceled():
+                    # die Reportdatei der letzten Pruefung bleibt unveraendert
+                    report_writer.close(commit=False)
+                else:
+                    save_fingerprints(report_writer, df_fingerabdruecke, pruefparameter)
+            report_writer.close()
+
+            if is_test_version:
+                feedback.setProgressText(' \nDauer der Schritte:')
+                timing_txt = timeLogger.report_time_logs()
+                feedback.setProgressText('\n'.join(timing_txt))
         
-        # Dinge loeschen (zur Sicherheit)
-        del timeLogger
-        del report_object
+            # Dinge loeschen (zur Sicherheit)
+            del timeLogger
+            del report_object
+            params_processing['index_registry'].clear()
+        finally:
+            if prozess_pool is not None:
+                prozess_pool.shutdown()
 
         # 3 Feedback
         if self.newer_qgis_version:
@@ -379,7 +655,7 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
                     feedback.pushWarning(msg)
             else:
                 feedback_txt = ''
-            if len(vector_layer_list) == 0:
+            if report_writer.layer_count() == 0:
                 feedback.setProgressText(f'Keine {feedback_txt}Fehler im Datensatz; es wird keine Reportdatei erzeugt.')
             else:
                 res_file_name = os.path.split(reportdatei)[1]
@@ -400,7 +676,7 @@ class checkGewaesserDaten(QgsProcessingAlgorithm):
                     feedback.pushWarning(msg)
             else:
                 feedback_txt = ''
-            if len(vector_layer_list) == 0:
+            if report_writer.layer_count() == 0:
                 feedback.setProgressText(f'Keine {feedback_txt}Fehler im Datensatz; es wird keine Reportdatei erzeugt\n---------------------')
             else:
                 return {self.REPORT_OUT: reportdatei} 
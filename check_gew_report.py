@@ -1,25 +1,24 @@
 # Dieses Pythonskript Enthaelt die Funktionen fuer den Report
+import os
+import numpy as np
 import pandas as pd
+from osgeo import (
+    ogr,
+    osr
+)
 
 from qgis.core import (
-    NULL,
-    QgsField,
-    QgsFeature,
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
     QgsProcessingException,
-    QgsProject,
-    QgsVectorFileWriter,
-    QgsVectorLayer,
 )
 
-try:
-    from qgis.PyQt.QtCore import QMetaType
-except BaseException:
-    from qgis.PyQt.QtCore import QVariant
-
 from .defaults import (
     dict_report_texts,
     dict_ereign_fehler,
-    output_layer_prefixes
+    output_layer_prefixes,
+    tabelle_fingerabdruecke,
+    tabelle_pruefparameter
 )
 
 from .hilfsfunktionen import (
@@ -29,6 +28,68 @@ from .hilfsfunktionen import (
 )
 
 
+class resultTable:
+    """
+    Sammelt die Ergebniszeilen einer Pruefung spaltenweise (nur Anhaengen) und erstellt
+    am Ende in einem Schritt den DataFrame fuer den Report
+    """
+    def __init__(self, columns, dtypes=None):
+        """
+        :param list columns: Spaltennamen in der Reihenfolge der Ausgabe
+        :param dict dtypes: {Spaltenname: dtype}, z.B. {'Lage_rldl': 'int64'};
+            ohne Angabe bestimmt pandas den Typ
+        """
+        self.columns = list(columns)
+        self.dtypes = dtypes if dtypes else {}
+        self.buffers = {col: [] for col in self.columns}
+        self.n_rows = 0
+
+    def __len__(self):
+        return self.n_rows
+
+    def append(self, row=None, **values):
+        """
+        Haengt eine Zeile an; nicht angegebene Spalten bleiben leer (NaN)
+        :param list row: Werte aller Spalten in der Reihenfolge von self.columns
+        :param values: oder einzelne Spalten als Schluesselwort-Argumente
+        """
+        if row is not None:
+            if len(row) != len(self.columns):
+                raise ValueError('Die Zeile hat ' + str(len(row)) + ' statt ' + str(len(self.columns)) + ' Werte')
+            for buffer, value in zip(self.buffers.values(), row):
+                buffer.append(value)
+        else:
+            unknown = set(values.keys()) - set(self.columns)
+            if len(unknown) > 0:
+                raise KeyError('Unbekannte Spalten: ' + ', '.join(sorted(unknown)))
+            for col, buffer in self.buffers.items():
+                buffer.append(values.get(col, np.nan))
+        self.n_rows += 1
+
+    def extend(self, rows):
+        """
+        Haengt mehrere Zeilen an
+        :param list rows: [[Wert Spalte 1, Wert Spalte 2, ...], ...]
+        """
+        rows = list(rows)
+        if len(rows) == 0:
+            return
+        if any(len(row) != len(self.columns) for row in rows):
+            raise ValueError('Die Zeilen muessen ' + str(len(self.columns)) + ' Werte haben')
+        for buffer, values in zip(self.buffers.values(), zip(*rows)):
+            buffer.extend(values)
+        self.n_rows += len(rows)
+
+    def to_df(self):
+        """
+        :return: pd.DataFrame
+        """
+        return pd.DataFrame({
+            col: pd.Series(self.buffers[col], dtype=self.dtypes.get(col))
+            for col in self.columns
+        }, columns=self.columns)
+
+
 class layerReport:
     def __init__(self, layer_dict):
         """
@@ -162,20 +223,6 @@ class layerReport:
 
 
 # Aufraeumfunktionen
-def replace_lst_ids(series_i, dict_repl):
-    """
-    Ersetzt alle einzelnen id-Nummern anhand von dict_repl
-    :param pd.Series series_i
-    :param dict dict_repl
-    :return: pd.Series
-    """
-    for col_name, id_val in series_i.items():
-        if id_val in dict_repl.keys():
-            series_i[col_name] = dict_repl[id_val]
-        else:
-            pass
-    return series_i
-
 def join_list_items(x):
     """
     Fuegt alles in x zu einem String zusammen
@@ -242,125 +289,286 @@ def replace_report_dict_keys(report_dict, replacement_dict):
     
     
 # Layererstellung
-def create_feature_from_attrlist(
-    attrlist,
-    geom_type,
-    f_geometry=NULL
-):
+def get_typed_columns(data_df):
     """
-    creates a QgsFeature from with attributes in a list
-    :param list attrlist
-    :param str geom_type
-    :param QgsGeometry geometry
-    :return: QgsFeature
+    Bestimmt fuer jede Spalte (ohne geometry) den Feldtyp aus dem dtype des DataFrames und
+    wandelt die Werte in einem Schritt in Python-Werte dieses Typs um; fehlende Werte werden None (NULL)
+    :param pd.DataFrame data_df
+    :return: list of lists [[Spaltenname, Feldtyp (siehe defaults.feld_typen), list Werte], ...]
     """
-    f = QgsFeature()
-    if geom_type != 'NoGeometry':
-        try:
-            f.setGeometry(f_geometry)
-        except Exception:
-            raise QgsProcessingException(
-                'Could not set geometry of type \"' 
-                + str(f_geometry)
-                + '\" in function create_feature_from_attrlist. '
-                + 'Please contact the developer / maintainer of the plugin'
-            )
-    f.setAttributes(attrlist)
-    return f
+    list_columns = []
+    for col in data_df.columns:
+        if col == 'geometry':
+            continue
+        series = data_df[col]
+        missing = series.isna().to_numpy()
+        if missing.all():
+            # ohne Werte ist der Typ unbekannt
+            list_columns.append([col, 'String', [None] * len(series)])
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype):
+            field_type = 'Integer64'
+        elif pd.api.types.is_float_dtype(series.dtype):
+            valid = series.to_numpy(dtype=float)[~missing]
+            if missing.any() and np.all(valid == np.round(valid)) and np.all(np.abs(valid) < 2**53):
+                # Ganzzahlen, die wegen fehlender Werte (NaN) als float gespeichert sind
+                field_type = 'Integer64'
+            else:
+                field_type = 'Real'
+        else:
+            field_type = 'String'
+        convert = {'Integer64': int, 'Real': float, 'String': str}[field_type]
+        values = [
+            None if is_missing else convert(value)
+            for value, is_missing in zip(series.tolist(), missing)
+        ]
+        list_columns.append([col, field_type, values])
+    return list_columns
 
-def create_feature_from_row(df_i, geom_type):
-    """
-    creates a QgsFeature from data in df
-    :param pd.DataFrame df_i
-    :param str geom_type
-    """
-    if 'geometry' in df_i.keys():
-        f_geometry = df_i['geometry']
-        attrlist = df_i.drop('geometry').tolist()
-        return create_feature_from_attrlist(
-            attrlist,
-            geom_type,
-            f_geometry
-        )
-    else:
-        attrlist = df_i.tolist()
-        return create_feature_from_attrlist(
-            attrlist,
-            geom_type
-        )
 
+# Ogr-Geometrietypen der Ausgabe (siehe get_geom_type) und Feldtypen (siehe get_typed_columns)
+ogr_geom_types = {
+    'Point': ogr.wkbPoint,
+    'LineString': ogr.wkbLineString,
+    'NoGeometry': ogr.wkbNone
+}
+ogr_field_types = {
+    'Integer64': ogr.OFTInteger64,
+    'Real': ogr.OFTReal,
+    'String': ogr.OFTString
+}
 
-def create_layer_from_df(
-    data_df,
-    layer_name,
-    geom_type,
-    crs_result,
-    feedback,
-):
+
+class gpkgReportWriter:
     """
-    creates a QgsVectorLayer from data in geodata_dict
-    :param pd.DataFrame data_df: [attr1, attr2,..., (geometry)]
-    :param str layer_name
-    :param str geom_type
-    :param str crs_result: epsg code of the desired CRS
-    :param QgsProcessingFeedback feedback
+    Schreibt den Report direkt in ein Geopackage: Die Datei wird einmal geoeffnet, alle
+    Tabellen werden in einer Transaktion erstellt und die Zeilen der DataFrames ohne
+    Memory-Layer geschrieben. Die Datei wird erst beim ersten Fehler erstellt; wiederholte
+    Aufrufe haengen an bestehende Tabellen an (Pruefung in Kacheln). Eine neue Datei wird
+    zunaechst unter einem temporaeren Namen geschrieben und ersetzt die bestehende Datei
+    erst in close()
     """
+    def __init__(self, fname, crs_out):
+        """
+        :param str fname: Speicherpfad
+        :param str crs_out: epsg code of the desired CRS
+        """
+        self.fname = fname
+        self.crs_out = crs_out
+        self.fname_tmp = os.path.splitext(fname)[0] + '_tmp.gpkg'
+        self.is_new_file = False  # in fname_tmp geschrieben
+        self.datasource = None
+        self.srs = None
+        self.dict_tables = {}  # {layer_name: ogr.Layer}
+        self.saved_table_names = []  # Tabellen der zuletzt mit close() gespeicherten Datei
 
-    if 'geometry' in data_df.keys():
-        layer_fields = [f for f in data_df.keys() if not f=='geometry']
-        geom_type = geom_type+'?crs='+crs_result
-    else:  
-        # No Geometry
-        layer_fields = data_df.keys()
-    
-    # leeren Layer generieren
-    vector_layer = QgsVectorLayer(
-        geom_type,
-        layer_name,
-        'memory'
-    )
-    vector_layer.startEditing()
-    for  column_name in layer_fields:
-        try:
-        # QgsField is deprecated since QGIS 3.38 -> QMetaType
-            vector_layer.addAttribute(QgsField(column_name, QMetaType.Type.QString,))
-        except:  # fuer aeltere QGIS Versionen (vermutl. vor 3.8)
-            vector_layer.addAttribute(QgsField(column_name, QVariant.String))
-    vector_layer.updateFields()
-
-    # Objekte 
-    feature_list = data_df.apply(
-        lambda x: create_feature_from_row(
-            x,
-            geom_type
-        ),
-        axis=1  # auf jede Zeile anwenden
-    )
-    vector_layer.addFeatures(feature_list)
-    vector_layer.updateExtents()
-    vector_layer.commitChanges()
-    return vector_layer
-
-
-def create_layers_from_report_dict(report_dict, crs_out, feedback):
-    '''
-    Generiert für alle Geometrie-Einträge einen Layer
-    :param dict report_dict
-    :param str crs_out
-    :param QgsProcessingFeedback feedback 
-    :return: list vector_layer_list
-    :return: list list_messages
-    '''
-    vector_layer_list = []
-    list_messages = []
-    for layer_key in report_dict.keys():
-        if layer_key == 'Hinweis':
-            continue
-        for rep_section in ['attribute','geometrien']:
-            if not rep_section in report_dict[layer_key].keys():
-                pass
+    def open(self):
+        """
+        Erstellt eine neue Datei unter dem temporaeren Namen und startet die Transaktion;
+        eine bestehende Datei wird erst in close() ersetzt
+        """
+        driver = ogr.GetDriverByName('GPKG')
+        if self.datasource is not None:
+            self.datasource.RollbackTransaction()
+            self.datasource = None
+            self.dict_tables = {}
+        if os.path.exists(self.fname_tmp):
+            driver.DeleteDataSource(self.fname_tmp)  # von einem abgebrochenen Durchlauf
+        self.datasource = driver.CreateDataSource(self.fname_tmp)
+        if self.datasource is None:
+            raise QgsProcessingException(
+                'Die Reportdatei \"' + self.fname + '\" konnte nicht erstellt werden'
+            )
+        self.is_new_file = True
+        self.set_srs()
+        self.datasource.StartTransaction()
+
+    def open_existing(self):
+        """
+        Oeffnet eine bestehende Datei zum Bearbeiten (inkrementelle Pruefung) und startet die
+        Transaktion; die vorhandenen Tabellen werden uebernommen
+        :return: bool False, wenn die Datei nicht vorhanden ist oder nicht geoeffnet werden kann
+        """
+        if not os.path.exists(self.fname):
+            return False
+        self.datasource = ogr.Open(self.fname, update=1)
+        if self.datasource is None:
+            return False
+        self.is_new_file = False
+        self.set_srs()
+        self.dict_tables = {}
+        for i in range(self.datasource.GetLayerCount()):
+            table = self.datasource.GetLayerByIndex(i)
+            self.dict_tables[table.GetName()] = table
+        self.datasource.StartTransaction()
+        return True
+
+    def set_srs(self):
+        """
+        Koordinatenbezugssystem fuer neue Tabellen
+        """
+        self.srs = osr.SpatialReference()
+        self.srs.SetFromUserInput(QgsCoordinateReferenceSystem(self.crs_out).toWkt())
+        self.srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    def get_field_names(self, layer_name):
+        """
+        :param str layer_name
+        :return: list of str
+        """
+        table_defn = self.dict_tables[layer_name].GetLayerDefn()
+        return [table_defn.GetFieldDefn(i).GetName() for i in range(table_defn.GetFieldCount())]
+
+    def read_df(self, layer_name):
+        """
+        Liest die Attribute einer Tabelle (ohne Geometrien)
+        :param str layer_name
+        :return: pd.DataFrame or None, wenn die Tabelle nicht vorhanden ist
+        """
+        if layer_name not in self.dict_tables.keys():
+            return None
+        table = self.dict_tables[layer_name]
+        field_names = self.get_field_names(layer_name)
+        table.ResetReading()
+        rows = [
+            [feature.GetField(i) for i in range(len(field_names))] for feature in table
+        ]
+        return pd.DataFrame(rows, columns=field_names)
+
+    def drop_table(self, layer_name):
+        """
+        Loescht eine Tabelle aus der Datei
+        :param str layer_name
+        """
+        if layer_name not in self.dict_tables.keys():
+            return
+        for i in range(self.datasource.GetLayerCount()):
+            if self.datasource.GetLayerByIndex(i).GetName() == layer_name:
+                self.datasource.DeleteLayer(i)
+                break
+        del self.dict_tables[layer_name]
+        # die Indizes der uebrigen Tabellen haben sich geaendert
+        self.dict_tables = {
+            name: self.datasource.GetLayerByName(name) for name in self.dict_tables.keys()
+        }
+
+    def delete_rows(self, layer_name, field_name, values):
+        """
+        Loescht alle Zeilen, deren Wert im Feld in values enthalten ist
+        :param str layer_name
+        :param str field_name
+        :param list values: list of str
+        """
+        if len(values) == 0 or layer_name not in self.dict_tables.keys():
+            return
+        sql_values = ', '.join(["'" + str(value).replace("'", "''") + "'" for value in values])
+        self.datasource.ExecuteSQL(
+            'DELETE FROM \"' + layer_name.replace('"', '""') + '\" WHERE \"'
+            + field_name.replace('"', '""') + '\" IN (' + sql_values + ')'
+        )
+
+    def drop_empty_tables(self, keep=None):
+        """
+        Loescht Tabellen ohne Zeilen (z.B. nach delete_rows)
+        :param list keep: Tabellen, die nicht geloescht werden
+        """
+        keep = keep or []
+        for layer_name in list(self.dict_tables.keys()):
+            if layer_name not in keep and self.dict_tables[layer_name].GetFeatureCount() == 0:
+                self.drop_table(layer_name)
+
+    def get_table(self, layer_name, geom_type, list_fields):
+        """
+        Gibt die Tabelle zurueck; sie wird beim ersten Aufruf erstellt, fehlende Felder werden ergaenzt
+        :param str layer_name
+        :param str geom_type: 'Point', 'LineString' oder 'NoGeometry'
+        :param list list_fields: [[Feldname, Feldtyp], ...]
+        :return: ogr.Layer
+        """
+        if self.datasource is None:
+            self.open()
+        if layer_name not in self.dict_tables.keys():
+            if geom_type == 'NoGeometry':
+                table = self.datasource.CreateLayer(layer_name, geom_type=ogr.wkbNone)
             else:
+                table = self.datasource.CreateLayer(
+                    layer_name,
+                    self.srs,
+                    geom_type=ogr_geom_types[geom_type]
+                )
+            if table is None:
+                raise QgsProcessingException(
+                    'Die Tabelle \"' + layer_name + '\" konnte nicht erstellt werden'
+                )
+            self.dict_tables[layer_name] = table
+        table = self.dict_tables[layer_name]
+        table_defn = table.GetLayerDefn()
+        for field_name, field_type in list_fields:
+            if table_defn.GetFieldIndex(field_name) < 0:
+                table.CreateField(ogr.FieldDefn(field_name, ogr_field_types[field_type]))
+        return table
+
+    def write_df(self, data_df, layer_name, geom_type):
+        """
+        Schreibt alle Zeilen des DataFrames mit den Feldtypen aus get_typed_columns
+        :param pd.DataFrame data_df: [attr1, attr2,..., (geometry)]
+        :param str layer_name
+        :param str geom_type
+        """
+        list_columns = get_typed_columns(data_df)
+        table = self.get_table(
+            layer_name,
+            geom_type,
+            [[str(col), field_type] for col, field_type, _ in list_columns]
+        )
+        table_defn = table.GetLayerDefn()
+        field_idx = []
+        columns = []
+        for col, field_type, values in list_columns:
+            idx = table_defn.GetFieldIndex(str(col))
+            if table_defn.GetFieldDefn(idx).GetType() == ogr.OFTString and field_type != 'String':
+                # Textfeld aus einem frueheren Aufruf (Spalte dort ohne Werte)
+                values = [None if value is None else str(value) for value in values]
+            field_idx.append(idx)
+            columns.append(values)
+        if geom_type != 'NoGeometry' and 'geometry' in data_df.columns:
+            geometries = data_df['geometry'].tolist()
+        else:
+            geometries = [None] * len(data_df)
+        for i, geom in enumerate(geometries):
+            feature = ogr.Feature(table_defn)
+            for idx, values in zip(field_idx, columns):
+                if values[i] is None:
+                    feature.SetFieldNull(idx)
+                else:
+                    feature.SetField(idx, values[i])
+            if isinstance(geom, QgsGeometry) and not geom.isNull():
+                ogr_geom = ogr.CreateGeometryFromWkb(bytes(geom.asWkb()))
+                ogr_geom.FlattenTo2D()
+                feature.SetGeometry(ogr_geom)
+            if table.CreateFeature(feature) != 0:
+                raise QgsProcessingException(
+                    'Fehler beim Schreiben in die Tabelle \"' + layer_name + '\"'
+                )
+
+    def write_report_dict(self, report_dict, feedback):
+        """
+        Schreibt fuer alle Eintraege eine Tabelle (siehe write_df); fehlende Felder werden
+        nicht geschrieben, sondern als Meldung zurueckgegeben
+        :param dict report_dict: vorbereitet mit layerReport.prepare_report_dict
+        :param QgsProcessingFeedback feedback
+        :return: list list_messages
+        """
+        list_messages = []
+        for layer_key in report_dict.keys():
+            if layer_key == 'Hinweis':
+                continue
+            for rep_section in ['attribute', 'geometrien']:
+                if rep_section not in report_dict[layer_key].keys():
+                    continue
                 for error_name, error_df in report_dict[layer_key][rep_section].items():
+                    if feedback.isCanceled():
+                        return list_messages
                     layer_name = output_layer_prefixes[layer_key]+': '+error_name
                     feedback.setProgressText(layer_name)
                     if error_name in ['missing_fields', 'fehlende Felder']:
@@ -370,66 +578,61 @@ def create_layers_from_report_dict(report_dict, crs_out, feedback):
                             +'-Layer: '
                             + ', '.join(error_df)
                         )
+                        continue
+                    if isinstance(error_df, list):
+                        error_df = pd.DataFrame({'feature_id':error_df})
+                    if not isinstance(error_df, pd.DataFrame):
+                        continue  # sollte eigentlich nicht vorkommen
+                    if (rep_section == 'attribute') or (not 'geometry' in error_df.keys()):
+                        geom_type = 'NoGeometry'
                     else:
-                        if isinstance(error_df, list):
-                            error_df = pd.DataFrame({'feature_id':error_df})
-                        if not isinstance(error_df, pd.DataFrame):
-                            pass  # sollte eigentlich nicht vorkommen
-                        else:
-                            for col in error_df.keys():
-                                if col != 'geometry':
-                                    error_df[col] = [str(f) for f in error_df[col]]
-                            if (rep_section == 'attribute') or (not 'geometry' in error_df.keys()):
-                                geom_type = 'NoGeometry'
-                            else:
-                                geom_type = get_geom_type(error_name, layer_key)
-                            layer_neu = create_layer_from_df( 
-                                error_df,
-                                layer_name,
-                                geom_type,
-                                crs_out,
-                                feedback
-                            )
-                            vector_layer_list = vector_layer_list+[layer_neu]
-    return vector_layer_list, list_messages
-
-
-def save_layer_to_file(
-    vector_layer_list,
-    fname
-):
-    """
-    Schreibt alle Layer in der list in ein Geopackage
-    :param list vector_layer_list: Layerliste
-    :param str fname: Speicherpfad
-    """
-    # "Treiber"
-    geodata_driver_name = 'GPKG'
-
-    # Alle Layer aus der Liste in Datei schreiben
-    try:
-        for i, v_layer in enumerate(vector_layer_list):
-            fname_layer = fname
-            options = QgsVectorFileWriter.SaveVectorOptions()
-            options.fileEncoding = 'utf-8'
-            options.driverName = geodata_driver_name
-            if i > 0:
-                options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
-            options.layerName = v_layer.name()
-            transform_context = QgsProject.instance().transformContext()
-            QgsVectorFileWriter.writeAsVectorFormatV3(
-                v_layer,
-                fname_layer,
-                transform_context,
-                options
-            )
-    except BaseException:  # for older QGIS versions
-        for v_layer in vector_layer_list:
-            fname_layer = fname+'|layername='+v_layer.name()
-            QgsVectorFileWriter.writeAsVectorFormat(
-                v_layer,
-                fname_layer,
-                'utf-8',
-                v_layer.crs(),
-                driverName=geodata_driver_name
+                        geom_type = get_geom_type(error_name, layer_key)
+                    self.write_df(error_df, layer_name, geom_type)
+        return list_messages
+
+    def layer_count(self):
+        """
+        :return: int Anzahl der Tabellen mit Fehlern (ohne die Tabellen der inkrementellen Pruefung);
+            nach close() die der gespeicherten Datei
+        """
+        if self.datasource is None:
+            list_table_names = self.saved_table_names
+        else:
+            list_table_names = list(self.dict_tables.keys())
+        return len([
+            layer_name for layer_name in list_table_names
+            if layer_name not in [tabelle_fingerabdruecke, tabelle_pruefparameter]
+        ])
+
+    def close(self, commit=True):
+        """
+        Schliesst die Transaktion ab und die Datei; eine neue Datei ersetzt die bestehende
+        :param bool commit: False: alle Aenderungen seit dem Oeffnen verwerfen, die
+            bestehende Datei bleibt unveraendert
+        """
+        if self.datasource is None:
+            return
+        if not commit:
+            self.datasource.RollbackTransaction()
+            self.dict_tables = {}
+            self.datasource = None
+            if self.is_new_file:
+                ogr.GetDriverByName('GPKG').DeleteDataSource(self.fname_tmp)
+                self.is_new_file = False
+            return
+        if self.datasource.CommitTransaction() != 0:
+            raise QgsProcessingException(
+                'Die Reportdatei \"' + self.fname + '\" konnte nicht gespeichert werden'
             )
+        self.saved_table_names = list(self.dict_tables.keys())
+        self.dict_tables = {}
+        self.datasource = None
+        if self.is_new_file:
+            self.is_new_file = False
+            try:
+                os.replace(self.fname_tmp, self.fname)
+            except OSError:
+                raise QgsProcessingException(
+                    'Die Reportdatei \"' + self.fname + '\" konnte nicht ersetzt werden (in '
+                    + 'einem anderen Programm geöffnet?); das Ergebnis steht in \"' + self.fname_tmp + '\"'
+                )
@@ -15,6 +15,8 @@ plugin_dir = os.path.dirname(__file__)
 
 # Stationierungsfunktion: Suchraum
 findGew_tolerance_dist = 0.2
+# Stationierungsindex: Ordner neben den Daten (oder im temp-Verzeichnis, falls dort nicht beschreibbar)
+stationierung_index_ordner = '.oswege_index'
 
 # Pruefroutine Gewässerdaten
 # relativer Pfad fuer die User config
@@ -22,6 +24,23 @@ file_config_user = os.path.join(plugin_dir,'config_files','config_user.json')
 file_config_for_reset = os.path.join(plugin_dir,'config_files','config_for_reset.json')
 
 
+# Duplikatsuche: 'hash' (Gruppierung nach Hashwert der Koordinaten)
+# oder 'paarweise' (QgsGeometry.equals fuer alle Kandidaten aus dem Spatial Index)
+duplikate_modus = 'hash'
+
+# Suche der Linie zu einem Punktereignis: Anzahl naechster Nachbarn im Spatial Index
+knn_kandidaten = 4
+
+# Pruefung in Kacheln: Randbereich (m), der zusaetzlich zur Kachel geladen wird;
+# mindestens der Suchraum der Stationierungsfunktion (findGew_tolerance_dist)
+kachel_halo = 1.0
+
+# Inkrementelle Pruefung: Kachelgroesse (m), wenn keine Kachelgroesse angegeben ist, und
+# Tabellen in der Reportdatei mit den Fingerabdruecken der Objekte und den Parametern der Pruefung
+kachelgroesse_inkrementell = 1000.0
+tabelle_fingerabdruecke = 'oswege_fingerabdruecke'
+tabelle_pruefparameter = 'oswege_pruefparameter'
+
 # Fehler beim Vergleich von Ereignisssen auf Gewaesser
 dict_ereign_fehler = {
     'Anzahl': {
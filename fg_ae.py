@@ -11,16 +11,18 @@
 
 from qgis.core import (
     Qgis,
+    QgsFeature,
     QgsGeometry,
     QgsFeatureSink,
     QgsFields,
     QgsField,
+    QgsLineString,
+    QgsPoint,
     QgsProcessing,
     QgsProcessingAlgorithm,
     QgsProcessingException,
     QgsProcessingParameterFeatureSink,
-    QgsProcessingParameterVectorLayer,
-    QgsSpatialIndex
+    QgsProcessingParameterVectorLayer
 )
 
 # Exception for deprecated QVariant if QGIS version is older than 3.38
@@ -33,15 +35,16 @@ else:
     from qgis.PyQt.QtCore import QVariant
 
 
-from .hilfsfunktionen import (
-    linie_verlaengern
-)
-
 from .config_tools import (
     get_config_from_json,
     config_layer_if_in_project
 )
-from .pruefungsroutinen import muendet_nicht_in_fg_2ordnung
+from .layer_cache import (
+    featureStore,
+    segmentIndex,
+    spatialIndexRegistry
+)
+from .pruefungsroutinen import get_fg_nicht_in_fg_2ordnung
 from .defaults import file_config_user
 
 class AddFgAeAlagorithm(QgsProcessingAlgorithm):
@@ -119,12 +122,9 @@ class AddFgAeAlagorithm(QgsProcessingAlgorithm):
                 'Alle Layer müssen im gleichen Koordinatenbezugssystem gespeichert sein!'
             )
 
-        # Festlegung fuer die Schrittweite (in m)
-        dist_verl = 1
-        # Festlegung fuer die maximale Anzahl an Suchen n*dist_verl
+        # Festlegung fuer die maximale Laenge der Verlaengerung (in m)
         user_config_dict = get_config_from_json(file_config_user)
         dist_max = int(user_config_dict['max_suchraum_fg_ae_in_m'])
-        n_max = round(dist_max / dist_verl)
         
         # ist das Feld mit dem Gewaessercode verfuegbar?
         gew_key_field = user_config_dict['check_layer_defaults']['primaerschluessel_gew']
@@ -140,19 +140,21 @@ class AddFgAeAlagorithm(QgsProcessingAlgorithm):
                 + '. Stattdessen wird die Objekt-ID eingetragen'
                 )
         
-        # Spatial indices fuer die beiden Layer:
-        spatial_index_fg =  QgsSpatialIndex(layer_fg.getFeatures())
-        spatial_index_fg_1ordnung = QgsSpatialIndex(layer_fg_1ordnung.getFeatures())
+        # Beide Layer einmalig laden
+        store_fg = featureStore(layer_fg, feedback)
+        store_fg_1ordnung = featureStore(layer_fg_1ordnung, feedback)
+
+        # Strecken der beiden Layer (Gew. 1. Ordnung mit Spatial Index fuer die Strahlensuche):
+        index_registry = spatialIndexRegistry()
+        segments_fg = index_registry.get_segments(store_fg)
+        segment_index_fg_1ordnung = segmentIndex(
+            store_fg_1ordnung,
+            segments=index_registry.get_segments(store_fg_1ordnung)
+        )
 
 
         # Objekte, die in ein Gew. 1. Ordnung muenden (und nicht in ein Gew. 2. Ordnung)
-        fg_einmuendend = [
-            current_ft.id() for current_ft in layer_fg.getFeatures() if muendet_nicht_in_fg_2ordnung(
-                current_ft,
-                spatial_index_fg,
-                layer_fg
-            ) 
-        ]
+        fg_einmuendend = get_fg_nicht_in_fg_2ordnung(segments_fg)
 
         # Linien verlaengern
         fg_ae_featurelist = []
@@ -160,7 +162,7 @@ class AddFgAeAlagorithm(QgsProcessingAlgorithm):
             f'Erstelle an {len(fg_einmuendend)} Gewässermündungen fg_ae-Abschnitte, Suchraum: {dist_max}m'
         )
         for current_ft_id in fg_einmuendend:
-            current_ft_fg = layer_fg.getFeature(current_ft_id)
+            current_ft_fg = store_fg.getFeature(current_ft_id)
             if gew_key_available:
                 gew_key_i = current_ft_fg.attributeMap()[gew_key_field]
             else:
@@ -182,23 +184,26 @@ class AddFgAeAlagorithm(QgsProcessingAlgorithm):
             delta_x_laenge1 = (x_1-x_muendung) / distance_vtx_0_1
             delta_y_laenge1 = (y_1-y_muendung) / distance_vtx_0_1
             
-            for n in range(1, n_max):
-                ergebnis_verl = linie_verlaengern(
-                    n,
-                    vtx_muendung,
-                    dist_verl,
-                    delta_x_laenge1,
-                    delta_y_laenge1,
-                    layer_fg_1ordnung,
-                    spatial_index_fg_1ordnung,
+            # Verlaengerung entgegen der Richtung zum zweiten Stuetzpunkt: naechster Schnittpunkt
+            schnitt = segment_index_fg_1ordnung.cast_ray(
+                x_muendung,
+                y_muendung,
+                -delta_x_laenge1,
+                -delta_y_laenge1,
+                dist_max
+            )
+            if schnitt is not None:
+                _, x_schnitt, y_schnitt, _ = schnitt
+                line_ae = QgsGeometry(
+                    QgsLineString([
+                        QgsPoint(x_schnitt, y_schnitt),
+                        QgsPoint(x_muendung, y_muendung)
+                    ])
                 )
-                if ergebnis_verl[0]:
-                    ft_ae = ergebnis_verl[1]
-                    ft_ae.setAttributes([gew_key_i])
-                    fg_ae_featurelist.append(ft_ae)
-                    break
-                else:
-                    continue
+                ft_ae = QgsFeature()
+                ft_ae.setGeometry(line_ae)
+                ft_ae.setAttributes([gew_key_i])
+                fg_ae_featurelist.append(ft_ae)
 
         # Ausgabe
         out_fields = QgsFields()
@@ -0,0 +1,819 @@
+# Dieses Pythonskript enthaelt vektorisierte Geometriefunktionen (NumPy) fuer die Pruefroutinen
+import heapq
+import numpy as np
+
+# Toleranz fuer die Streckenparameter (0 = Anfang, 1 = Ende einer Strecke)
+eps_param = 1e-9
+# Maximale Anzahl an Streckenpaaren, die in einem Schritt berechnet werden
+max_pairs_per_chunk = 1000000
+
+
+def get_coords_parts(geom):
+    """
+    Gibt die Koordinaten aller Teile einer Liniengeometrie als Arrays zurueck
+    :param QgsGeometry geom
+    :return: list of np.array (n, 2)
+    """
+    list_parts = []
+    for part in geom.constParts():
+        try:
+            coords = np.column_stack((part.xVector(), part.yVector()))
+        except AttributeError:  # z.B. Kurvengeometrien
+            coords = np.array(
+                [(vtx.x(), vtx.y()) for vtx in part.vertices()],
+                dtype=float
+            ).reshape(-1, 2)
+        list_parts.append(coords.astype(float))
+    return list_parts
+
+
+def explode_segments(dict_parts):
+    """
+    Zerlegt Liniengeometrien in Strecken
+    :param dict dict_parts: {id: [np.array (n, 2), ...]} (siehe get_coords_parts)
+    :return: dict mit den Arrays p0, p1 (Anfang und Ende jeder Strecke), fid, vtx
+        (Index des ersten Stuetzpunkts im Teil), is_first, is_last (erste / letzte
+        Strecke eines offenen Teils) und slices {id: (start, stop)}
+    """
+    list_p0 = []
+    list_p1 = []
+    list_fid = []
+    list_vtx = []
+    list_is_first = []
+    list_is_last = []
+    slices = {}
+    offset = 0
+    for fid, list_coords in dict_parts.items():
+        start = offset
+        for coords in list_coords:
+            # Strecken der Laenge 0 (doppelte Stuetzpunkte) entfallen
+            keep = np.any(coords[1:] != coords[:-1], axis=1)
+            n_segments = int(keep.sum())
+            if n_segments < 1:
+                continue
+            list_p0.append(coords[:-1][keep])
+            list_p1.append(coords[1:][keep])
+            list_fid.append(np.full(n_segments, fid, dtype=np.int64))
+            list_vtx.append(np.nonzero(keep)[0].astype(np.int64))
+            # Geschlossene Linien haben keine Anfangs- und Endpunkte (Rand)
+            is_closed = np.array_equal(coords[0], coords[-1])
+            is_first = np.zeros(n_segments, dtype=bool)
+            is_first[0] = not is_closed
+            is_last = np.zeros(n_segments, dtype=bool)
+            is_last[-1] = not is_closed
+            list_is_first.append(is_first)
+            list_is_last.append(is_last)
+            offset += n_segments
+        slices[fid] = (start, offset)
+    if offset == 0:
+        return {
+            'p0': np.empty((0, 2)),
+            'p1': np.empty((0, 2)),
+            'fid': np.empty(0, dtype=np.int64),
+            'vtx': np.empty(0, dtype=np.int64),
+            'is_first': np.empty(0, dtype=bool),
+            'is_last': np.empty(0, dtype=bool),
+            'slices': slices
+        }
+    return {
+        'p0': np.concatenate(list_p0),
+        'p1': np.concatenate(list_p1),
+        'fid': np.concatenate(list_fid),
+        'vtx': np.concatenate(list_vtx),
+        'is_first': np.concatenate(list_is_first),
+        'is_last': np.concatenate(list_is_last),
+        'slices': slices
+    }
+
+
+def get_segment_bounds(segments):
+    """
+    Boundingboxen aller Strecken
+    :param dict segments: siehe explode_segments
+    :return: tuple of np.array (xmin, ymin, xmax, ymax)
+    """
+    p0 = segments['p0']
+    p1 = segments['p1']
+    return (
+        np.minimum(p0[:, 0], p1[:, 0]),
+        np.minimum(p0[:, 1], p1[:, 1]),
+        np.maximum(p0[:, 0], p1[:, 0]),
+        np.maximum(p0[:, 1], p1[:, 1])
+    )
+
+
+def get_segment_pairs(segments, list_pairs):
+    """
+    Erstellt fuer Paare von Linienobjekten alle Streckenpaare, deren Boundingboxen
+    sich mit der Boundingbox des anderen Objekts ueberschneiden
+    :param dict segments: siehe explode_segments
+    :param list list_pairs: [(id1, id2), ...]
+    :return: generator of tuples (pair_idx, idx_a, idx_b) in Bloecken von max_pairs_per_chunk
+    """
+    xmin, ymin, xmax, ymax = get_segment_bounds(segments)
+    slices = segments['slices']
+    dict_bbox = {}
+    for fid, (start, stop) in slices.items():
+        if stop > start:
+            dict_bbox[fid] = (
+                xmin[start:stop].min(),
+                ymin[start:stop].min(),
+                xmax[start:stop].max(),
+                ymax[start:stop].max()
+            )
+
+    def segments_in_bbox(fid, bbox):
+        start, stop = slices[fid]
+        inside = (
+            (xmin[start:stop] <= bbox[2])
+            & (xmax[start:stop] >= bbox[0])
+            & (ymin[start:stop] <= bbox[3])
+            & (ymax[start:stop] >= bbox[1])
+        )
+        return np.nonzero(inside)[0] + start
+
+    list_pair_idx = []
+    list_idx_a = []
+    list_idx_b = []
+    n_chunk = 0
+    for pair_idx, (id1, id2) in enumerate(list_pairs):
+        if not (id1 in dict_bbox.keys() and id2 in dict_bbox.keys()):
+            continue
+        idx_a = segments_in_bbox(id1, dict_bbox[id2])
+        idx_b = segments_in_bbox(id2, dict_bbox[id1])
+        if len(idx_a) == 0 or len(idx_b) == 0:
+            continue
+        # Bei sehr langen Linien wird das Paar in Teilbloecke aufgeteilt
+        rows_per_block = max(1, max_pairs_per_chunk // len(idx_b))
+        for i in range(0, len(idx_a), rows_per_block):
+            idx_a_i = idx_a[i:i+rows_per_block]
+            n_i = len(idx_a_i) * len(idx_b)
+            list_pair_idx.append(np.full(n_i, pair_idx, dtype=np.int64))
+            list_idx_a.append(np.repeat(idx_a_i, len(idx_b)))
+            list_idx_b.append(np.tile(idx_b, len(idx_a_i)))
+            n_chunk += n_i
+            if n_chunk >= max_pairs_per_chunk:
+                yield (
+                    np.concatenate(list_pair_idx),
+                    np.concatenate(list_idx_a),
+                    np.concatenate(list_idx_b)
+                )
+                list_pair_idx = []
+                list_idx_a = []
+                list_idx_b = []
+                n_chunk = 0
+    if n_chunk > 0:
+        yield (
+            np.concatenate(list_pair_idx),
+            np.concatenate(list_idx_a),
+            np.concatenate(list_idx_b)
+        )
+
+
+def intersect_segment_pairs(segments, idx_a, idx_b):
+    """
+    Berechnet die Schnittpunkte der Streckenpaare (idx_a[i], idx_b[i])
+    :param dict segments: siehe explode_segments
+    :param np.array idx_a
+    :param np.array idx_b
+    :return: tuple (inner_hit, points, overlap)
+        inner_hit: bool-Array, Schnittpunkt im Inneren beider Linien
+        points: np.array (n, 2) mit den Schnittpunkten (nur gueltig, wenn inner_hit)
+        overlap: bool-Array, Strecken liegen auf einer Laenge > 0 uebereinander
+    """
+    p = segments['p0'][idx_a]
+    r = segments['p1'][idx_a] - p
+    q = segments['p0'][idx_b]
+    s = segments['p1'][idx_b] - q
+    qp = q - p
+    denom = r[:, 0]*s[:, 1] - r[:, 1]*s[:, 0]
+    qp_cross_r = qp[:, 0]*r[:, 1] - qp[:, 1]*r[:, 0]
+    qp_cross_s = qp[:, 0]*s[:, 1] - qp[:, 1]*s[:, 0]
+    len_r = np.hypot(r[:, 0], r[:, 1])
+    len_s = np.hypot(s[:, 0], s[:, 1])
+    valid = (len_r > 0) & (len_s > 0)  # Strecken der Laenge 0 ignorieren
+    parallel = np.abs(denom) <= eps_param * len_r * len_s
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = qp_cross_s / denom
+        u = qp_cross_r / denom
+    hit = (
+        valid & ~parallel
+        & (t >= -eps_param) & (t <= 1 + eps_param)
+        & (u >= -eps_param) & (u <= 1 + eps_param)
+    )
+    # Anfangs- und Endpunkte der Linien gehoeren nicht zum Inneren
+    boundary = (
+        (segments['is_first'][idx_a] & (t <= eps_param))
+        | (segments['is_last'][idx_a] & (t >= 1 - eps_param))
+        | (segments['is_first'][idx_b] & (u <= eps_param))
+        | (segments['is_last'][idx_b] & (u >= 1 - eps_param))
+    )
+    inner_hit = hit & ~boundary
+    points = p + np.where(inner_hit, t, 0)[:, None] * r
+
+    # Kollineare Strecken: Ueberlappung mit einer Laenge > 0?
+    collinear = valid & parallel & (np.abs(qp_cross_r) <= eps_param * len_r * np.maximum(len_r, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0 = (qp[:, 0]*r[:, 0] + qp[:, 1]*r[:, 1]) / (len_r**2)
+        t1 = t0 + (s[:, 0]*r[:, 0] + s[:, 1]*r[:, 1]) / (len_r**2)
+    overlap_len = np.minimum(np.maximum(t0, t1), 1) - np.maximum(np.minimum(t0, t1), 0)
+    overlap = collinear & (overlap_len > eps_param)
+    return inner_hit, points, overlap
+
+
+def find_crossings(dict_parts, list_pairs, decimals=6):
+    """
+    Ermittelt sich kreuzende Linien (entspricht QgsGeometry.crosses fuer Linien):
+    Die Linien schneiden sich im Inneren in Punkten, ohne uebereinander zu liegen
+    :param dict dict_parts: {id: [np.array (n, 2), ...]} (siehe get_coords_parts)
+    :param list list_pairs: Kandidatenpaare [(id1, id2), ...]
+    :param int decimals: Rundung zum Zusammenfassen identischer Schnittpunkte
+    :return: list of tuples [(id1, id2, np.array (k, 2)), ...]
+    """
+    segments = explode_segments(dict_parts)
+    list_hit_pairs = []
+    list_hit_points = []
+    list_overlap_pairs = []
+    for pair_idx, idx_a, idx_b in get_segment_pairs(segments, list_pairs):
+        inner_hit, points, overlap = intersect_segment_pairs(segments, idx_a, idx_b)
+        list_hit_pairs.append(pair_idx[inner_hit])
+        list_hit_points.append(points[inner_hit])
+        list_overlap_pairs.append(pair_idx[overlap])
+    if len(list_hit_pairs) == 0:
+        return []
+    hit_pairs = np.concatenate(list_hit_pairs)
+    hit_points = np.concatenate(list_hit_points)
+    overlap_pairs = np.unique(np.concatenate(list_overlap_pairs))
+    # Paare mit Ueberlagerung kreuzen sich nicht
+    keep = ~np.isin(hit_pairs, overlap_pairs)
+    hit_pairs = hit_pairs[keep]
+    hit_points = hit_points[keep]
+    if len(hit_pairs) == 0:
+        return []
+    order = np.argsort(hit_pairs, kind='stable')
+    hit_pairs = hit_pairs[order]
+    hit_points = hit_points[order]
+    unique_pairs, starts = np.unique(hit_pairs, return_index=True)
+    stops = np.append(starts[1:], len(hit_pairs))
+    list_crossings = []
+    for pair_idx, start, stop in zip(unique_pairs, starts, stops):
+        points_i = hit_points[start:stop]
+        _, first_idx = np.unique(np.round(points_i, decimals), axis=0, return_index=True)
+        id1, id2 = list_pairs[pair_idx]
+        list_crossings.append((id1, id2, points_i[np.sort(first_idx)]))
+    return list_crossings
+
+
+def find_self_intersections(dict_parts):
+    """
+    Ermittelt Linien, die nicht einfach sind (entspricht not QgsGeometry.isSimple()):
+    Zwei Strecken derselben Linie duerfen sich nur im gemeinsamen Stuetzpunkt
+    aufeinanderfolgender Strecken, im Anfangs- und Endpunkt eines geschlossenen Teils
+    oder in gleichen Endpunkten offener Teile beruehren. Nur Schnittpunkte im Inneren beider
+    Strecken (ausserhalb der Toleranz eps_param) gelten sicher als Selbstueberschneidung;
+    Beruehrungen und Ueberlagerungen innerhalb der Toleranz, die nicht exakt in einem
+    zulaessigen Stuetzpunkt liegen, sind Grenzfaelle und muessen mit GEOS geprueft werden
+    :param dict dict_parts: {id: [np.array (n, 2), ...]} (siehe get_coords_parts)
+    :return: tuple (list der ids nicht einfacher Linien, list der ids der Grenzfaelle)
+    """
+    list_p0 = []
+    list_p1 = []
+    list_fid = []
+    list_part = []
+    list_seg = []
+    list_n_seg = []
+    list_closed = []
+    n_parts = 0
+    for fid, list_coords in dict_parts.items():
+        for coords in list_coords:
+            # Strecken der Laenge 0 (doppelte Stuetzpunkte) entfallen
+            keep = np.any(coords[1:] != coords[:-1], axis=1)
+            n_seg = int(keep.sum())
+            if n_seg < 1:
+                continue
+            list_p0.append(coords[:-1][keep])
+            list_p1.append(coords[1:][keep])
+            list_fid.append(np.full(n_seg, fid, dtype=np.int64))
+            list_part.append(np.full(n_seg, n_parts, dtype=np.int64))
+            list_seg.append(np.arange(n_seg, dtype=np.int64))
+            list_n_seg.append(np.full(n_seg, n_seg, dtype=np.int64))
+            list_closed.append(np.full(n_seg, np.array_equal(coords[0], coords[-1])))
+            n_parts += 1
+    if n_parts == 0:
+        return [], []
+    p0 = np.concatenate(list_p0)
+    p1 = np.concatenate(list_p1)
+    fid = np.concatenate(list_fid)
+    part = np.concatenate(list_part)
+    seg = np.concatenate(list_seg)
+    n_seg = np.concatenate(list_n_seg)
+    closed = np.concatenate(list_closed)
+
+    # Streckenpaare derselben Linie mit sich (auch im Punkt) beruehrenden Boundingboxen
+    bounds_min = np.minimum(p0, p1)
+    bounds_max = np.maximum(p0, p1)
+    tol = eps_param * max(1.0, float(np.abs(np.concatenate([p0, p1])).max()))
+    idx_i, idx_j = find_overlapping_intervals(
+        np.unique(fid, return_inverse=True)[1].reshape(-1),
+        bounds_min[:, 0] - tol,
+        bounds_max[:, 0] + tol
+    )
+    in_y = (bounds_min[idx_i, 1] <= bounds_max[idx_j, 1] + tol) & (bounds_min[idx_j, 1] <= bounds_max[idx_i, 1] + tol)
+    idx_i = idx_i[in_y]
+    idx_j = idx_j[in_y]
+
+    list_not_simple = []
+    list_grenzfaelle = []
+    for start in range(0, len(idx_i), max_pairs_per_chunk):
+        a = idx_i[start:start+max_pairs_per_chunk]
+        b = idx_j[start:start+max_pairs_per_chunk]
+        p = p0[a]
+        r = p1[a] - p
+        q = p0[b]
+        s = p1[b] - q
+        qp = q - p
+        denom = r[:, 0]*s[:, 1] - r[:, 1]*s[:, 0]
+        qp_cross_r = qp[:, 0]*r[:, 1] - qp[:, 1]*r[:, 0]
+        qp_cross_s = qp[:, 0]*s[:, 1] - qp[:, 1]*s[:, 0]
+        len_r = np.hypot(r[:, 0], r[:, 1])
+        len_s = np.hypot(s[:, 0], s[:, 1])
+        parallel = np.abs(denom) <= eps_param * len_r * len_s
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = qp_cross_s / denom
+            u = qp_cross_r / denom
+        hit = (
+            ~parallel
+            & (t >= -eps_param) & (t <= 1 + eps_param)
+            & (u >= -eps_param) & (u <= 1 + eps_param)
+        )
+        # Kollineare Strecken: Ueberlappung (immer unzulaessig) oder Beruehrung in einem Punkt
+        collinear = parallel & (np.abs(qp_cross_r) <= eps_param * len_r * np.maximum(len_r, 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t0 = (qp[:, 0]*r[:, 0] + qp[:, 1]*r[:, 1]) / (len_r**2)
+            t1 = t0 + (s[:, 0]*r[:, 0] + s[:, 1]*r[:, 1]) / (len_r**2)
+        overlap_lo = np.maximum(np.minimum(t0, t1), 0)
+        overlap_hi = np.minimum(np.maximum(t0, t1), 1)
+        overlap = collinear & (overlap_hi - overlap_lo > eps_param)
+        touch = collinear & ~overlap & (overlap_hi >= overlap_lo - eps_param)
+        t = np.where(touch, overlap_lo, t)
+        touch_point = p + np.where(touch, t, 0)[:, None] * r - q
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u_touch = (touch_point[:, 0]*s[:, 0] + touch_point[:, 1]*s[:, 1]) / (len_s**2)
+        u = np.where(touch, u_touch, u)
+        hit |= touch
+
+        # zulaessige Beruehrungen (exakt im gemeinsamen Stuetzpunkt)
+        t_start = t <= eps_param
+        t_end = t >= 1 - eps_param
+        u_start = u <= eps_param
+        u_end = u >= 1 - eps_param
+        same_part = part[a] == part[b]
+        adjacent = same_part & (seg[b] == seg[a] + 1) & t_end & u_start
+        ring_closure = same_part & closed[a] & (seg[a] == 0) & (seg[b] == n_seg[b] - 1) & t_start & u_end
+        a_open_end = ~closed[a] & (((seg[a] == 0) & t_start) | ((seg[a] == n_seg[a] - 1) & t_end))
+        b_open_end = ~closed[b] & (((seg[b] == 0) & u_start) | ((seg[b] == n_seg[b] - 1) & u_end))
+        same_end = np.all(
+            np.where(t_start[:, None], p, p1[a]) == np.where(u_start[:, None], q, p1[b]),
+            axis=1
+        )
+        allowed = ~overlap & (adjacent | ring_closure | (a_open_end & b_open_end & same_end))
+        # Schnittpunkt im Inneren beider Strecken
+        not_simple = hit & ~parallel & ~(t_start | t_end | u_start | u_end)
+        grenzfall = (hit | overlap) & ~not_simple & ~allowed
+        list_not_simple.append(fid[a[not_simple]])
+        list_grenzfaelle.append(fid[a[grenzfall]])
+    if len(list_not_simple) == 0:
+        return [], []
+    not_simple = np.unique(np.concatenate(list_not_simple))
+    grenzfaelle = np.setdiff1d(np.concatenate(list_grenzfaelle), not_simple)
+    return not_simple.tolist(), grenzfaelle.tolist()
+
+
+class lineReference:
+    """
+    Lineare Referenzierung auf einer Linie: Strecken und kumulierte Laengen werden
+    einmalig berechnet, Stationierungen fuer viele Punkte gemeinsam (NumPy)
+    """
+    def __init__(self, coords, cum_len=None):
+        """
+        :param np.array coords: (n, 2) Stuetzpunkte der Linie
+        :param np.array cum_len: (n,) kumulierte Laengen, falls bereits berechnet
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.seg_vec = self.coords[1:] - self.coords[:-1]
+        self.seg_len = np.hypot(self.seg_vec[:, 0], self.seg_vec[:, 1])
+        if cum_len is None:
+            self.cum_len = np.concatenate([[0.0], np.cumsum(self.seg_len)])
+        else:
+            self.cum_len = np.asarray(cum_len, dtype=float)
+
+    @classmethod
+    def from_geometry(cls, geom):
+        """
+        Es wird nur der erste Teil der Geometrie verwendet
+        :param QgsGeometry geom
+        :return: lineReference
+        """
+        list_parts = get_coords_parts(geom)
+        if len(list_parts) == 0:
+            return cls(np.empty((0, 2)))
+        return cls(list_parts[0])
+
+    def length(self):
+        return self.cum_len[-1]
+
+    def point_on_segment(self, seg_idx, stations):
+        """
+        :param np.array seg_idx: Index der Strecke
+        :param np.array stations: Stationierung (auf der Strecke seg_idx)
+        :return: np.array (n, 2)
+        """
+        seg_len = self.seg_len[seg_idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(seg_len > 0, (stations - self.cum_len[seg_idx]) / seg_len, 0.0)
+        return self.coords[seg_idx] + t[:, None] * self.seg_vec[seg_idx]
+
+    def locate(self, points):
+        """
+        Projiziert Punkte auf die Linie (naechster Punkt auf der Linie)
+        :param np.array points: (n, 2)
+        :return: tuple (stations (n,), nearest_points (n, 2), distances (n,))
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n_points = len(points)
+        n_seg = len(self.seg_len)
+        if n_seg == 0:
+            nearest = np.repeat(self.coords[:1], n_points, axis=0)
+            distances = np.hypot(*(points - nearest).T) if n_points > 0 else np.empty(0)
+            return np.zeros(n_points), nearest, distances
+        stations = np.empty(n_points)
+        nearest = np.empty((n_points, 2))
+        distances = np.empty(n_points)
+        seg_len_sq = self.seg_len**2
+        rows_per_block = max(1, max_pairs_per_chunk // n_seg)
+        for i in range(0, n_points, rows_per_block):
+            block = points[i:i+rows_per_block]
+            d = block[:, None, :] - self.coords[None, :-1, :]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (d[:, :, 0]*self.seg_vec[:, 0] + d[:, :, 1]*self.seg_vec[:, 1]) / seg_len_sq
+            t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+            proj = self.coords[None, :-1, :] + t[:, :, None] * self.seg_vec[None, :, :]
+            dist = np.hypot(block[:, None, 0] - proj[:, :, 0], block[:, None, 1] - proj[:, :, 1])
+            seg_idx = np.argmin(dist, axis=1)
+            rows = np.arange(len(block))
+            stations[i:i+rows_per_block] = self.cum_len[seg_idx] + t[rows, seg_idx]*self.seg_len[seg_idx]
+            nearest[i:i+rows_per_block] = proj[rows, seg_idx]
+            distances[i:i+rows_per_block] = dist[rows, seg_idx]
+        return stations, nearest, distances
+
+    def substring_coords(self, stat_start, stat_end):
+        """
+        Stuetzpunkte des Linienteils zwischen zwei Stationierungen
+        (entspricht QgsLineString.curveSubstring)
+        :param float stat_start
+        :param float stat_end
+        :return: np.array (k, 2)
+        """
+        if stat_start < 0 and stat_end < 0:
+            return np.empty((0, 2))
+        stat_end = max(stat_start, stat_end)
+        stat_start = max(stat_start, 0.0)
+        cum_len = self.cum_len
+        start_seg = np.nonzero((cum_len[:-1] <= stat_start) & (stat_start < cum_len[1:]))[0]
+        if len(start_seg) == 0:
+            # Start am letzten Stuetzpunkt
+            if len(self.coords) > 0 and np.isclose(cum_len[-1], stat_start, rtol=0, atol=1e-12):
+                return self.coords[[-1, -1]]
+            return np.empty((0, 2))
+        start_seg = start_seg[0]
+        start_point = self.point_on_segment(np.array([start_seg]), np.array([stat_start]))
+        end_len = cum_len[start_seg+1:]  # Stationierung der folgenden Stuetzpunkte
+        vertices = self.coords[start_seg+1:]
+        reached = np.nonzero(end_len >= stat_end)[0]
+        if len(reached) == 0:
+            return np.concatenate([start_point, vertices])
+        j = reached[0]
+        if end_len[j] > stat_end:
+            end_point = self.point_on_segment(np.array([start_seg+j]), np.array([stat_end]))
+        else:
+            end_point = vertices[j:j+1]
+        return np.concatenate([start_point, vertices[:j], end_point])
+
+
+
+def compare_with_reference(vtx_coords, reference, array_stat=None):
+    """
+    Vergleicht die Stuetzpunkte einer Linie mit dem Abschnitt der Referenzlinie
+    zwischen der Stationierung des ersten und des letzten Stuetzpunkts
+    :param np.array vtx_coords: (n, 2)
+    :param lineReference reference
+    :param np.array array_stat: Stationierung der Stuetzpunkte, falls bereits ermittelt
+        (z.B. mit segmentIndex.locate_points_on_feature)
+    :return: dict mit vtx_stat (Stationierung je Stuetzpunkt), Richtung
+        (0 korrekt, 1 entgegengesetzt, 2 falsche Reihenfolge), Anzahl (0 korrekt,
+        1 zu viele, 2 zu wenige) und Lage (0 korrekt oder [1, [Indizes der Abweichungen]])
+    """
+    if array_stat is None:
+        array_stat, _, _ = reference.locate(vtx_coords)
+    list_stat = array_stat.tolist()
+    dict_vergleich = {'vtx_stat': list_stat}
+    stat_diff = np.diff(array_stat)
+    if np.all(stat_diff >= 0):
+        dict_vergleich['Richtung'] = 0
+    elif np.all(stat_diff <= 0):
+        dict_vergleich['Richtung'] = 1
+    else:
+        dict_vergleich['Richtung'] = 2
+    sub_line_coords = reference.substring_coords(list_stat[0], list_stat[-1])
+    if len(vtx_coords) == len(sub_line_coords):
+        dict_vergleich['Anzahl'] = 0
+    elif len(vtx_coords) > len(sub_line_coords):
+        dict_vergleich['Anzahl'] = 1
+    else:
+        dict_vergleich['Anzahl'] = 2
+    n_compare = min(len(vtx_coords), len(sub_line_coords))
+    vtx_diff = vtx_coords[:n_compare] - sub_line_coords[:n_compare]
+    array_point_on_line = np.hypot(vtx_diff[:, 0], vtx_diff[:, 1]) <= 1e-6
+    if not np.all(array_point_on_line):
+        dict_vergleich['Lage'] = [1, [str(i) for i in np.nonzero(~array_point_on_line)[0]]]
+    else:
+        dict_vergleich['Lage'] = 0
+    return dict_vergleich
+
+
+def find_overlapping_intervals(groups, starts, stops):
+    """
+    Ermittelt alle Paare sich ueberlappender Intervalle innerhalb einer Gruppe
+    (start_i < stop_j und start_j < stop_i) durch Sortieren und Durchlaufen (Sweep)
+    :param np.array groups: (n,) Gruppe je Intervall, z.B. Gewaesser (Codes >= 0)
+    :param np.array starts: (n,)
+    :param np.array stops: (n,) mit stops >= starts
+    :return: tuple of np.array (idx_i, idx_j) mit idx_i < idx_j,
+        sortiert nach Gruppe, idx_i und idx_j
+    """
+    n = len(starts)
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.lexsort((np.arange(n), starts, groups))
+    bounds = np.nonzero(np.diff(groups[order]))[0] + 1
+    list_starts = np.asarray(starts, dtype=float).tolist()
+    list_stops = np.asarray(stops, dtype=float).tolist()
+    list_i = []
+    list_j = []
+    for block in np.split(order, bounds):
+        if len(block) < 2:
+            continue
+        heap_stops = []  # (stop, idx) der aktiven Intervalle
+        active = set()
+        for idx_b in block.tolist():
+            start_b = list_starts[idx_b]
+            stop_b = list_stops[idx_b]
+            # Intervalle, die vor dem Anfang von b enden, sind nicht mehr aktiv
+            while heap_stops and heap_stops[0][0] <= start_b:
+                active.discard(heapq.heappop(heap_stops)[1])
+            for idx_a in active:
+                # bei gleichem Anfang nur, wenn b eine Laenge > 0 hat
+                if list_starts[idx_a] < start_b or stop_b > start_b:
+                    list_i.append(min(idx_a, idx_b))
+                    list_j.append(max(idx_a, idx_b))
+            heapq.heappush(heap_stops, (stop_b, idx_b))
+            active.add(idx_b)
+    idx_i = np.array(list_i, dtype=np.int64)
+    idx_j = np.array(list_j, dtype=np.int64)
+    pair_order = np.lexsort((idx_j, idx_i, groups[idx_i]))
+    return idx_i[pair_order], idx_j[pair_order]
+
+
+def get_layer_segments(layer, feedback=None):
+    """
+    Zerlegt alle Linien eines Layers in Strecken (Linien mit einem Stuetzpunkt als Strecke der Laenge 0)
+    :param QgsVectorLayer or featureStore layer
+    :param QgsProcessingFeedback feedback
+    :return: dict mit den Arrays p0, p1 (Anfang und Ende jeder Strecke), fid, part, vtx
+        (Index des ersten Stuetzpunkts im Teil) und stat (Stationierung am Anfang der Strecke im Teil)
+    """
+    dict_parts = {}
+    for feature in layer.getFeatures():
+        if feedback and feedback.isCanceled():
+            break
+        geom = feature.geometry()
+        if geom.isNull() or geom.isEmpty():
+            continue
+        dict_parts[feature.id()] = get_coords_parts(geom)
+    return get_parts_segments(dict_parts)
+
+
+def get_parts_segments(dict_parts):
+    """
+    Zerlegt Linien in Strecken (Linien mit einem Stuetzpunkt als Strecke der Laenge 0)
+    :param dict dict_parts: {id: [np.array (n, 2), ...]} (siehe get_coords_parts)
+    :return: dict, siehe get_layer_segments
+    """
+    list_fid = []
+    list_part = []
+    list_vtx = []
+    list_p0 = []
+    list_p1 = []
+    list_stat = []
+    for fid, list_coords in dict_parts.items():
+        for part_idx, coords in enumerate(list_coords):
+            if len(coords) == 0:
+                continue
+            if len(coords) == 1:
+                coords = np.repeat(coords, 2, axis=0)
+            seg_len = np.hypot(*(coords[1:] - coords[:-1]).T)
+            n_seg = len(seg_len)
+            list_fid.append(np.full(n_seg, fid, dtype=np.int64))
+            list_part.append(np.full(n_seg, part_idx, dtype=np.int64))
+            list_vtx.append(np.arange(n_seg, dtype=np.int64))
+            list_p0.append(coords[:-1])
+            list_p1.append(coords[1:])
+            list_stat.append(np.concatenate([[0.0], np.cumsum(seg_len)[:-1]]))
+    if len(list_fid) == 0:
+        return {
+            'p0': np.empty((0, 2)),
+            'p1': np.empty((0, 2)),
+            'fid': np.empty(0, dtype=np.int64),
+            'part': np.empty(0, dtype=np.int64),
+            'vtx': np.empty(0, dtype=np.int64),
+            'stat': np.empty(0)
+        }
+    return {
+        'p0': np.concatenate(list_p0),
+        'p1': np.concatenate(list_p1),
+        'fid': np.concatenate(list_fid),
+        'part': np.concatenate(list_part),
+        'vtx': np.concatenate(list_vtx),
+        'stat': np.concatenate(list_stat)
+    }
+
+
+def snap_points_to_segments(points, p0, p1, max_distance, point_ids=None, segment_ids=None):
+    """
+    Sucht fuer alle Punkte die naechste Strecke im Abstand von hoechstens max_distance;
+    die Strecken werden dafuer einem regelmaessigen Raster zugeordnet
+    :param np.array points: (n, 2), Punkte mit NaN werden uebersprungen
+    :param np.array p0: (m, 2) Anfang der Strecken
+    :param np.array p1: (m, 2) Ende der Strecken
+    :param float max_distance
+    :param np.array point_ids: (n,) optional, mit segment_ids: Strecken mit der
+        gleichen id wie der Punkt (z.B. die eigene Linie) werden nicht beruecksichtigt
+    :param np.array segment_ids: (m,)
+    :return: tuple (seg_idx (n,) -1 wenn keine Strecke gefunden, distances (n,), t (n,)
+        Parameter des naechsten Punkts auf der Strecke)
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n_points = len(points)
+    seg_idx = np.full(n_points, -1, dtype=np.int64)
+    distances = np.full(n_points, np.inf)
+    t_best = np.zeros(n_points)
+    if n_points == 0 or len(p0) == 0:
+        return seg_idx, distances, t_best
+
+    # Raster: Zellen etwa so gross wie die meisten (erweiterten) Boundingboxen der Strecken
+    extent = (np.abs(p1 - p0) + 2*max_distance).max(axis=1)
+    cell_size = max(float(np.percentile(extent, 90)), 1e-6)
+    # lange Strecken in Stuecke von hoechstens einer Zellengroesse teilen, damit jede Strecke
+    # nur in den Zellen entlang der Strecke steht (nicht in allen Zellen ihrer Boundingbox)
+    seg_vec = p1 - p0
+    n_pieces = np.maximum(np.ceil(np.hypot(seg_vec[:, 0], seg_vec[:, 1]) / cell_size), 1).astype(np.int64)
+    piece_seg = np.repeat(np.arange(len(p0)), n_pieces)
+    piece_local = np.arange(n_pieces.sum()) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+    t0 = (piece_local / n_pieces[piece_seg])[:, None]
+    t1 = ((piece_local + 1) / n_pieces[piece_seg])[:, None]
+    piece_a = p0[piece_seg] + t0*seg_vec[piece_seg]
+    piece_b = p0[piece_seg] + t1*seg_vec[piece_seg]
+    bounds_min = np.minimum(piece_a, piece_b) - max_distance
+    bounds_max = np.maximum(piece_a, piece_b) + max_distance
+    origin = bounds_min.min(axis=0)
+    cell_min = np.floor((bounds_min - origin) / cell_size).astype(np.int64)
+    cell_max = np.floor((bounds_max - origin) / cell_size).astype(np.int64)
+    n_cells_y = int(cell_max[:, 1].max()) + 1
+    n_x = cell_max[:, 0] - cell_min[:, 0] + 1
+    n_y = cell_max[:, 1] - cell_min[:, 1] + 1
+    counts = n_x * n_y
+    piece_rep = np.repeat(np.arange(len(piece_seg)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_x = cell_min[piece_rep, 0] + local % n_x[piece_rep]
+    cell_y = cell_min[piece_rep, 1] + local // n_x[piece_rep]
+    cell_keys = cell_x * n_cells_y + cell_y
+    seg_rep = piece_seg[piece_rep]
+    # jede Strecke nur einmal je Zelle
+    order = np.lexsort((seg_rep, cell_keys))
+    cell_keys = cell_keys[order]
+    cell_segs = seg_rep[order]
+    keep = np.concatenate([[True], (np.diff(cell_keys) != 0) | (np.diff(cell_segs) != 0)])
+    cell_keys = cell_keys[keep]
+    cell_segs = cell_segs[keep]
+
+    # Zelle je Punkt
+    valid = np.isfinite(points).all(axis=1)
+    point_cells = np.zeros((n_points, 2), dtype=np.int64)
+    point_cells[valid] = np.floor((points[valid] - origin) / cell_size).astype(np.int64)
+    valid &= (
+        (point_cells >= 0).all(axis=1)
+        & (point_cells[:, 0] <= cell_max[:, 0].max())
+        & (point_cells[:, 1] < n_cells_y)
+    )
+    point_keys = point_cells[:, 0] * n_cells_y + point_cells[:, 1]
+    lo = np.searchsorted(cell_keys, point_keys, side='left')
+    hi = np.searchsorted(cell_keys, point_keys, side='right')
+    n_candidates = np.where(valid, hi - lo, 0)
+
+    # Punkt-Strecken-Paare in Bloecken berechnen
+    candidate_cumsum = np.cumsum(n_candidates)
+    block_start = 0
+    while block_start < n_points:
+        block_offset = candidate_cumsum[block_start-1] if block_start > 0 else 0
+        block_stop = int(np.searchsorted(candidate_cumsum, block_offset + max_pairs_per_chunk, side='right'))
+        block_stop = min(max(block_stop, block_start + 1), n_points)
+        block = np.arange(block_start, block_stop)
+        counts_b = n_candidates[block]
+        pair_point = np.repeat(block, counts_b)
+        pair_local = np.arange(counts_b.sum()) - np.repeat(np.cumsum(counts_b) - counts_b, counts_b)
+        pair_seg = cell_segs[np.repeat(lo[block], counts_b) + pair_local]
+        a = p0[pair_seg]
+        seg_vec = p1[pair_seg] - a
+        seg_len_sq = seg_vec[:, 0]**2 + seg_vec[:, 1]**2
+        d = points[pair_point] - a
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (d[:, 0]*seg_vec[:, 0] + d[:, 1]*seg_vec[:, 1]) / seg_len_sq
+        t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+        dist = np.hypot(d[:, 0] - t*seg_vec[:, 0], d[:, 1] - t*seg_vec[:, 1])
+        within = dist <= max_distance
+        if point_ids is not None:
+            within &= point_ids[pair_point] != segment_ids[pair_seg]
+        pair_point = pair_point[within]
+        pair_seg = pair_seg[within]
+        dist = dist[within]
+        t = t[within]
+        if len(pair_point) > 0:
+            # je Punkt die naechste Strecke (bei gleichem Abstand die erste)
+            order = np.lexsort((pair_seg, dist, pair_point))
+            first = order[np.concatenate([[0], np.nonzero(np.diff(pair_point[order]))[0] + 1])]
+            seg_idx[pair_point[first]] = pair_seg[first]
+            distances[pair_point[first]] = dist[first]
+            t_best[pair_point[first]] = t[first]
+        block_start = block_stop
+    return seg_idx, distances, t_best
+
+
+def snap_points_to_lines(points, segments, max_distance):
+    """
+    Naechstes Linienobjekt, Abstand und Stationierung fuer alle Punkte
+    :param np.array points: (n, 2)
+    :param dict segments: siehe get_layer_segments
+    :param float max_distance
+    :return: tuple of np.array (fids (-1 wenn keine Linie gefunden), distances, stations)
+    """
+    seg_idx, distances, t = snap_points_to_segments(
+        points,
+        segments['p0'],
+        segments['p1'],
+        max_distance
+    )
+    found = seg_idx >= 0
+    fids = np.full(len(seg_idx), -1, dtype=np.int64)
+    stations = np.full(len(seg_idx), np.nan)
+    fids[found] = segments['fid'][seg_idx[found]]
+    seg_vec = segments['p1'][seg_idx[found]] - segments['p0'][seg_idx[found]]
+    stations[found] = segments['stat'][seg_idx[found]] + t[found]*np.hypot(seg_vec[:, 0], seg_vec[:, 1])
+    return fids, distances, stations
+
+
+def cast_ray(origin, direction, p0, p1, max_distance):
+    """
+    Schneidet einen Strahl mit Strecken und gibt den naechsten Schnittpunkt zurueck
+    :param tuple origin: (x, y) Anfang des Strahls
+    :param tuple direction: (dx, dy) Richtung des Strahls (Laenge 1)
+    :param np.array p0: (m, 2) Anfang der Strecken
+    :param np.array p1: (m, 2) Ende der Strecken
+    :param float max_distance: maximale Laenge des Strahls
+    :return: tuple (Index der Strecke, Abstand vom Anfang des Strahls) oder (-1, inf)
+    """
+    if len(p0) == 0:
+        return -1, np.inf
+    dx, dy = direction
+    r = p1 - p0
+    q = p0 - np.asarray(origin, dtype=float)
+    denom = dx*r[:, 1] - dy*r[:, 0]
+    q_cross_r = q[:, 0]*r[:, 1] - q[:, 1]*r[:, 0]
+    q_cross_d = q[:, 0]*dy - q[:, 1]*dx
+    len_r = np.hypot(r[:, 0], r[:, 1])
+    parallel = np.abs(denom) <= eps_param * np.maximum(len_r, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = q_cross_r / denom
+        u = q_cross_d / denom
+    hit = ~parallel & (u >= -eps_param) & (u <= 1 + eps_param)
+    s = np.where(hit, s, np.inf)
+    # Strecken auf dem Strahl: Schnitt am naechstgelegenen Punkt der Strecke
+    collinear = parallel & (np.abs(q_cross_d) <= eps_param * np.maximum(len_r, 1))
+    s0 = q[:, 0]*dx + q[:, 1]*dy
+    s1 = s0 + r[:, 0]*dx + r[:, 1]*dy
+    s_collinear = np.where(np.maximum(s0, s1) >= 0, np.maximum(np.minimum(s0, s1), 0), np.inf)
+    s = np.where(collinear, s_collinear, s)
+    s = np.where((s >= -eps_param) & (s <= max_distance), np.maximum(s, 0), np.inf)
+    seg_idx = int(np.argmin(s))
+    if not np.isfinite(s[seg_idx]):
+        return -1, np.inf
+    return seg_idx, float(s[seg_idx])
@@ -1,24 +1,50 @@
+import numpy as np
 import pandas as pd
 from qgis.core import (
     QgsGeometry,
-    QgsPoint,
-    QgsSpatialIndex,
+    QgsPointXY,
     QgsWkbTypes
 )
 from .check_gew_report import (
-    replace_lst_ids,
-    join_list_items
+    join_list_items,
+    resultTable
+)
+
+from .geometrie_kernels import (
+    compare_with_reference,
+    find_crossings,
+    find_overlapping_intervals,
+    get_coords_parts,
+    lineReference,
+    snap_points_to_lines
+)
+
+from .kachel_pruefung import wkbCollection
+
+from .layer_cache import segmentIndex
+
+from .stationierung_index import get_stationierung_index
+
+from .pruefpipeline import layerPipeline
+
+from .gewaessernetz import (
+    build_node_table,
+    find_wasserscheiden_senken,
+    get_lines_at_nodes
 )
 
 from .hilfsfunktionen import (
-    get_vtx,
+    get_geometry_hash,
     get_line_candidates_ids,
     get_line_to_check,
-    ranges_overlap,
-    setup_localparams_for_tests_with_comparisons,
-    sub_line_by_stats
+    preparedGeometry,
+    setup_localparams_for_tests_with_comparisons
 )
 
+# Spalten der Lagepruefung von Ereignissen (Fehlercodes siehe defaults.dict_ereign_fehler)
+columns_ereign_punkte = ['feature_id', 'Lage', 'geometry']
+columns_ereign_linien = ['gew_id', 'vtx_stat', 'Richtung', 'Anzahl', 'Lage', 'feature_id', 'geometry']
+
 
 def check_geometry_empty_or_null(geom):
     """
@@ -69,50 +95,69 @@ def check_geometry_selfintersect(geom, geom_empty):
     
 
 def handle_tests_single_geometries(
-    layer,
     layer_key,
-    layer_steps,
     report_object,
-    feedback
+    pipeline,
+    prozess_pool=None
 ):
     """
-    Diese Funktion prueft die Geometrien auf Leere, Multigeometrien und Selbstueberschneidungen
-    :param QgsVectorLayer layer
+    Registriert die Pruefung der Geometrien auf Leere, Multigeometrien und Selbstueberschneidungen
     :param str layer_key
-    :param float layer_steps
     :param layerReport report_object
-    :param QgsProcessingFeedback feedback
+    :param layerPipeline pipeline
+    :param prozessPool prozess_pool: falls angegeben, werden Selbstueberschneidungen dort geprueft
     """
-    feedback.setProgressText(
-        '--- Leere und Multigeometrien, Selbstüberschneidungen'
+    visitor = singleGeometriesVisitor(layer_key, report_object, prozess_pool)
+    pipeline.register(
+        '--- Leere und Multigeometrien, Selbstüberschneidungen',
+        visitor.visit,
+        visitor.finish
     )
-    # Listen fuer das einmalige Durchlaufen der Funktion
-    list_geom_is_empty = []
-    list_geom_is_multi = []
-    list_geom_sefintersect = []
-    for i, feature in enumerate(layer.getFeatures()):
-        feedback.setProgress(int((i+1) * layer_steps))
-        if feedback.isCanceled():
-            break
+
+
+class singleGeometriesVisitor:
+    """
+    Prueft die Geometrien auf Leere, Multigeometrien und Selbstueberschneidungen
+    """
+    def __init__(self, layer_key, report_object, prozess_pool=None):
+        self.layer_key = layer_key
+        self.report_object = report_object
+        self.prozess_pool = prozess_pool
+        self.collection = wkbCollection()
+        self.dict_tables = {
+            fehl_typ: resultTable([fehl_typ]) for fehl_typ in [
+                'geom_is_empty',
+                'geom_is_multi',
+                'geom_selfintersect'
+            ]
+        }
+
+    def visit(self, feature):
         geom = feature.geometry()
         geom_empty = check_geometry_empty_or_null(geom)
         if geom_empty:  # Leer?
-            list_geom_is_empty.append(feature.id())
+            self.dict_tables['geom_is_empty'].append([feature.id()])
         if check_geometry_multi(geom, geom_empty):  # Multigeometrien?
-            list_geom_is_multi.append(feature.id())
-        if check_geometry_selfintersect(geom, geom_empty):  # Selbstueberschneidungen?
-            list_geom_sefintersect.append(feature.id())
-    for fehl_typ, fehl_lst in zip([
-        'geom_is_empty',
-        'geom_is_multi',
-        'geom_selfintersect'
-    ],[
-        list_geom_is_empty,
-        list_geom_is_multi,
-        list_geom_sefintersect
-    ]):
-        df_i = pd.DataFrame({fehl_typ: fehl_lst})
-        report_object.add_geom_entry(layer_key, fehl_typ, df_i)
+            self.dict_tables['geom_is_multi'].append([feature.id()])
+        if self.prozess_pool is not None:
+            if not geom_empty:
+                # Selbstueberschneidungen werden in finish() im Prozess-Pool geprueft
+                add_to_collection(self.collection, feature.id(), geom)
+        elif check_geometry_selfintersect(geom, geom_empty):  # Selbstueberschneidungen?
+            self.dict_tables['geom_selfintersect'].append([feature.id()])
+
+    def finish(self):
+        if self.prozess_pool is not None:
+            dict_result = self.prozess_pool.run_tile_checks(self.collection, ['selfintersect'])
+            # nicht lesbare Geometrien (z.B. Kurven) und Grenzfaelle mit QGIS pruefen
+            self.dict_tables['geom_selfintersect'].extend([
+                [feature_id] for feature_id in sorted(dict_result['selfintersect'] + [
+                    feature_id for feature_id in dict_result['nicht_gelesen'] + dict_result['mit_qgis']
+                    if check_geometry_selfintersect(geometry_from_collection(self.collection, feature_id), False)
+                ])
+            ])
+        for fehl_typ, table in self.dict_tables.items():
+            self.report_object.add_geom_entry(self.layer_key, fehl_typ, table.to_df())
 
 
 def check_vtx_distance(vtx_geom, geom2, tolerance=1e-6):
@@ -125,17 +170,62 @@ def check_vtx_distance(vtx_geom, geom2, tolerance=1e-6):
     """
     return geom2.distance(vtx_geom) <= tolerance
 
+def add_to_collection(collection, feature_id, geom):
+    """
+    Fuegt eine Geometrie als WKB der Sammlung fuer den Prozess-Pool hinzu
+    :param wkbCollection collection
+    :param int feature_id
+    :param QgsGeometry geom
+    """
+    bbox = geom.boundingBox()
+    collection.add(
+        feature_id,
+        bytes(geom.asWkb()),
+        (bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum())
+    )
+
+
+def geometry_from_collection(collection, feature_id):
+    """
+    :param wkbCollection collection
+    :param int feature_id
+    :return: QgsGeometry
+    """
+    geom = QgsGeometry()
+    geom.fromWkb(collection.get_wkb(feature_id))
+    return geom
+
+
+def get_gew_collection(params_processing):
+    """
+    Gibt die Gewaesser als WKB fuer den Prozess-Pool zurueck und erstellt sie, falls noch nicht vorhanden
+    :param dict params_processing
+    :return: wkbCollection
+    """
+    if 'gew_collection' not in params_processing.keys():
+        collection = wkbCollection()
+        for feature in params_processing['layer_dict']['gewaesser']['layer'].getFeatures():
+            geom = feature.geometry()
+            if not check_geometry_empty_or_null(geom):
+                add_to_collection(collection, feature.id(), geom)
+        params_processing['gew_collection'] = collection
+    return params_processing['gew_collection']
+
+
 # Uebergeordnete Funktion, um Geometriepruefungen vorzubereiten und durchzuführen
 def handle_tests_geoms_comparisons(  # perform check....
     layer_key,
     report_object,
-    params_processing
+    params_processing,
+    pipeline
 ):
     """
-    Prueft Geometrien durch den Vergleich mit anderen Geometrien
+    Registriert die Pruefungen von Geometrien durch den Vergleich mit anderen Geometrien
     :param str layer_key
     :param layerReport report_object
     :param dict params_processing
+    :param layerPipeline pipeline: Pipeline des Layers layer_key
+    :return: list of layerPipeline (in der Reihenfolge der Ausfuehrung)
     """
     # Setup
     (
@@ -145,296 +235,544 @@ def handle_tests_geoms_comparisons(  # perform check....
         skip_dict,
         use_field_merged_id
     ) = setup_localparams_for_tests_with_comparisons(layer_key, params_processing)
+    if temp_key == layer_key:
+        temp_pipeline = pipeline
+        list_pipelines = [pipeline]
+    else:
+        # RL und DL gemeinsam: eigener Durchlauf fuer den zusammengefuehrten Layer
+        temp_pipeline = layerPipeline(
+            temp_layer,
+            temp_layer_steps,
+            params_processing['feedback']
+        )
+        list_pipelines = [pipeline, temp_pipeline]
 
     # Doppelte Geometrien und Überschneidungen innerhelb des Layers
     handle_tests_compare_in_own_layer(
         temp_key,
         temp_layer,
-        temp_layer_steps,
         use_field_merged_id,
         skip_dict,
         report_object,
-        params_processing
+        params_processing,
+        temp_pipeline
     )
 
     # Lage bezueglich Gewässer und Schaechte auf RL oder DL
     handle_tests_compare_other_layer(
         temp_key,
-        temp_layer,
-        temp_layer_steps,
         use_field_merged_id,
         skip_dict,
         report_object,
-        params_processing
+        params_processing,
+        temp_pipeline
     )
 
     # Ueberlappung anhand der Stationierung
     handle_tests_overlap(
-        temp_layer_steps,
         temp_key,
         skip_dict,
         report_object,
-        params_processing
+        params_processing,
+        temp_pipeline
     )
+    return list_pipelines
 
 
 def handle_tests_compare_in_own_layer(
     layer_key,
     layer,
-    layer_steps,
     use_field_merged_id,
     skip_dict,
     report_object,
-    params_processing
+    params_processing,
+    pipeline
 ):
     """
-    Führt die Tests mit Geometrievergleichen innerhalb eines Layers durch
+    Registriert die Tests mit Geometrievergleichen innerhalb eines Layers
     :param str layer_key
-    :param QgsVectorLayer layer
-    :param float layer_steps
+    :param featureStore layer
     :param bool use_field_merged_id
     :param dict skip_dict
     :param layerReport report_object
     :param dict params_processing
+    :param layerPipeline pipeline
     """
-    feedback = params_processing['feedback']
-
     # Duplikate und Ueberschneidungen
     if not skip_dict['skip_geom_duplicates_crossings']:
         if layer_key == 'layer_rldl':
-            feedback.setProgressText('--- Duplikate und Überschneidungen (RL und DL gemeinsam)')
+            description = '--- Duplikate und Überschneidungen (RL und DL gemeinsam)'
         else:
-            feedback.setProgressText('--- Duplikate und Überschneidungen')
-        df_geom_crossings, df_geom_duplicate = check_duplicates_crossings(
-            layer,
-            feedback,
-            layer_steps
-        )
-        if use_field_merged_id:
-            dict_alternative_id = {
-                feature.id(): feature[params_processing['field_merged_id']] for feature in layer.getFeatures()
-            }
-            df_geom_crossings = df_geom_crossings.apply(lambda x: replace_lst_ids(x, dict_alternative_id), axis=1)
-            df_geom_duplicate = df_geom_duplicate.apply(lambda x: replace_lst_ids(x, dict_alternative_id), axis=1)
-        report_object.add_geom_entry(
+            description = '--- Duplikate und Überschneidungen'
+        visitor = duplicatesCrossingsVisitor(
             layer_key,
-            'geom_crossings',
-            df_geom_crossings
-        )
-        report_object.add_geom_entry(
-            layer_key,
-            'geom_duplicate',
-            df_geom_duplicate
+            layer,
+            use_field_merged_id,
+            report_object,
+            params_processing
         )
+        pipeline.register(description, visitor.visit, visitor.finish)
     
     # Wasserscheiden und Senken
     if not skip_dict['skip_geom_wasserscheiden_senken']:
-        feedback.setProgressText('--- Wasserscheiden, Senken')
-        # Listen fuer das einmalige Durchlaufen der Funktion
-        visited_features_wassersch = []
-        visited_features_senken = []
-        # Listen fuer die Ergebnisse
-        list_geom_wassersch = []
-        list_geom_senken = []
-        # Da Objekte im Gew.-Layer gesucht werden, ist der andere 
-        # Spatial Index auch der des Gewaesserlayers
-        spatial_index_other = QgsSpatialIndex(layer.getFeatures())
-        for i, feature in enumerate(layer.getFeatures()):
-            feedback.setProgress(int((i+1) * layer_steps))
-            if feedback.isCanceled():
-                break
-            geom = feature.geometry()
-            feature_id = feature.id()
-            if geom:
-                if not feature_id in visited_features_wassersch:
-                    wasserscheiden = check_geometrie_wasserscheide_senke(
-                        geom,
-                        feature_id,
-                        layer,
-                        spatial_index_other
-                    )
-                    if wasserscheiden:
-                        visited_features_wassersch = list(
-                            set(visited_features_wassersch + wasserscheiden[0])  # die Geometrie wird nicht eingetragen
-                        )
-                        wasserscheiden[0] = join_list_items(wasserscheiden[0])
-                        list_geom_wassersch.append(wasserscheiden)
-                if not feature_id in visited_features_senken:
-                    senken = check_geometrie_wasserscheide_senke(
-                        geom,
-                        feature_id,
-                        layer,
-                        spatial_index_other,
-                        senke=True
-                    )
-                    if senken:
-                        visited_features_senken = list(
-                            set(visited_features_senken + senken[0])  # die Geometrie wird nicht eingetragen
-                        )
-                        senken[0] = join_list_items(senken[0])
-                        list_geom_senken.append(senken)
-        df_wasserscheiden = pd.DataFrame(
-            list_geom_wassersch,
-            columns = ['feature_id','geometry']
-        )
-        df_senken = pd.DataFrame(
-            list_geom_senken,
-            columns = ['feature_id','geometry']
-        )
-        report_object.add_geom_entry(
+        visitor = wasserscheidenSenkenVisitor(
             layer_key,
-            'geom_duplicate',
-            df_geom_duplicate
+            layer,
+            report_object,
+            params_processing
         )
-        report_object.add_geom_entry(
-            layer_key,
-            'geom_duplicate',
-            df_geom_duplicate
+        pipeline.register('--- Wasserscheiden, Senken', visitor.visit, visitor.finish)
+
+
+class duplicatesCrossingsVisitor:
+    """
+    Sucht je Objekt nach Geometrie-Duplikaten und Ueberschneidungen im selben Layer
+    """
+    def __init__(
+        self,
+        layer_key,
+        layer,
+        use_field_merged_id,
+        report_object,
+        params_processing
+    ):
+        self.layer_key = layer_key
+        self.layer = layer
+        self.report_object = report_object
+        self.spatial_index = params_processing['index_registry'].get_index(layer)
+        if use_field_merged_id:
+            self.field_merged_id = params_processing['field_merged_id']
+        else:
+            self.field_merged_id = None
+        # Ueberschneidungen gibt es nur bei Linien; sie werden nach dem Durchlauf
+        # gemeinsam fuer alle Kandidatenpaare berechnet
+        self.check_crossings = layer.geometryType() == QgsWkbTypes.LineGeometry
+        self.dict_coords = {}  # {id: [np.array (n, 2), ...]}
+        self.list_candidate_pairs = []
+        self.duplikate_per_hash = params_processing['duplikate_modus'] == 'hash'
+        self.ignore_direction = params_processing['duplikate_richtung_ignorieren']
+        self.dict_hash_groups = {}  # {hash: [id1, id2, ...]}
+        self.dict_alternative_id = {}
+        self.list_geom_duplicate = []
+        self.list_geom_crossings = []
+        self.visited_groups_crossings = set()
+        self.visited_groups_equal = set()
+        self.prozess_pool = params_processing.get('prozess_pool')
+        self.feedback = params_processing['feedback']
+        self.collection = wkbCollection()
+
+    def visit(self, feature):
+        if self.field_merged_id:
+            self.dict_alternative_id[feature.id()] = feature[self.field_merged_id]
+        geom = feature.geometry()
+        if self.prozess_pool is not None:
+            # Ueberschneidungen und Duplikate (per Hashwert) werden in finish() im Prozess-Pool gesucht
+            if not check_geometry_empty_or_null(geom):
+                add_to_collection(self.collection, feature.id(), geom)
+        elif self.duplikate_per_hash and not check_geometry_empty_or_null(geom):
+            geom_hash = get_geometry_hash(geom, self.ignore_direction)
+            if geom_hash in self.dict_hash_groups.keys():
+                self.dict_hash_groups[geom_hash].append(feature.id())
+            else:
+                self.dict_hash_groups[geom_hash] = [feature.id()]
+        if self.check_crossings and self.prozess_pool is None and not check_geometry_empty_or_null(geom):
+            feature_id = feature.id()
+            self.dict_coords[feature_id] = get_coords_parts(geom)
+            self.list_candidate_pairs.extend([
+                (feature_id, fid) for fid in self.spatial_index.intersects(geom.boundingBox()) if fid > feature_id
+            ])
+        if not self.duplikate_per_hash:
+            _, list_duplicates_i = check_duplicates_crossings(
+                geom,
+                feature.id(),
+                self.layer,
+                self.spatial_index,
+                self.visited_groups_equal,
+                self.visited_groups_crossings,
+                ignore_direction=self.ignore_direction,
+                with_crossings=False
+            )
+            self.list_geom_duplicate.extend(list_duplicates_i)
+
+    def check_in_prozess_pool(self):
+        """
+        Ueberschneidungen und Gruppen moeglicher Duplikate aus dem Prozess-Pool; die Duplikate
+        werden wie ohne Prozess-Pool mit check_duplicates_by_hash bestaetigt
+        """
+        checks = (['duplicates'] if self.duplikate_per_hash else []) + (['crossings'] if self.check_crossings else [])
+        if len(checks) == 0:
+            return
+        dict_result = self.prozess_pool.run_tile_checks(
+            self.collection,
+            checks,
+            ignore_direction=self.ignore_direction,
+            feedback=self.feedback
         )
+        if self.duplikate_per_hash:
+            self.dict_hash_groups = {('kachel', i): group for i, group in enumerate(dict_result['duplicates'])}
+            self.add_unread_to_hash_groups(dict_result['nicht_gelesen'])
+        self.list_geom_crossings = [
+            [id1, id2, get_crossing_geometry(points)] for id1, id2, points in dict_result['crossings']
+        ]
+        # nicht lesbare Geometrien (z.B. Kurven) wie ohne Prozess-Pool pruefen
+        list_candidate_pairs = []
+        set_nicht_gelesen = set(dict_result['nicht_gelesen'])
+        for feature_id in dict_result['nicht_gelesen']:
+            geom = self.layer.geometry(feature_id)
+            if self.check_crossings:
+                for fid in self.spatial_index.intersects(geom.boundingBox()):
+                    if fid != feature_id and (fid not in set_nicht_gelesen or fid > feature_id):
+                        list_candidate_pairs.append((min(feature_id, fid), max(feature_id, fid)))
+                        for fid_i in [feature_id, fid]:
+                            if fid_i not in self.dict_coords.keys():
+                                self.dict_coords[fid_i] = get_coords_parts(self.layer.geometry(fid_i))
+        if len(list_candidate_pairs) > 0:
+            self.list_geom_crossings.extend(
+                check_crossings_vectorized(self.dict_coords, list_candidate_pairs)
+            )
+            self.list_geom_crossings.sort(key=lambda x: (x[0], x[1]))
+
+    def add_unread_to_hash_groups(self, list_nicht_gelesen):
+        """
+        Ordnet die im Prozess-Pool nicht gelesenen Geometrien den Gruppen zu: Objekte mit
+        gleichem Hashwert (get_geometry_hash) kommen wie ohne Prozess-Pool in eine Gruppe,
+        auch wenn die uebrigen Objekte der Gruppe im Prozess-Pool gelesen wurden
+        :param list list_nicht_gelesen: [id, ...]
+        """
+        set_nicht_gelesen = set(list_nicht_gelesen)
+        group_of_fid = {
+            fid: group_key for group_key, group in self.dict_hash_groups.items() for fid in group
+        }
+        dict_unread_groups = {}  # {hash: [id, ...]}
+        for feature_id in list_nicht_gelesen:
+            geom_hash = get_geometry_hash(self.layer.geometry(feature_id), self.ignore_direction)
+            dict_unread_groups.setdefault(geom_hash, []).append(feature_id)
+        for geom_hash, list_ids in dict_unread_groups.items():
+            # gleicher Hashwert = gleiche Stuetzpunkte, also auch gleiche Boundingbox
+            for fid in get_line_candidates_ids(self.layer.geometry(list_ids[0]), self.spatial_index):
+                if fid in set_nicht_gelesen:
+                    continue
+                if get_geometry_hash(self.layer.geometry(fid), self.ignore_direction) == geom_hash:
+                    if fid in group_of_fid.keys():
+                        self.dict_hash_groups[group_of_fid[fid]].extend(list_ids)
+                    else:
+                        self.dict_hash_groups[geom_hash] = [fid] + list_ids
+                    break
+            else:
+                self.dict_hash_groups[geom_hash] = list_ids
+
+    def finish(self):
+        if self.prozess_pool is not None:
+            self.check_in_prozess_pool()
+        elif self.check_crossings:
+            self.list_geom_crossings = check_crossings_vectorized(
+                self.dict_coords,
+                self.list_candidate_pairs
+            )
+        if self.duplikate_per_hash:
+            self.list_geom_duplicate = check_duplicates_by_hash(
+                self.dict_hash_groups,
+                self.layer,
+                self.ignore_direction
+            )
+        for error_name, list_geom in [
+            ['geom_crossings', self.list_geom_crossings],
+            ['geom_duplicate', self.list_geom_duplicate]
+        ]:
+            table = resultTable(['id1', 'id2', 'geometry'])
+            if self.field_merged_id:
+                # id() mit merged_id (Layername und id) ersetzen
+                table.extend([
+                    [
+                        self.dict_alternative_id.get(id1, id1),
+                        self.dict_alternative_id.get(id2, id2),
+                        geom
+                    ] for id1, id2, geom in list_geom
+                ])
+            else:
+                table.extend(list_geom)
+            self.report_object.add_geom_entry(
+                self.layer_key,
+                error_name,
+                table.to_df()
+            )
+
 
 def check_duplicates_crossings(
+    geom,
+    feature_id,
     layer,
-    feedback,
-    layer_steps,
+    spatial_index,
+    visited_groups_equal,
+    visited_groups_crossings,
+    with_duplicates=True,
+    ignore_direction=False,
+    with_crossings=True
 ):
     """
-    Ueberprueft ob es im Layer Geometrie-Duplikate oder Ueberschneidungen gibt
-    :param QgsVectorLayer layer
-    :param QgsProcessingFeedbackfeedback
-    :param float layer_steps
-    :return tuple: (list_crossing = [], list_duplicates = [])
+    Ueberprueft ob es im Layer Duplikate der Geometrie oder Ueberschneidungen mit ihr gibt
+    :param QgsGeometry geom
+    :param int feature_id
+    :param featureStore layer
+    :param QgsSpatialIndex spatial_index
+    :param set visited_groups_equal: bereits gefundene Paare (wird ergaenzt)
+    :param set visited_groups_crossings: bereits gefundene Paare (wird ergaenzt)
+    :param bool with_duplicates: Duplikate paarweise pruefen? (sonst check_duplicates_by_hash)
+    :param bool ignore_direction: umgekehrte Stuetzpunktreihenfolge gilt als Duplikat
+    :param bool with_crossings: Ueberschneidungen paarweise pruefen? (sonst check_crossings_vectorized)
+    :return tuple: (list_crossings = [], list_duplicates = [])
     """
     list_geom_duplicate = []
     list_geom_crossings = []
-    visited_groups_crossings = set()
-    visited_groups_equal = set()
-    spatial_index = QgsSpatialIndex(layer.getFeatures())
-    column_names = ['id1', 'id2', 'geometry']
-    for i, feature in enumerate(layer.getFeatures()):
-        feedback.setProgress(int((i+1) * layer_steps))
-        if feedback.isCanceled():
-            break
-        geom = feature.geometry()
-        feature_id = feature.id()
-        if geom.isEmpty() or geom.isNull():
+    if geom.isEmpty() or geom.isNull():
+        return list_geom_crossings, list_geom_duplicate
+    if geom.type() == 0:  # Point
+        intersecting_ids = spatial_index.intersects(geom.boundingBox().buffered(0.2))
+    else:
+        intersecting_ids = spatial_index.intersects(geom.boundingBox())
+    # Die Geometrie wird einmal fuer alle Vergleiche vorbereitet
+    geom_prepared = preparedGeometry(geom)
+    for fid in intersecting_ids:
+        if fid == feature_id:
             continue
-        if geom.type() == 0:  # Point
-            intersecting_ids = spatial_index.intersects(geom.boundingBox().buffered(0.2))
-        else:
-            intersecting_ids = spatial_index.intersects(geom.boundingBox())
-        for fid in intersecting_ids:
-            if feedback.isCanceled():
-                break
-            if fid == feature_id:
-                continue
-            group_i = tuple(sorted([feature_id, fid]))
-            other_feature = layer.getFeature(fid)
-            other_geom = other_feature.geometry()
-            if geom.equals(other_geom):
-                if group_i in visited_groups_equal:
-                    pass
-                else:
-                    list_geom_duplicate.append(list(group_i)+[geom])
-                    visited_groups_equal.add(group_i)
-            if geom.crosses(other_geom):
-                if group_i in visited_groups_crossings:
-                    pass
-                else:
-                    intersection_point = geom.intersection(other_geom)
-                    list_geom_crossings.append(list(group_i)+[intersection_point])
-                    visited_groups_crossings.add(group_i)
-    df_geom_crossings = pd.DataFrame(list_geom_crossings, columns = column_names)
-    df_geom_duplicate = pd.DataFrame(list_geom_duplicate, columns = column_names)
-    return df_geom_crossings, df_geom_duplicate
+        group_i = tuple(sorted([feature_id, fid]))
+        other_geom = layer.geometry(fid)
+        if with_duplicates and geom_prepared.equals(other_geom, ignore_direction):
+            if group_i in visited_groups_equal:
+                pass
+            else:
+                list_geom_duplicate.append(list(group_i)+[geom])
+                visited_groups_equal.add(group_i)
+        if with_crossings and geom_prepared.crosses(other_geom):
+            if group_i in visited_groups_crossings:
+                pass
+            else:
+                intersection_point = geom.intersection(other_geom)
+                list_geom_crossings.append(list(group_i)+[intersection_point])
+                visited_groups_crossings.add(group_i)
+    return list_geom_crossings, list_geom_duplicate
+
+
+def check_crossings_vectorized(
+    dict_coords,
+    list_candidate_pairs
+):
+    """
+    Ermittelt sich kreuzende Linien fuer alle Kandidatenpaare gemeinsam (NumPy)
+    :param dict dict_coords: {id: [np.array (n, 2), ...]}
+    :param list list_candidate_pairs: [(id1, id2), ...] mit id1 < id2
+    :return: list of lists [[id1, id2, geometry], ...]
+    """
+    return [
+        [id1, id2, get_crossing_geometry(points)]
+        for id1, id2, points in find_crossings(dict_coords, list_candidate_pairs)
+    ]
+
+
+def get_crossing_geometry(points):
+    """
+    :param np.array points: (k, 2) Schnittpunkte
+    :return: QgsGeometry (Punkt oder Multipunkt)
+    """
+    list_points = [QgsPointXY(x, y) for x, y in points]
+    if len(list_points) == 1:
+        return QgsGeometry.fromPointXY(list_points[0])
+    else:
+        return QgsGeometry.fromMultiPointXY(list_points)
+
+
+def check_geometries_equal(geom, other_geom, ignore_direction=False):
+    """
+    Prueft zwei Geometrien auf Gleichheit
+    :param QgsGeometry geom
+    :param QgsGeometry other_geom
+    :param bool ignore_direction: umgekehrte Stuetzpunktreihenfolge gilt als gleich
+    :return: bool
+    """
+    if geom.equals(other_geom):
+        return True
+    elif ignore_direction:
+        return geom.isGeosEqual(other_geom)
+    else:
+        return False
+
+
+def check_duplicates_by_hash(
+    dict_hash_groups,
+    layer,
+    ignore_direction=False
+):
+    """
+    Ermittelt Geometrie-Duplikate aus den nach Hashwert gruppierten Objekten;
+    nur bei gleichem Hashwert wird die Gleichheit mit equals() bestaetigt
+    :param dict dict_hash_groups: {hash: [id1, id2, ...]}
+    :param featureStore layer
+    :param bool ignore_direction: umgekehrte Stuetzpunktreihenfolge gilt als Duplikat
+    :return: list of lists [[id1, id2, geometry], ...]
+    """
+    list_geom_duplicate = []
+    for list_ids in dict_hash_groups.values():
+        if len(list_ids) < 2:
+            continue
+        # Klassen gleicher Geometrien innerhalb eines Hashwerts (Kollisionen moeglich)
+        list_classes = []
+        for feature_id in sorted(list_ids):
+            geom = layer.geometry(feature_id)
+            for class_ids in list_classes:
+                if check_geometries_equal(geom, layer.geometry(class_ids[0]), ignore_direction):
+                    class_ids.append(feature_id)
+                    break
+            else:
+                list_classes.append([feature_id])
+        for class_ids in list_classes:
+            geom = layer.geometry(class_ids[0])
+            list_geom_duplicate.extend([
+                [id1, id2, geom] for i, id1 in enumerate(class_ids) for id2 in class_ids[i+1:]
+            ])
+    return list_geom_duplicate
+
+
+class wasserscheidenSenkenVisitor:
+    """
+    Sammelt beim Durchlauf den ersten und letzten Stuetzpunkt jeder Linie und ermittelt
+    daraus die Wasserscheiden und Senken (siehe gewaessernetz.build_node_table)
+    """
+    def __init__(
+        self,
+        layer_key,
+        layer,
+        report_object,
+        params_processing
+    ):
+        self.layer_key = layer_key
+        self.layer = layer
+        self.report_object = report_object
+        self.params_processing = params_processing
+        self.spatial_index = params_processing['index_registry'].get_index(layer)
+        self.list_fid = []
+        self.list_start = []
+        self.list_end = []
+
+    def visit(self, feature):
+        geom = feature.geometry()
+        if geom.isNull() or geom.isEmpty():
+            return
+        vtx_start = geom.vertexAt(0)
+        vtx_end = geom.vertexAt(geom.constGet().nCoordinates() - 1)
+        self.list_fid.append(feature.id())
+        self.list_start.append((vtx_start.x(), vtx_start.y()))
+        self.list_end.append((vtx_end.x(), vtx_end.y()))
+
+    def finish(self):
+        list_geom_wassersch = []
+        list_geom_senken = []
+        if len(self.list_fid) > 0:
+            array_ids = np.array(self.list_fid, dtype=np.int64)
+            node_table = build_node_table(
+                np.array(self.list_start, dtype=float),
+                np.array(self.list_end, dtype=float)
+            )
+            nodes_wassersch, nodes_senken = find_wasserscheiden_senken(node_table)
+            list_geom_wassersch = check_geometrie_wasserscheide_senke(
+                node_table,
+                nodes_wassersch,
+                array_ids,
+                self.layer,
+                self.spatial_index
+            )
+            list_geom_senken = check_geometrie_wasserscheide_senke(
+                node_table,
+                nodes_senken,
+                array_ids,
+                self.layer,
+                self.spatial_index,
+                senke=True
+            )
+        for error_name, list_geom in [
+            ['wasserscheiden', list_geom_wassersch],
+            ['senken', list_geom_senken]
+        ]:
+            table = resultTable(['feature_id', 'geometry'])
+            table.extend(list_geom)
+            self.report_object.add_geom_entry(
+                self.layer_key,
+                error_name,
+                table.to_df()
+            )
+
 
 def check_geometrie_wasserscheide_senke(
-    geom,
-    feature_id,
+    node_table,
+    node_ids,
+    array_ids,
     layer_gew,
-    spatial_index_other,
+    spatial_index_gew,
     senke=False
 ):
     '''
-    Ueberprueft ob die Geometrie mit anderen Geometrien eine Wasserscheide oder Senke bildet
-    :param QgsGeometry geom: Geometrie des aktuellen Gewaesserobjekts
-    :param int feature_id: id() des aktuellen Gewaesserobjekts
-    :param QgsVectorLayer (line) layer_gew
-    :param QgsSpatialIndex spatial_index_other
+    Erstellt die Eintraege fuer Wasserscheiden oder Senken aus der Knotentabelle;
+    Knoten, die im Inneren einer weiteren Linie liegen, sind keine Wasserscheide / Senke
+    :param dict node_table: siehe gewaessernetz.build_node_table
+    :param np.array node_ids: Knoten-ids der Wasserscheiden oder Senken
+    :param np.array array_ids: id() der Gewaesserobjekte in der Reihenfolge der Knotentabelle
+    :param featureStore (line) layer_gew
+    :param QgsSpatialIndex spatial_index_gew
     :param bool senke
-    :return None or list [[feature_id, id2, ..., idn], vtx_geom]
+    :return: list of lists [['id1, id2, ...', vtx_geom], ...]
     '''
-    if senke:
-        vtx_num = 0
-    else:
-        vtx_num = -1
-    vtx = get_vtx(geom, vtx_num)  # QgsGeometry
-    intersecting_lines = get_line_candidates_ids(
-        vtx,
-        spatial_index_other
-    )
-    if feature_id in intersecting_lines:
-        # die eigene id() entfernen
-        intersecting_lines.remove(feature_id)
-    if len(intersecting_lines) == 0:
-        return None# Quelle oder Muendung (korrekt)
-    else:
-        check_dupl_list = []
-        for line_id in intersecting_lines:
-            inters_line_geom = layer_gew.getFeature(line_id).geometry()
-            check_vtx = get_vtx(inters_line_geom, vtx_num)  # der zu pruefende Stuetzpunkt
-            if vtx.equals(check_vtx):
-                check_dupl_list.append(1)
-            else:
-                check_dupl_list.append(0)
-        if all([x == 1 for x in check_dupl_list]):
-            return [sorted([feature_id] + intersecting_lines)]+[vtx]
-        else:
-            return None
+    list_result = []
+    dict_lines_at_nodes = get_lines_at_nodes(node_table, node_ids, at_end=not senke)
+    for node_id, line_idx in dict_lines_at_nodes.items():
+        node_ids_lines = sorted(array_ids[line_idx].tolist())
+        x, y = node_table['coords'][node_id]
+        vtx = QgsGeometry.fromPointXY(QgsPointXY(x, y))
+        # weitere Linien, die den Knoten beruehren (nicht mit Anfang / Ende)?
+        other_lines = [
+            line_id for line_id in get_line_candidates_ids(vtx, spatial_index_gew)
+            if line_id not in node_ids_lines and check_vtx_distance(vtx, layer_gew.geometry(line_id))
+        ]
+        if len(other_lines) == 0:
+            list_result.append([join_list_items(node_ids_lines), vtx])
+    return list_result
 
 
 # Vergleich mit anderen Layern
 def handle_tests_compare_other_layer(
     layer_key,
-    layer,
-    layer_steps,
     use_field_merged_id,
     skip_dict,
     report_object,
-    params_processing
+    params_processing,
+    pipeline
 ):
     """
-    Pruef die Lage auf Objekten eines anderen Layers nur fuer Ereignisse
+    Registriert die Pruefung der Lage auf Objekten eines anderen Layers nur fuer Ereignisse
     :param str layer_key
-    :param QgsVectorLayer layer
-    :param float layer_steps
     :param bool use_field_merged_id
     :param dict skip_dict
     :param layerReport report_object
     :param dict params_processing
+    :param layerPipeline pipeline
     """
     feedback = params_processing['feedback']
 
     # Lage der Ereignisse auf den Gewässern
     if not skip_dict['skip_geom_ereign_auf_gew']:
         if layer_key == 'layer_rldl':
-            feedback.setProgressText(
+            description = (
                 '--- Korrekte Lage von Ereignissen '
                 + 'auf Gewässern (RL und DL gemeinsam)'
             )
         else:
-            feedback.setProgressText('--- Korrekte Lage von Ereignissen auf Gewässern')
-        df_vtx_bericht = check_location_event_on_river(
+            description = '--- Korrekte Lage von Ereignissen auf Gewässern'
+        visitor = eventOnRiverVisitor(
             layer_key,
-            layer,
-            layer_steps,
+            pipeline.layer,
             use_field_merged_id,
+            report_object,
             params_processing
         )
-        report_object.add_geom_entry(
-            layer_key,
-            'geom_ereign_auf_gew',
-            df_vtx_bericht
-        )
+        pipeline.register(description, visitor.visit, visitor.finish)
 
     # Liegen Schaechte korrekt auf RL oder DL?
     if skip_dict['skip_geom_schacht_auf_rldl'] and layer_key == 'schaechte':
@@ -444,22 +782,18 @@ def handle_tests_compare_other_layer(
             + 'Kein(e) Layer für Rohrleitungen und Durchlässe)'
         )
     if not skip_dict['skip_geom_schacht_auf_rldl']:
-        feedback.setProgressText(
-            '--- Korrekte Lage von Schächten an/auf '
-            + 'Rohrleitungen und Durchlässen'
-        )
-        df_schaechte_auf_rldl = check_schaechte_auf_rldl(
+        visitor = schaechteAufRldlVisitor(
             layer_key,
-            layer,
-            layer_steps,
             report_object,
             params_processing
         )
-        report_object.add_geom_entry(
-            layer_key,
-            'geom_schacht_auf_rldl',
-            df_schaechte_auf_rldl
-        )
+        if visitor.other_layer:
+            pipeline.register(
+                '--- Korrekte Lage von Schächten an/auf '
+                + 'Rohrleitungen und Durchlässen',
+                visitor.visit,
+                visitor.finish
+            )
 
 
 def check_line_geom_on_line(
@@ -467,79 +801,39 @@ def check_line_geom_on_line(
     feature_id_temp,
     gew_layer,
     spatial_index_other,
-    with_stat=False
+    with_stat=False,
+    line_references=None
 ):
     """
     Prueft ob sich eine eine Linieneometrie (geom) korrekt auf einem anderen Linienobjekt des layers gew_layer befindet
     :param QgsGeometry (Line) geom
     :param str feature_id_temp: Id des Objekts
-    :param QgsVectorLayer (Line) gew_layer
-    :param QgsSpatialIndex spatial_index_other
+    :param featureStore (Line) gew_layer
+    :param QgsSpatialIndex or segmentIndex spatial_index_other: mit einem segmentIndex wird
+        die Stationierung der Stuetzpunkte direkt ueber die naechste Strecke ermittelt
     :param bool with_stat: Rückgabe der Stationierung?; default: False
-    :return: pd.Series
+    :param stationierungIndex line_references: Stationierungsindex des gew_layer
+    :return: dict {Spalte: Wert} (siehe columns_ereign_linien)
     """
-    sr_vtx_report = pd.Series()  # Fehlermeldungen siehe defaults.dict_ereign_fehler
+    dict_vtx_report = {}  # Fehlermeldungen siehe defaults.dict_ereign_fehler
     other_line_ft = get_line_to_check(geom, gew_layer, spatial_index_other)
-    sr_vtx_report['gew_id'] = other_line_ft.id()
-    gew_i_geom = other_line_ft.geometry()
-    list_gew_stat = []
-    list_vtx_geom = [QgsGeometry(vtx) for vtx in geom.vertices()]
-
-    # Stationierung
-    for vtx in list_vtx_geom:
-        # naechster Punkt auf dem Gewaesser, als Point XY
-        nearest_gew_point = gew_i_geom.nearestPoint(vtx)
-        nearest_gew_xy = nearest_gew_point.asPoint()
-        # naechster Stuetzpunkt danach
-        result_tuple = gew_i_geom.closestSegmentWithContext(nearest_gew_xy)
-        # Linie bis zum Punkt -> Stationierung
-        if gew_i_geom.isMultipart():
-            gew_i_geom_polyline = gew_i_geom.asMultiPolyline()
-            first_segment = gew_i_geom_polyline[0][:result_tuple[2]]+[result_tuple[1]]
-        else:
-            gew_i_geom_polyline = gew_i_geom.asPolyline()
-            first_segment = gew_i_geom_polyline[:result_tuple[2]]+[result_tuple[1]]
-        first_segment = [QgsPoint(p) for p in first_segment]
-        first_segment_geom = QgsGeometry.fromPolyline(first_segment)
-        stationierung = first_segment_geom.length()
-        list_gew_stat.append(stationierung)
-
-    # Richtung
-    if with_stat:
-        sr_vtx_report['vtx_stat'] = list_gew_stat
-    if list_gew_stat == sorted(list_gew_stat):
-        sr_vtx_report['Richtung'] = 0  # korrekt
-    elif list_gew_stat == (sorted(list_gew_stat))[::-1]:
-        sr_vtx_report['Richtung'] = 1  # entgegengesetzte Richtung 
+    dict_vtx_report['gew_id'] = other_line_ft.id()
+    if line_references is None:
+        gew_reference = lineReference.from_geometry(other_line_ft.geometry())
     else:
-        sr_vtx_report['Richtung'] = 2  # falsche Reihenfolge
-
-    # Den Linienabschnitt zum Vergleich generieren
-    sub_line = sub_line_by_stats(gew_i_geom, list_gew_stat[0] , list_gew_stat[-1])
-    list_sub_line_vtx_geom = [QgsGeometry(vtx) for vtx in sub_line.vertices()]
-
-    # Anzahl der Stützpunkte
-    if len(list_vtx_geom) == len(list_sub_line_vtx_geom):
-        sr_vtx_report['Anzahl'] = 0  # korrekt
-    if len(list_vtx_geom) > len(list_sub_line_vtx_geom):
-        sr_vtx_report['Anzahl'] = 1  # zu viele
-    if len(list_vtx_geom) < len(list_sub_line_vtx_geom):
-        sr_vtx_report['Anzahl'] = 2  # zu wenige
-
-    # Lage
-    list_point_on_line = []
-    for vtx_geom, vtx_subline in zip(list_vtx_geom, list_sub_line_vtx_geom):
-        list_point_on_line.append(
-            check_vtx_distance(
-                vtx_geom,
-                vtx_subline
-            )
-        )
-    if not all(list_point_on_line):
-        sr_vtx_report['Lage'] = [1, [str(i) for i, b in enumerate(list_point_on_line) if not b]]  # Abweichung
-    else:
-        sr_vtx_report['Lage'] = 0 # Korrekt
-    return sr_vtx_report
+        gew_reference = line_references.get(other_line_ft.id())
+    vtx_coords = get_coords_parts(geom)[0]
+    array_stat = None
+    if isinstance(spatial_index_other, segmentIndex):
+        # wie lineReference.from_geometry: erster Teil des Gewaessers
+        array_stat = spatial_index_other.locate_points_on_feature(vtx_coords, other_line_ft.id(), part=0)
+    dict_vergleich = compare_with_reference(vtx_coords, gew_reference, array_stat)
+    if with_stat:
+        dict_vtx_report['vtx_stat'] = dict_vergleich['vtx_stat']
+    dict_vtx_report['Richtung'] = dict_vergleich['Richtung']  # 0 korrekt, 1 entgegengesetzt, 2 falsche Reihenfolge
+    dict_vtx_report['Anzahl'] = dict_vergleich['Anzahl']  # 0 korrekt, 1 zu viele, 2 zu wenige
+    dict_vtx_report['Lage'] = dict_vergleich['Lage']  # 0 korrekt oder [1, [Stuetzpunkte]]
+    return dict_vtx_report
 
 
 
@@ -576,135 +870,336 @@ def check_overlap_by_stat(params_processing, report_object):
     if df_vorher is None:
         return []
     else:
-        # Das Stationierungs-Dict je Gewaesser aufbereiten
-        dict_stat = {}
-        df_vorher['start'] = [min(lst) if isinstance(lst, list) else -1 for lst in df_vorher['vtx_stat']]
-        df_vorher['stop'] = [max(lst) if isinstance(lst, list) else -1 for lst in df_vorher['vtx_stat']]
-        for i in df_vorher.index:
-            if feedback.isCanceled():
-                break
-            elem = df_vorher.loc[i,:]
-            gew_id = elem['gew_id']
-            feature_id = elem['feature_id']
-            start = elem['start']
-            stop = elem['stop']
-            geom = elem['geometry']
-            lst_i = [feature_id, start, stop, geom]
-            if gew_id in dict_stat.keys():
-                dict_stat[gew_id].append(lst_i)
-            else:
-                dict_stat[gew_id] = [lst_i]
-
-        # nun fuer jedes gewaesser einmal pruefen
-        lst_overlap = []
-        for key, lst in dict_stat.items():
-            if len(lst) > 1:
-                lst_overlap_i = [ranges_overlap(lst[i], lst[j])
-                    for i in range(len(lst))
-                    for j in range(i + 1, len(lst))
-                ]
-                lst_overlap_i = [k for k in lst_overlap_i if k]
-                lst_overlap = lst_overlap+lst_overlap_i
+        # Anfang und Ende je Ereignis, Gewaesser als Gruppen (in Reihenfolge des Auftretens)
+        array_start = np.array(
+            [min(lst) if isinstance(lst, list) else -1 for lst in df_vorher['vtx_stat']],
+            dtype=float
+        )
+        array_stop = np.array(
+            [max(lst) if isinstance(lst, list) else -1 for lst in df_vorher['vtx_stat']],
+            dtype=float
+        )
+        gew_codes, _ = pd.factorize(df_vorher['gew_id'])
+        valid = (gew_codes >= 0) & (array_start >= 0)
+        if feedback.isCanceled():
+            return []
+        valid_idx = np.nonzero(valid)[0]
+        idx_i, idx_j = find_overlapping_intervals(
+            gew_codes[valid_idx],
+            array_start[valid_idx],
+            array_stop[valid_idx]
+        )
+        idx_i = valid_idx[idx_i]
+        idx_j = valid_idx[idx_j]
+        feature_ids = df_vorher['feature_id'].to_numpy()
+        geometries = df_vorher['geometry'].to_numpy()
+        lst_overlap = [
+            [feature_ids[i], feature_ids[j], geometries[i]] for i, j in zip(idx_i, idx_j)
+        ]
         return lst_overlap
 
-def check_location_event_on_river(
-    layer_key,
-    layer,
-    layer_steps,
-    use_field_merged_id,
-    params_processing
-):
+class eventOnRiverVisitor:
     """
-    Prueft die Lage der Ereignisse auf den Gewaessern
-    :param str layer_key
-    :param QgsVectorLayer layer
-    :param float layer_steps
-    :param bool use_field_merged_id
-    :param dict params_processing
-    :return: pd.DataFrame
+    Prueft je Ereignis die Lage auf den Gewaessern
     """
-    feedback = params_processing['feedback']
-    layer_gew = params_processing['layer_dict']['gewaesser']['layer']
-    spatial_index_gew = QgsSpatialIndex(layer_gew.getFeatures())
-    list_vtx_bericht = []
-    for i, feature in enumerate(layer.getFeatures()):
-        if feedback.isCanceled():
-            break
-        feedback.setProgress(int((i+1) * layer_steps))
-        if not use_field_merged_id:
+    def __init__(
+        self,
+        layer_key,
+        layer,
+        use_field_merged_id,
+        report_object,
+        params_processing
+    ):
+        self.layer_key = layer_key
+        self.report_object = report_object
+        self.is_point_layer = layer.geometryType() == QgsWkbTypes.PointGeometry
+        if use_field_merged_id:
+            self.field_merged_id = params_processing['field_merged_id']
+        else:
+            self.field_merged_id = None
+        self.layer_gew = params_processing['layer_dict']['gewaesser']['layer']
+        self.spatial_index_gew = params_processing['index_registry'].get_index(self.layer_gew)
+        if 'line_references' not in params_processing.keys():
+            params_processing['line_references'] = get_stationierung_index(
+                self.layer_gew,
+                params_processing['feedback']
+            )
+        self.line_references = params_processing['line_references']
+        self.params_processing = params_processing
+        if self.is_point_layer:
+            self.table = resultTable(columns_ereign_punkte)
+        else:
+            self.table = resultTable(columns_ereign_linien)
+        self.list_points = []  # [[feature_id_temp, geom], ...]
+        self.prozess_pool = params_processing.get('prozess_pool')
+        self.collection = wkbCollection()
+        self.dict_events = {}  # {id(): [feature_id_temp, geom]}, nur mit Prozess-Pool
+
+    def visit(self, feature):
+        if not self.field_merged_id:
             feature_id_temp = feature.id()
         else:
-            feature_id_temp = feature[params_processing['field_merged_id']]  # id + layername
+            feature_id_temp = feature[self.field_merged_id]  # id + layername
         geom = feature.geometry()
-        if check_geometry_empty_or_null(geom):
-            pass
-        elif check_geometry_multi(geom, geom_empty=False): 
-            pass
-        else:
-            series_vtx_bericht = pd.Series()
-            #Linie / Punkt auf Gewaesserlinie ?
-            if layer.geometryType() == QgsWkbTypes.PointGeometry:  # Point
-                series_vtx_bericht['feature_id'] = feature_id_temp
-                line_feature = get_line_to_check(geom, layer_gew, spatial_index_gew)
-                if line_feature:
-                    if not check_vtx_distance(geom, line_feature.geometry()):
-                        # Distanz zum naechsten Gewaesser zu gross
-                        series_vtx_bericht['Lage'] = 1
-                    else:
-                        continue
-                else:
-                    # kein Gewaesser in der Naehe gefunden
-                    series_vtx_bericht['Lage'] = 1
-            else:  # Line
-                series_vtx_bericht = check_line_geom_on_line(
-                    geom,
-                    feature_id_temp,
-                    layer_gew,
-                    spatial_index_gew,
-                    with_stat=True
+        if self.prozess_pool is not None:
+            # alle Ereignisse werden in finish() im Prozess-Pool geprueft
+            if not (check_geometry_empty_or_null(geom) or check_geometry_multi(geom, geom_empty=False)):
+                self.dict_events[feature.id()] = [feature_id_temp, geom]
+                add_to_collection(self.collection, feature.id(), geom)
+            return
+        if self.is_point_layer:
+            # Punkte werden gesammelt und in finish() gemeinsam geprueft
+            if not (check_geometry_empty_or_null(geom) or check_geometry_multi(geom, geom_empty=False)):
+                self.list_points.append([feature_id_temp, geom])
+            return
+        dict_vtx_bericht = check_location_event_on_river(
+            geom,
+            feature_id_temp,
+            self.is_point_layer,
+            self.layer_gew,
+            self.spatial_index_gew,
+            self.line_references
+        )
+        if dict_vtx_bericht is not None:
+            self.table.append(**dict_vtx_bericht)
+
+    def check_in_prozess_pool(self):
+        """
+        Prueft alle Ereignisse im Prozess-Pool und traegt die fehlerhaften in self.table ein
+        """
+        dict_result = self.prozess_pool.run_tile_checks(
+            self.collection,
+            ['ereign'],
+            collection_gew=get_gew_collection(self.params_processing),
+            feedback=self.params_processing['feedback']
+        )
+        for feature_id, gew_id, dict_vergleich in dict_result['ereign']:
+            feature_id_temp, geom = self.dict_events[feature_id]
+            if dict_vergleich is None:
+                # kein Gewaesser in der Naehe gefunden oder Distanz zum naechsten Gewaesser zu gross
+                self.table.append(feature_id=feature_id_temp, Lage=1, geometry=geom)
+            else:
+                self.table.append(
+                    gew_id=gew_id,
+                    vtx_stat=dict_vergleich['vtx_stat'],
+                    Richtung=dict_vergleich['Richtung'],
+                    Anzahl=dict_vergleich['Anzahl'],
+                    Lage=dict_vergleich['Lage'],
+                    feature_id=feature_id_temp,
+                    geometry=geom
                 )
-                if (series_vtx_bericht[['Lage', 'Richtung', 'Anzahl']] == 0).all():
+        # nicht lesbare Geometrien (z.B. Kurven) und gleich weit entfernte Gewaesser mit QGIS pruefen
+        for feature_id in dict_result['nicht_gelesen'] + dict_result['mit_qgis']:
+            feature_id_temp, geom = self.dict_events[feature_id]
+            dict_vtx_bericht = check_location_event_on_river(
+                geom,
+                feature_id_temp,
+                self.is_point_layer,
+                self.layer_gew,
+                self.spatial_index_gew,
+                self.line_references
+            )
+            if dict_vtx_bericht is not None:
+                self.table.append(**dict_vtx_bericht)
+
+    def add_unread_to_hash_groups(self, list_nicht_gelesen):
+        """
+        Ordnet die im Prozess-Pool nicht gelesenen Geometrien den Gruppen zu: Objekte mit
+        gleichem Hashwert (get_geometry_hash) kommen wie ohne Prozess-Pool in eine Gruppe,
+        auch wenn die uebrigen Objekte der Gruppe im Prozess-Pool gelesen wurden
+        :param list list_nicht_gelesen: [id, ...]
+        """
+        set_nicht_gelesen = set(list_nicht_gelesen)
+        group_of_fid = {
+            fid: group_key for group_key, group in self.dict_hash_groups.items() for fid in group
+        }
+        dict_unread_groups = {}  # {hash: [id, ...]}
+        for feature_id in list_nicht_gelesen:
+            geom_hash = get_geometry_hash(self.layer.geometry(feature_id), self.ignore_direction)
+            dict_unread_groups.setdefault(geom_hash, []).append(feature_id)
+        for geom_hash, list_ids in dict_unread_groups.items():
+            # gleicher Hashwert = gleiche Stuetzpunkte, also auch gleiche Boundingbox
+            for fid in get_line_candidates_ids(self.layer.geometry(list_ids[0]), self.spatial_index):
+                if fid in set_nicht_gelesen:
                     continue
-                series_vtx_bericht['feature_id'] = feature_id_temp
-            series_vtx_bericht['geometry'] = geom
-            list_vtx_bericht = list_vtx_bericht + [series_vtx_bericht]
-    return pd.DataFrame(list_vtx_bericht)
+                if get_geometry_hash(self.layer.geometry(fid), self.ignore_direction) == geom_hash:
+                    if fid in group_of_fid.keys():
+                        self.dict_hash_groups[group_of_fid[fid]].extend(list_ids)
+                    else:
+                        self.dict_hash_groups[geom_hash] = [fid] + list_ids
+                    break
+            else:
+                self.dict_hash_groups[geom_hash] = list_ids
+
+    def finish(self):
+        if self.prozess_pool is not None:
+            self.check_in_prozess_pool()
+        elif self.is_point_layer and len(self.list_points) > 0:
+            check_location_points_on_river(
+                self.list_points,
+                self.layer_gew,
+                self.params_processing,
+                self.table
+            )
+        self.report_object.add_geom_entry(
+            self.layer_key,
+            'geom_ereign_auf_gew',
+            self.table.to_df()
+        )
 
 
-def check_schaechte_auf_rldl(
-    layer_key,
-    layer,
-    layer_steps,
-    report_object,
-    params_processing
+def get_points_array(list_geoms):
+    """
+    Koordinaten von Punktgeometrien als Array
+    :param list list_geoms: [QgsGeometry, ...]
+    :return: np.array (n, 2)
+    """
+    return np.array(
+        [(geom.asPoint().x(), geom.asPoint().y()) for geom in list_geoms],
+        dtype=float
+    ).reshape(-1, 2)
+
+
+def check_location_points_on_river(
+    list_points,
+    layer_gew,
+    params_processing,
+    table
 ):
     """
-    Prueft, ob Schaecht korrekt auf RL oder DL liegen
-    :param str layer_key
-    :param QgsVectorLayer layer
-    :param float layer_steps
-    :param layerReport report_object
+    Prueft die Lage aller Punktereignisse auf den Gewaessern in einem Schritt
+    (naechste Strecke im Suchraum, siehe snap_points_to_lines)
+    :param list list_points: [[feature_id_temp, geom], ...]
+    :param featureStore layer_gew
     :param dict params_processing
-    :return: pd.DataFrame
+    :param resultTable table: hier werden die fehlerhaften Punkte eingetragen (columns_ereign_punkte)
     """
-    feedback = params_processing['feedback']
-    if 'layer_rldl' in params_processing.keys():
-        other_layer = params_processing['layer_rldl']['layer']
-    elif 'rohrleitungen' in params_processing['layer_dict'].keys():
-        other_layer = params_processing['layer_dict']['rohrleitungen']['layer']
-    elif 'durchlaesse' in params_processing['layer_dict'].keys():
-        other_layer = params_processing['layer_dict']['durchlaesse']['layer']
-    else:
-        other_layer = None
-    if not other_layer:
-        return pd.DataFrame()
+    _, distances, _ = snap_points_to_lines(
+        get_points_array([geom for _, geom in list_points]),
+        params_processing['index_registry'].get_segments(layer_gew),
+        max_distance=0.2
+    )
+    # kein Gewaesser in der Naehe gefunden oder Distanz zum naechsten Gewaesser zu gross
+    table.extend([
+        [feature_id_temp, 1, geom]
+        for (feature_id_temp, geom), distance in zip(list_points, distances) if not distance <= 1e-6
+    ])
+
+
+def check_location_event_on_river(
+    geom,
+    feature_id_temp,
+    is_point_layer,
+    layer_gew,
+    spatial_index_gew,
+    line_references=None
+):
+    """
+    Prueft die Lage eines Ereignisses auf den Gewaessern
+    :param QgsGeometry geom
+    :param int or str feature_id_temp
+    :param bool is_point_layer
+    :param featureStore layer_gew
+    :param QgsSpatialIndex spatial_index_gew
+    :param stationierungIndex line_references
+    :return: dict {Spalte: Wert} (siehe columns_ereign_punkte, columns_ereign_linien)
+        or None, wenn korrekt oder nicht pruefbar
+    """
+    if check_geometry_empty_or_null(geom):
+        return None
+    elif check_geometry_multi(geom, geom_empty=False): 
+        return None
     else:
-        spatial_index_other =  QgsSpatialIndex(other_layer.getFeatures())
-        list_schacht_rldl = []
-        
+        dict_vtx_bericht = {}
+        #Linie / Punkt auf Gewaesserlinie ?
+        if is_point_layer:  # Point
+            dict_vtx_bericht['feature_id'] = feature_id_temp
+            line_feature = get_line_to_check(geom, layer_gew, spatial_index_gew)
+            if line_feature:
+                if not check_vtx_distance(geom, line_feature.geometry()):
+                    # Distanz zum naechsten Gewaesser zu gross
+                    dict_vtx_bericht['Lage'] = 1
+                else:
+                    return None
+            else:
+                # kein Gewaesser in der Naehe gefunden
+                dict_vtx_bericht['Lage'] = 1
+        else:  # Line
+            dict_vtx_bericht = check_line_geom_on_line(
+                geom,
+                feature_id_temp,
+                layer_gew,
+                spatial_index_gew,
+                with_stat=True,
+                line_references=line_references
+            )
+            if all([dict_vtx_bericht[key] == 0 for key in ['Lage', 'Richtung', 'Anzahl']]):
+                return None
+            dict_vtx_bericht['feature_id'] = feature_id_temp
+        dict_vtx_bericht['geometry'] = geom
+        return dict_vtx_bericht
+
+
+class schaechteAufRldlVisitor:
+    """
+    Prueft je Schacht die Lage auf Rohrleitungen oder Durchlaessen
+    """
+    def __init__(
+        self,
+        layer_key,
+        report_object,
+        params_processing
+    ):
+        self.layer_key = layer_key
+        self.report_object = report_object
+        if 'layer_rldl' in params_processing.keys():
+            self.other_layer = params_processing['layer_rldl']['layer']
+        elif 'rohrleitungen' in params_processing['layer_dict'].keys():
+            self.other_layer = params_processing['layer_dict']['rohrleitungen']['layer']
+        elif 'durchlaesse' in params_processing['layer_dict'].keys():
+            self.other_layer = params_processing['layer_dict']['durchlaesse']['layer']
+        else:
+            self.other_layer = None
+        self.params_processing = params_processing
+        self.list_schacht_geom = []  # [[feature_id, geom], ...]
+
+    def visit(self, feature):
+        # Objektgeometrie und ID:
+        geom = feature.geometry()
+
+        # Multi- oder Leetre Geometrien koennen nicht ueberprueft werden
+        if not geom:
+            return
+        if check_geometry_multi(geom, geom_empty=False):
+            return
+        self.list_schacht_geom.append([feature.id(), geom])
+
+    def get_schacht_lage(self):
+        """
+        Prueft alle Schaechte gemeinsam auf die Lage auf der naechsten Rohrleitung oder dem naechsten Durchlass
+        :return: list of lists [[feature_id, schacht_auf_rldl, geom], ...]
+        """
+        if self.other_layer is None or len(self.list_schacht_geom) == 0:
+            return [[feature_id, False, geom] for feature_id, geom in self.list_schacht_geom]
+        list_geoms = [geom for _, geom in self.list_schacht_geom]
+        points = np.full((len(list_geoms), 2), np.nan)
+        not_empty = [i for i, geom in enumerate(list_geoms) if not geom.isEmpty()]
+        points[not_empty] = get_points_array([list_geoms[i] for i in not_empty])
+        _, distances, _ = snap_points_to_lines(
+            points,
+            self.params_processing['index_registry'].get_segments(self.other_layer),
+            max_distance=0.2
+        )
+        return [
+            [feature_id, bool(distance <= 1e-6), geom]
+            for (feature_id, geom), distance in zip(self.list_schacht_geom, distances)
+        ]
+
+    def finish(self):
         # Der DataFrame mit der Lageueberpruefung der Schaechte auf dem Gewaesser
-        df_schacht_auf_gew = report_object.get_report_entry([
-            layer_key,
+        # (wird vorher im selben Durchlauf abgeschlossen)
+        df_schacht_auf_gew = self.report_object.get_report_entry([
+            self.layer_key,
             'geometrien',
             'geom_ereign_auf_gew'
         ])
@@ -712,83 +1207,76 @@ def check_schaechte_auf_rldl(
             gew_fehler_ids = []
         else:
             gew_fehler_ids = list(df_schacht_auf_gew['feature_id'])
-        
-
-        # Nun fuer jeden Schacht pruefen
-        for i, feature in enumerate(layer.getFeatures()):
-            # Feedback
-            feedback.setProgress(int((i+1) * layer_steps))
-            if feedback.isCanceled():
-                break
-            
-            # Objektgeometrie und ID:
-            geom = feature.geometry()
-            feature_id = feature.id()
-            
-            # Multi- oder Leetre Geometrien koennen nicht ueberprueft werden
-            if not geom:
-                continue
-            if check_geometry_multi(geom, geom_empty=False):
-                continue
-                
-            # Die Rohrleitung oder der Durchlass, auf dem der Schacht liegen soll:
-            line_feature = get_line_to_check(geom, other_layer, spatial_index_other)
-            if line_feature:
-                schacht_auf_rldl = check_vtx_distance(
-                    geom,
-                    line_feature.geometry()
-                )
-            else:
-                schacht_auf_rldl = False
-            # Fehler auf Gewaesser: wenn nicht in df_schacht_auf_gw, dann auch kein Fehler
-            fehler_auf_gew = feature_id in gew_fehler_ids
-            if schacht_auf_rldl and (not fehler_auf_gew):
-                # korrekt
-                continue
-            elif (not fehler_auf_gew) and (not schacht_auf_rldl):
-                # Fehler: schacht auf offenem gewaesser
-                list_schacht_rldl = list_schacht_rldl + [[feature_id, 1, geom]]
-            elif fehler_auf_gew and schacht_auf_rldl:
-                # Fehler: rldl verschoben
-                list_schacht_rldl = list_schacht_rldl + [[feature_id, 2, geom]]
-            else:
-                # Fehler: schacht weder auf gewaesser noch auf rldl
-                list_schacht_rldl = list_schacht_rldl + [[feature_id, 3, geom]]
-
-        return pd.DataFrame(
-            list_schacht_rldl, columns = [
-                'feature_id',
-                'Lage_rldl',
-                'geometry'
-            ]
+        df_schaechte_auf_rldl = check_schaechte_auf_rldl(
+            self.get_schacht_lage(),
+            gew_fehler_ids
         )
+        self.report_object.add_geom_entry(
+            self.layer_key,
+            'geom_schacht_auf_rldl',
+            df_schaechte_auf_rldl
+        )
+
+
+def check_schaechte_auf_rldl(
+    list_schacht_lage,
+    gew_fehler_ids
+):
+    """
+    Prueft, ob Schaecht korrekt auf RL oder DL liegen
+    :param list list_schacht_lage: [[feature_id, schacht_auf_rldl, geom], ...]
+    :param list gew_fehler_ids: ids der Schaechte mit Fehlern bei der Lage auf dem Gewaesser
+    :return: pd.DataFrame
+    """
+    gew_fehler_ids = set(gew_fehler_ids)
+    table = resultTable(['feature_id', 'Lage_rldl', 'geometry'], {'Lage_rldl': 'int64'})
+    for feature_id, schacht_auf_rldl, geom in list_schacht_lage:
+        # Fehler auf Gewaesser: wenn nicht in df_schacht_auf_gw, dann auch kein Fehler
+        fehler_auf_gew = feature_id in gew_fehler_ids
+        if schacht_auf_rldl and (not fehler_auf_gew):
+            # korrekt
+            continue
+        elif (not fehler_auf_gew) and (not schacht_auf_rldl):
+            # Fehler: schacht auf offenem gewaesser
+            table.append([feature_id, 1, geom])
+        elif fehler_auf_gew and schacht_auf_rldl:
+            # Fehler: rldl verschoben
+            table.append([feature_id, 2, geom])
+        else:
+            # Fehler: schacht weder auf gewaesser noch auf rldl
+            table.append([feature_id, 3, geom])
+    return table.to_df()
 
 
 # Ueberlappungsanalyse anhand der Stationierung
 def handle_tests_overlap(
-    layer_steps,
     layer_key,
     skip_dict,
     report_object,
-    params_processing
+    params_processing,
+    pipeline
 ):
     """
+    Registriert die Ueberlappungsanalyse; sie benoetigt nur die Ergebnisse der
+    Lagepruefung und wird daher erst am Ende des Durchlaufs ausgefuehrt
     :param str layer_key
-    :param float layer_steps
     :param dict skip_dict
     :param layerReport report_object
     :param dict params_processing
+    :param layerPipeline pipeline
     """
-    feedback = params_processing['feedback']
     if not skip_dict['skip_geom_overlap']:
         if layer_key == 'layer_rldl':
-            feedback.setProgressText('--- Überlappungen (RL und DL gemeinsam)')
+            description = '--- Überlappungen (RL und DL gemeinsam)'
         else:
-            feedback.setProgressText('--- Überlappungen')
-        list_overlap = check_overlap_by_stat(params_processing, report_object)
-        df_overlap = pd.DataFrame(list_overlap, columns = ['id1', 'id2', 'geometry'])
-        report_object.add_geom_entry(
-            layer_key,
-            'geom_overlap',
-            df_overlap
-        )
\ No newline at end of file
+            description = '--- Überlappungen'
+
+        def finish_overlap():
+            table = resultTable(['id1', 'id2', 'geometry'])
+            table.extend(check_overlap_by_stat(params_processing, report_object))
+            report_object.add_geom_entry(
+                layer_key,
+                'geom_overlap',
+                table.to_df()
+            )
+        pipeline.register(description, finish_func=finish_overlap)
@@ -0,0 +1,85 @@
+# Dieses Pythonskript enthaelt die Funktionen fuer die Topologie des Gewaessernetzes (NumPy)
+import numpy as np
+
+# Rundung der Koordinaten (Nachkommastellen) fuer die Zuordnung von Stuetzpunkten zu Knoten
+knoten_nachkommastellen = 6
+
+
+def get_node_keys(coords, decimals=knoten_nachkommastellen):
+    """
+    Rundet Koordinaten auf das Raster der Knotenschluessel
+    :param np.array coords: (n, 2)
+    :param int decimals
+    :return: np.array (n, 2)
+    """
+    return np.round(coords, decimals) + 0.0  # + 0.0: -0.0 wird zu 0.0
+
+
+def build_node_table(start_coords, end_coords, decimals=knoten_nachkommastellen):
+    """
+    Fasst die Anfangs- und Endpunkte aller Linien zu Knoten zusammen
+    :param np.array start_coords: (n, 2) erster Stuetzpunkt je Linie
+    :param np.array end_coords: (n, 2) letzter Stuetzpunkt je Linie
+    :param int decimals: Rundung der Koordinaten fuer den Knotenschluessel
+    :return: dict mit den Arrays
+        coords (k, 2): Koordinaten der Knoten,
+        start_node (n,), end_node (n,): Knoten-id des Anfangs- und Endpunkts je Linie,
+        n_start (k,), n_end (k,): Anzahl der Linien, die am Knoten beginnen / enden
+    """
+    n_lines = len(start_coords)
+    all_coords = np.concatenate([
+        np.asarray(start_coords, dtype=float).reshape(-1, 2),
+        np.asarray(end_coords, dtype=float).reshape(-1, 2)
+    ])
+    node_keys, first_idx, inverse = np.unique(
+        get_node_keys(all_coords, decimals),
+        axis=0,
+        return_index=True,
+        return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    n_nodes = len(node_keys)
+    start_node = inverse[:n_lines]
+    end_node = inverse[n_lines:]
+    return {
+        'coords': all_coords[first_idx],
+        'start_node': start_node,
+        'end_node': end_node,
+        'n_start': np.bincount(start_node, minlength=n_nodes),
+        'n_end': np.bincount(end_node, minlength=n_nodes)
+    }
+
+
+def find_wasserscheiden_senken(node_table):
+    """
+    Ermittelt die Knoten, an denen mindestens zwei Linien ausschliesslich enden
+    (Wasserscheide, die Linien sind entgegen der Fliessrichtung digitalisiert) oder
+    ausschliesslich beginnen (Senke)
+    :param dict node_table: siehe build_node_table
+    :return: tuple (np.array Knoten-ids Wasserscheiden, np.array Knoten-ids Senken)
+    """
+    n_start = node_table['n_start']
+    n_end = node_table['n_end']
+    wasserscheiden = np.nonzero((n_end >= 2) & (n_start == 0))[0]
+    senken = np.nonzero((n_start >= 2) & (n_end == 0))[0]
+    return wasserscheiden, senken
+
+
+def get_lines_at_nodes(node_table, node_ids, at_end):
+    """
+    Gibt je Knoten die Indizes der Linien zurueck, die dort enden (at_end=True)
+    oder beginnen (at_end=False)
+    :param dict node_table: siehe build_node_table
+    :param np.array node_ids
+    :param bool at_end
+    :return: dict {Knoten-id: np.array Linienindizes}
+    """
+    line_nodes = node_table['end_node'] if at_end else node_table['start_node']
+    line_idx = np.nonzero(np.isin(line_nodes, node_ids))[0]
+    order = np.argsort(line_nodes[line_idx], kind='stable')
+    line_idx = line_idx[order]
+    unique_nodes, starts = np.unique(line_nodes[line_idx], return_index=True)
+    return {
+        int(node_id): group for node_id, group in zip(unique_nodes, np.split(line_idx, starts[1:]))
+    }
+
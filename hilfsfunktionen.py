@@ -1,20 +1,23 @@
+import math
 import time
 
 from qgis.core import (
     QgsFeature,
     QgsGeometry,
-    QgsLineString,
-    QgsPoint,
-    QgsProcessingException
-
+    QgsProcessingException,
+    QgsVectorLayer,
+    QgsWkbTypes
 )
 from qgis import processing
 
 from .defaults import (
     default_report_geoms,
-    dict_report_texts
+    dict_report_texts,
+    knn_kandidaten
 )
 
+from .layer_cache import featureStore
+
 
 # Zeitlogger
 class simpleTimeStepLogger:
@@ -55,52 +58,158 @@ class simpleTimeStepLogger:
 
 
 
+# Vorbereitete Geometrien fuer wiederholte Vergleiche
+class preparedGeometry:
+    """
+    Erstellt fuer eine Geometrie einmalig eine vorbereitete QgsGeometryEngine,
+    die fuer alle Vergleiche mit anderen Geometrien wiederverwendet wird
+    """
+    def __init__(self, geom):
+        """
+        :param QgsGeometry geom
+        """
+        self.geom = geom
+        self.engine = QgsGeometry.createGeometryEngine(geom.constGet())
+        self.engine.prepareGeometry()
+
+    def intersects(self, other_geom):
+        return self.engine.intersects(other_geom.constGet())
+
+    def crosses(self, other_geom):
+        return self.engine.crosses(other_geom.constGet())
+
+    def distance(self, other_geom):
+        return self.engine.distance(other_geom.constGet())
+
+    def equals(self, other_geom, ignore_direction=False):
+        """
+        Exakte Gleichheit (QgsGeometry.equals); mit ignore_direction
+        zusaetzlich topologische Gleichheit
+        :param QgsGeometry other_geom
+        :param bool ignore_direction
+        :return: bool
+        """
+        if self.geom.equals(other_geom):
+            return True
+        elif ignore_direction:
+            return self.engine.isEqual(other_geom.constGet())
+        else:
+            return False
+
+
 # "Get"-Funktionen
-def get_vtx(line_geom, vtx_index):
+def get_bbox_distance(bbox, x, y):
     """
-    Gibt den Stuetzpunkt einer Liniengeometrie mit dem index vtx_index als QgsGeometry zurück
-    :param QgsGeometry line_geom
-    :param int vtx_index
-    :return QgsGeometry
+    Abstand eines Punkts zu einer Boundingbox (untere Schranke fuer den Abstand zur Geometrie)
+    :param QgsRectangle bbox
+    :param float x
+    :param float y
+    :return: float
     """
-    if line_geom.isMultipart():
-        vtx_lst = [vtx for lst in line_geom.asMultiPolyline() for vtx in lst]
-        pt = QgsPoint(vtx_lst[vtx_index])
-    else: 
-        pt = QgsPoint(line_geom.asPolyline()[vtx_index])
-    return QgsGeometry(pt)
+    dx = max(bbox.xMinimum() - x, 0.0, x - bbox.xMaximum())
+    dy = max(bbox.yMinimum() - y, 0.0, y - bbox.yMaximum())
+    return math.hypot(dx, dy)
 
 
 def get_line_to_check(
     geom,
     other_layer,
-    spatial_index_other
+    spatial_index_other,
+    tolerance=0.2
 ):
     """
-    Ermittelt mithilfe einer Boundingbox EIN Linienobjekt aus dem other_layer, auf dem geom liegen könnte
+    Ermittelt EIN Linienobjekt aus dem other_layer, auf dem geom liegen könnte (geringste
+    Summe der Abstaende aller Stuetzpunkte); Punkte: k naechste Nachbarn im Suchraum,
+    Linien: Boundingbox. Kandidaten werden nach der unteren Schranke (Abstand zur
+    Boundingbox) geprueft und verworfen, sobald diese die beste Summe uebersteigt
     :param QgsGeometry geom
-    :param other_layer
+    :param featureStore other_layer
     :param QgsSpatialIndex spatial_index_other
+    :param float tolerance: Suchraum bei Punkten: default 0.2
     :return: QgsFeature
     """
     if geom.type() == 0:  # Point
         list_vtx_geom = [geom]
+        intersecting_ids = spatial_index_other.nearestNeighbor(
+            geom.asPoint(),
+            knn_kandidaten,
+            tolerance
+        )
+        knn_complete = len(intersecting_ids) < knn_kandidaten
     else:
         list_vtx_geom = [QgsGeometry(vtx) for vtx in geom.vertices()]
-    intersecting_ids = get_line_candidates_ids(geom, spatial_index_other)
+        intersecting_ids = get_line_candidates_ids(geom, spatial_index_other)
+        knn_complete = True
     if len(intersecting_ids)==0:
         return
-    else:
-        # eines oder mehrere Gewaesser gefunden
-        list_sum = []
-        for gew_id in intersecting_ids:
-            # identifiziere das Gewaesser mit dem geringsten Abstand der Stuetzpunkte in Summe
-            gew_ft_candidate = other_layer.getFeature(gew_id)
-            list_sum.append(sum([gew_ft_candidate.geometry().distance(vtx) for vtx in list_vtx_geom]))
-        # ToDo: ? Ausnahme für Schaechte, die am Ende oder Anfang einer Linie liegen und evtl. mehrere mit distance=0 haben
-        position_in_list = list_sum.index(min(list_sum))
-        line_feature = other_layer.getFeature(intersecting_ids[position_in_list])
-        return line_feature
+    list_xy = [(vtx.asPoint().x(), vtx.asPoint().y()) for vtx in list_vtx_geom]
+    best_id, best_sum, max_lower_bound = get_nearest_candidate(
+        intersecting_ids,
+        list_xy,
+        list_vtx_geom,
+        other_layer
+    )
+    if not knn_complete and best_sum > max_lower_bound:
+        # weitere Kandidaten ausserhalb der k naechsten Nachbarn koennten naeher liegen
+        best_id, best_sum, max_lower_bound = get_nearest_candidate(
+            get_line_candidates_ids(geom, spatial_index_other, tolerance),
+            list_xy,
+            list_vtx_geom,
+            other_layer
+        )
+    # ToDo: ? Ausnahme für Schaechte, die am Ende oder Anfang einer Linie liegen und evtl. mehrere mit distance=0 haben
+    return other_layer.getFeature(best_id)
+
+
+def get_nearest_candidate(
+    candidate_ids,
+    list_xy,
+    list_vtx_geom,
+    other_layer
+):
+    """
+    Identifiziert das Linienobjekt mit dem geringsten Abstand der Stuetzpunkte in Summe
+    (bei gleicher Summe das erste in candidate_ids)
+    :param list candidate_ids
+    :param list list_xy: [(x, y), ...] der Stuetzpunkte
+    :param list list_vtx_geom: Stuetzpunkte als QgsGeometry
+    :param featureStore other_layer
+    :return: tuple (id, Summe der Abstaende, groesste untere Schranke)
+    """
+    list_lower_bounds = []
+    for gew_id in candidate_ids:
+        bbox = other_layer.geometry(gew_id).boundingBox()
+        list_lower_bounds.append(sum([get_bbox_distance(bbox, x, y) for x, y in list_xy]))
+    best_pos = None
+    best_sum = None
+    for pos in sorted(range(len(candidate_ids)), key=lambda i: (list_lower_bounds[i], i)):
+        if best_sum is not None:
+            if best_sum == 0:
+                break  # kein Kandidat kann naeher liegen
+            if (list_lower_bounds[pos], pos) > (best_sum, best_pos):
+                break  # alle weiteren Kandidaten liegen weiter entfernt
+        gew_geom_candidate = other_layer.geometry(candidate_ids[pos])
+        if len(list_vtx_geom) > 1:
+            # mehrere Abstaende zum selben Gewaesser: Geometrie vorbereiten
+            gew_geom_candidate = preparedGeometry(gew_geom_candidate)
+        sum_i = sum([gew_geom_candidate.distance(vtx) for vtx in list_vtx_geom])
+        if best_sum is None or (sum_i, pos) < (best_sum, best_pos):
+            best_pos = pos
+            best_sum = sum_i
+    return candidate_ids[best_pos], best_sum, max(list_lower_bounds)
+
+
+def get_geometry_hash(geom, ignore_direction=False):
+    """
+    Bildet einen Hashwert aus dem Geometrietyp und den Koordinaten aller Stuetzpunkte
+    :param QgsGeometry geom
+    :param bool ignore_direction: Hashwert unabhaengig von der Reihenfolge der Stuetzpunkte
+    :return: int
+    """
+    coords = tuple((vtx.x(), vtx.y()) for vtx in geom.vertices())
+    if ignore_direction:
+        coords = min(coords, coords[::-1])
+    return hash((QgsWkbTypes.flatType(geom.wkbType()), coords))
 
 
 def get_line_candidates_ids(
@@ -142,7 +251,8 @@ def handle_rl_and_dl(
     layer_rohrleitungen,
     layer_durchlaesse,
     params_processing,
-    report_object
+    report_object,
+    in_memory=False
 ):
     """
     Falls rl und dl vorhanden sind werden sie zu einem Layer zusammengefuehrt
@@ -151,10 +261,17 @@ def handle_rl_and_dl(
     :param QgsVectorLayer layer_durchlaesse
     :param dict params_processing: alle benannten Parameter
     :param layerReport report_object
+    :param bool in_memory: die geladenen Objekte direkt zusammenfuehren (Pruefung in Kacheln),
+        sonst die Layer mit processing.run
     """
     if layer_rohrleitungen and layer_durchlaesse:
-        layer_rldl = merge_rl_dl(
-            params_processing
+        if in_memory:
+            layer_merged = merge_rl_dl_in_memory(params_processing)
+        else:
+            layer_merged = merge_rl_dl(params_processing)
+        layer_rldl = featureStore(
+            layer_merged,
+            params_processing['feedback']
         )
     
         # Zu params_processing: Anzeige, ob die Pruefroutinen des Layers schon durchlaufen wurden
@@ -182,7 +299,7 @@ def merge_rl_dl(
     # weil sich die id() beim Vereinigen der Layer aendert
     rl_mit_id = processing.run(
         "native:fieldcalculator", {
-            'INPUT': params['layer_dict']['rohrleitungen']['layer'],
+            'INPUT': params['layer_dict']['rohrleitungen']['layer'].source_layer(),
             'FIELD_NAME': params['field_merged_id'],
             'FIELD_TYPE': 2,
             'FORMULA': "concat(@layer_name,': ',$id)",
@@ -191,7 +308,7 @@ def merge_rl_dl(
     )['OUTPUT']
     dl_mit_id = processing.run(
         "native:fieldcalculator", {
-            'INPUT': params['layer_dict']['durchlaesse']['layer'],
+            'INPUT': params['layer_dict']['durchlaesse']['layer'].source_layer(),
             'FIELD_NAME': params['field_merged_id'],
             'FIELD_TYPE': 2,
             'FORMULA': "concat(@layer_name,': ',$id)",
@@ -210,95 +327,35 @@ def merge_rl_dl(
     return layer_rldl
 
 
-# geometriefunktionen
-def linie_verlaengern(
-    n,
-    vtx_muendung,
-    dist_verl,
-    delta_x_laenge1,
-    delta_y_laenge1,
-    layer_fg_1ordnung,
-    spatial_index_fg_1ordnung,
-):
+def merge_rl_dl_in_memory(params):
     """
-    Erstellt eine Linie der Laenge n*dist_verl von vtx_muendung aus mit 
-    dx = delta_x_laenge1 und dy = delta_y_laenge1. Falls die Linie ein Gewaesser 
-    erster Ordnung schneidet, wird ein QgsFeature erstellt.
-    :param int n
-    :param QgsGeometry vtx_muendung
-    :param float dist_verl
-    :param float delta_x_laenge1
-    :param float delta_y_laenge1
-    :param QgsVectorLayer layer_fg_1ordnung
-    :param QgsSpatialIndex spatial_index_fg_1ordnung
-    :return: tuple (True, QgsFeature) oder (False, )
+    Fuehrt die geladenen Objekte von rl und dl zu einem Memory-Layer zusammen, der nur
+    die Geometrie und das Feld "merged_id" (wie in merge_rl_dl) enthaelt
+    :param dict params: alle benannten Parameter
+    :return QgsVectorLayer
     """
-    x_muendung = vtx_muendung.asPoint().x()
-    y_muendung = vtx_muendung.asPoint().y()
-    x_neu = x_muendung - (n*dist_verl*delta_x_laenge1)
-    y_neu = y_muendung - (n*dist_verl*delta_y_laenge1)
-    line_neu = QgsGeometry(
-        QgsLineString([
-            QgsPoint(x_neu, y_neu),
-            vtx_muendung.asPoint()
-        ])
-    )
-    intersecting_candidates = get_line_candidates_ids(
-        line_neu,
-        spatial_index_fg_1ordnung
+    layer_rl = params['layer_dict']['rohrleitungen']['layer']
+    layer_dl = params['layer_dict']['durchlaesse']['layer']
+    wkb_type = layer_rl.wkbType()
+    if QgsWkbTypes.isMultiType(layer_dl.wkbType()):
+        wkb_type = QgsWkbTypes.multiType(wkb_type)  # wie native:mergevectorlayers
+    layer_rldl = QgsVectorLayer(
+        QgsWkbTypes.displayString(wkb_type)
+        + '?crs=' + layer_rl.crs().authid()
+        + '&field=' + params['field_merged_id'] + ':string',
+        'layer_rldl',
+        'memory'
     )
-    intersecting_ids = [
-        ft_id for ft_id in intersecting_candidates if layer_fg_1ordnung.getFeature(ft_id).geometry().intersects(line_neu)
-    ]
-    if len(intersecting_ids) == 0:
-        return (False, )
-    elif len(intersecting_ids) == 1:
-        geom_ft_1ordnung = layer_fg_1ordnung.getFeature(intersecting_ids[0]).geometry()
-        schnittpunkt = geom_ft_1ordnung.intersection(line_neu)
-        line_ae = QgsGeometry(
-            QgsLineString([
-                schnittpunkt.asPoint(),
-                vtx_muendung.asPoint()
-            ])
-        )
-        ft_ae = QgsFeature()
-        ft_ae.setGeometry(line_ae)
-        return (True, ft_ae)
-    else:
-        raise QgsProcessingException(f'zu viele Schnittpunkte beim Verlängern mit Gew. 2. Ordnung: {intersecting_ids}')
-        return (False, )
-
-def ranges_overlap(range1, range2):
-    """
-    Ueberprueft, ob sich zwei Ranges ueberschneiden (f0, f1).
-    :param list range1
-    :param list range2
-    """
-    id1, f0_1, f1_1, geom1 = range1
-    id2, f0_2, f1_2, geom2 = range2
-    if f0_1 < f1_2 and f0_2 < f1_1:
-        return [id1, id2, geom1]
-    
-def sub_line_by_stats(
-    line_geom,
-    stat_start,
-    stat_end
-):
-    """
-    Erstellt einen Linienteil anhand zweier Stationierungen (Start, Ende)
-    :param QgsGeometry line_geom
-    :param float stat_start
-    :param float stat_end
-    :return: QgsGeometry or None if line_geom is mulitpart
-    """
-    line_parts = [f for f in line_geom.parts()]
-    if len(line_parts) > 1:
-        print(line_parts)  # TODO: create warning or raise error
-    line_part_0 = line_parts[0]
-    #if line_part_0.length() < stat_end:
-    #    pass  # create warnong or raise error
-    sub_line = line_part_0.curveSubstring(stat_start , stat_end)
-    return sub_line
+    fields = layer_rldl.fields()
+    list_features = []
+    for layer in [layer_rl, layer_dl]:
+        for feature_id in layer.ids():
+            feature = QgsFeature(fields)
+            feature.setGeometry(layer.geometry(feature_id))
+            feature.setAttributes([layer.name() + ': ' + str(feature_id)])
+            list_features.append(feature)
+    layer_rldl.dataProvider().addFeatures(list_features)
+    return layer_rldl
 
 
 # Setup fuer Tests
@@ -0,0 +1,254 @@
+# Dieses Pythonskript enthaelt die inkrementelle Pruefung: je Objekt wird ein Fingerabdruck
+# (Hashwert der Geometrie und der geprueften Attribute) in der Reportdatei gespeichert; bei
+# erneuter Pruefung werden nur die Kacheln mit geaenderten Objekten neu geprueft
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+
+from .check_gew_report import resultTable
+from .defaults import (
+    findGew_tolerance_dist,
+    kachel_halo,
+    tabelle_fingerabdruecke,
+    tabelle_pruefparameter
+)
+from .kachelung import get_kachel_ids_for_bbox
+
+columns_fingerabdruecke = ['layer_key', 'feature_id', 'fingerabdruck', 'xmin', 'ymin', 'xmax', 'ymax']
+dtypes_fingerabdruecke = {
+    'feature_id': 'int64',
+    'xmin': float,
+    'ymin': float,
+    'xmax': float,
+    'ymax': float
+}
+
+# Version des Formats der Fingerabdruecke; bei Aenderungen wird die gesamte Pruefung wiederholt
+fingerabdruck_version = 1
+
+
+class fingerprintVisitor:
+    """
+    Berechnet in der Pipeline den Fingerabdruck und die Boundingbox jedes Objekts
+    """
+    def __init__(self, layer_key, field_idx, table):
+        """
+        :param str layer_key
+        :param list field_idx: Indizes der geprueften Attributfelder
+        :param resultTable table: columns_fingerabdruecke
+        """
+        self.layer_key = layer_key
+        self.field_idx = field_idx
+        self.table = table
+
+    def visit(self, feature):
+        geom = feature.geometry()
+        hash_obj = hashlib.sha1()
+        if geom.isNull() or geom.isEmpty():
+            bbox = [np.nan] * 4
+        else:
+            hash_obj.update(bytes(geom.asWkb()))
+            rect = geom.boundingBox()
+            bbox = [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()]
+        attributes = [feature.attribute(idx) for idx in self.field_idx]
+        hash_obj.update(str(attributes).encode('utf-8'))
+        self.table.append(
+            [self.layer_key, feature.id(), hash_obj.hexdigest()] + bbox
+        )
+
+
+def handle_fingerprints(
+    layer_key,
+    layer,
+    pflichtfelder,
+    params_processing,
+    pipeline
+):
+    """
+    Registriert die Berechnung der Fingerabdruecke in der Pipeline des Layers
+    :param str layer_key
+    :param QgsVectorLayer layer
+    :param dict pflichtfelder: {layer_key: [Feldname, ...]}
+    :param dict params_processing
+    :param layerPipeline pipeline
+    """
+    fields = layer.fields()
+    list_felder = pflichtfelder.get(layer_key, [])
+    if params_processing['ereign_gew_id_field'] not in list_felder:
+        list_felder = list_felder + [params_processing['ereign_gew_id_field']]
+    if params_processing['feldname_gross_klein_ignorieren']:
+        field_idx = [fields.lookupField(feld) for feld in list_felder]
+    else:
+        field_idx = [fields.indexFromName(feld) for feld in list_felder]
+    visitor = fingerprintVisitor(
+        layer_key,
+        [idx for idx in field_idx if idx >= 0],
+        params_processing['fingerabdruecke']
+    )
+    pipeline.register(None, visitor.visit)
+
+
+def get_fingerprint_table():
+    """
+    :return: resultTable fuer die Fingerabdruecke aller Layer
+    """
+    return resultTable(columns_fingerabdruecke, dtypes=dtypes_fingerabdruecke)
+
+
+def get_pruefparameter(dict_layers, params_processing, pflichtfelder, kachelgroesse, crs_out):
+    """
+    Alle Einstellungen, die die Ergebnisse der Pruefung in Kacheln beeinflussen; weichen sie
+    von der letzten Pruefung ab, wird die gesamte Pruefung wiederholt
+    :param dict dict_layers: {layer_key: QgsVectorLayer}
+    :param dict params_processing
+    :param dict pflichtfelder
+    :param float kachelgroesse
+    :param str crs_out
+    :return: str (json)
+    """
+    return json.dumps(
+        {
+            'version': fingerabdruck_version,
+            'layer': {
+                layer_key: [layer.name(), layer.source()] for layer_key, layer in dict_layers.items()
+            },
+            'crs': crs_out,
+            'kachelgroesse': kachelgroesse,
+            'kachel_halo': kachel_halo,
+            'findGew_tolerance_dist': findGew_tolerance_dist,
+            'ereign_gew_id_field': params_processing['ereign_gew_id_field'],
+            'feldname_gross_klein_ignorieren': params_processing['feldname_gross_klein_ignorieren'],
+            'duplikate_richtung_ignorieren': params_processing['duplikate_richtung_ignorieren'],
+            'pflichtfelder': pflichtfelder
+        },
+        sort_keys=True
+    )
+
+
+def open_report_inkrementell(report_writer, pruefparameter, feedback):
+    """
+    Oeffnet die Reportdatei der letzten Pruefung und loescht die Tabellen, die ohne Kacheln
+    erstellt werden (Attribute und Einzelgeometrien werden immer vollstaendig geprueft). Ist
+    keine passende Reportdatei vorhanden, wird eine neue erstellt, die die bestehende erst
+    beim Abschluss ersetzt (siehe gpkgReportWriter.close)
+    :param gpkgReportWriter report_writer
+    :param str pruefparameter: siehe get_pruefparameter
+    :param QgsProcessingFeedback feedback
+    :return: pd.DataFrame mit den Fingerabdruecken der letzten Pruefung oder None
+    """
+    if not report_writer.open_existing():
+        feedback.pushInfo('Keine Reportdatei vorhanden: der gesamte Datensatz wird geprüft')
+        report_writer.open()
+        return None
+    df_parameter = report_writer.read_df(tabelle_pruefparameter)
+    df_alt = report_writer.read_df(tabelle_fingerabdruecke)
+    if (
+        df_parameter is None
+        or df_alt is None
+        or list(df_parameter['parameter']) != [pruefparameter]
+    ):
+        feedback.pushInfo(
+            'Die Reportdatei stammt nicht aus einer inkrementellen Prüfung mit denselben '
+            + 'Layern und Einstellungen: der gesamte Datensatz wird geprüft'
+        )
+        report_writer.open()
+        return None
+    for layer_name in list(report_writer.dict_tables.keys()):
+        if layer_name in [tabelle_fingerabdruecke, tabelle_pruefparameter]:
+            continue
+        if 'kachel' not in report_writer.get_field_names(layer_name):
+            report_writer.drop_table(layer_name)
+    return df_alt
+
+
+def get_changed_fingerprints(df_alt, df_neu):
+    """
+    Neue, geaenderte und geloeschte Objekte mit der alten und der neuen Boundingbox
+    :param pd.DataFrame df_alt: columns_fingerabdruecke
+    :param pd.DataFrame df_neu: columns_fingerabdruecke
+    :return: pd.DataFrame [layer_key, xmin, ymin, xmax, ymax]; je Objekt bis zu zwei Zeilen
+    """
+    # aus der Datei gelesene Spalten ohne Werte haben keinen Typ
+    df_alt = df_alt[columns_fingerabdruecke].astype(dtypes_fingerabdruecke)
+    df_merged = pd.merge(
+        df_alt,
+        df_neu,
+        on=['layer_key', 'feature_id'],
+        how='outer',
+        suffixes=('_alt', '_neu')
+    )
+    mask = df_merged['fingerabdruck_alt'] != df_merged['fingerabdruck_neu']
+    df_changed = df_merged[mask]
+    list_dfs = []
+    for suffix in ['_alt', '_neu']:
+        df_bbox = df_changed[
+            ['layer_key'] + [col + suffix for col in ['xmin', 'ymin', 'xmax', 'ymax']]
+        ].set_axis(['layer_key', 'xmin', 'ymin', 'xmax', 'ymax'], axis=1)
+        list_dfs.append(df_bbox.dropna())
+    return pd.concat(list_dfs, ignore_index=True)
+
+
+def get_geaenderte_kacheln(df_alt, df_neu, kachelgroesse):
+    """
+    Kacheln, deren Ergebnisse sich geaendert haben koennen: Kacheln, in denen ein neues,
+    geaendertes oder geloeschtes Objekt geladen wird, und Kacheln mit Ereignissen, die auf
+    einem geaenderten Gewaesser liegen koennten (siehe load_kachel)
+    :param pd.DataFrame df_alt: Fingerabdruecke der letzten Pruefung
+    :param pd.DataFrame df_neu: Fingerabdruecke dieser Pruefung
+    :param float kachelgroesse
+    :return: set of str kachel_ids
+    """
+    df_changed = get_changed_fingerprints(df_alt, df_neu)
+    kachel_ids = set()
+    for bbox in df_changed[['xmin', 'ymin', 'xmax', 'ymax']].to_numpy():
+        kachel_ids.update(get_kachel_ids_for_bbox(bbox, kachelgroesse))
+    # Ereignisse, deren Suchraum ein geaendertes Gewaesser schneidet
+    arr_gew = df_changed.loc[
+        df_changed['layer_key'] == 'gewaesser',
+        ['xmin', 'ymin', 'xmax', 'ymax']
+    ].to_numpy()
+    df_ereign = df_neu[df_neu['layer_key'] != 'gewaesser'].dropna(subset=['xmin'])
+    arr_ereign = df_ereign[['xmin', 'ymin', 'xmax', 'ymax']].to_numpy()
+    if len(arr_gew) > 0 and len(arr_ereign) > 0:
+        mask = np.zeros(len(arr_ereign), dtype=bool)
+        for xmin, ymin, xmax, ymax in arr_gew:
+            mask |= (
+                (arr_ereign[:, 0] <= xmax + findGew_tolerance_dist)
+                & (arr_ereign[:, 2] >= xmin - findGew_tolerance_dist)
+                & (arr_ereign[:, 1] <= ymax + findGew_tolerance_dist)
+                & (arr_ereign[:, 3] >= ymin - findGew_tolerance_dist)
+            )
+        for bbox in arr_ereign[mask]:
+            kachel_ids.update(get_kachel_ids_for_bbox(bbox, kachelgroesse))
+    return kachel_ids
+
+
+def delete_kacheln(report_writer, kachel_ids):
+    """
+    Loescht die Ergebnisse der Kacheln aus allen Tabellen der Pruefung in Kacheln
+    :param gpkgReportWriter report_writer
+    :param set kachel_ids
+    """
+    for layer_name in list(report_writer.dict_tables.keys()):
+        if 'kachel' in report_writer.get_field_names(layer_name):
+            report_writer.delete_rows(layer_name, 'kachel', sorted(kachel_ids))
+
+
+def save_fingerprints(report_writer, df_neu, pruefparameter):
+    """
+    Ersetzt die Fingerabdruecke und Parameter in der Reportdatei und loescht danach leere
+    Tabellen (Kacheln ohne Fehler)
+    :param gpkgReportWriter report_writer
+    :param pd.DataFrame df_neu: columns_fingerabdruecke
+    :param str pruefparameter: siehe get_pruefparameter
+    """
+    report_writer.drop_table(tabelle_fingerabdruecke)
+    report_writer.drop_table(tabelle_pruefparameter)
+    report_writer.drop_empty_tables()
+    report_writer.write_df(df_neu, tabelle_fingerabdruecke, 'NoGeometry')
+    report_writer.write_df(
+        pd.DataFrame({'parameter': [pruefparameter]}),
+        tabelle_pruefparameter,
+        'NoGeometry'
+    )
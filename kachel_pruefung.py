@@ -0,0 +1,503 @@
+# Dieses Pythonskript enthaelt die Pruefung von Geometrien in Kacheln in einem Prozess-Pool.
+# Die Prozesse importieren es ohne QGIS: Geometrien werden als WKB uebergeben und mit NumPy geprueft
+import math
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    wait,
+    FIRST_COMPLETED
+)
+import numpy as np
+
+from .geometrie_kernels import (
+    compare_with_reference,
+    find_crossings,
+    find_overlapping_intervals,
+    find_self_intersections,
+    get_parts_segments,
+    lineReference,
+    snap_points_to_segments
+)
+
+
+def read_wkb_geometry(wkb, offset):
+    """
+    Liest eine Geometrie ab der Position offset
+    :param bytes wkb
+    :param int offset
+    :return: tuple (Geometrietyp, list of np.array (n, 2), Position nach der Geometrie)
+    """
+    byte_order = '<' if wkb[offset] == 1 else '>'
+    code = struct.unpack_from(byte_order + 'I', wkb, offset + 1)[0]
+    offset += 5
+    has_z = bool(code & 0x80000000)  # EWKB
+    has_m = bool(code & 0x40000000)
+    if code & 0x20000000:  # EWKB mit SRID
+        offset += 4
+    code &= 0x0FFFFFFF
+    has_z = has_z or (code // 1000) in [1, 3]  # ISO: 1000 Z, 2000 M, 3000 ZM
+    has_m = has_m or (code // 1000) in [2, 3]
+    geom_type = code % 1000
+    n_dim = 2 + int(has_z) + int(has_m)
+    dtype = np.dtype(byte_order + 'f8')
+    if geom_type == 1:
+        coords = np.frombuffer(wkb, dtype, n_dim, offset).reshape(1, n_dim)[:, :2].astype(float)
+        offset += 8 * n_dim
+        if np.isnan(coords).all():  # leerer Punkt
+            return geom_type, [], offset
+        return geom_type, [coords], offset
+    n = struct.unpack_from(byte_order + 'I', wkb, offset)[0]
+    offset += 4
+    if geom_type == 2:
+        coords = np.frombuffer(wkb, dtype, n * n_dim, offset).reshape(n, n_dim)[:, :2].astype(float)
+        return geom_type, [coords], offset + 8 * n * n_dim
+    if geom_type in [4, 5]:
+        list_parts = []
+        for _ in range(n):
+            part_type, part_coords, offset = read_wkb_geometry(wkb, offset)
+            if part_type != geom_type - 3:
+                raise ValueError('Unerwarteter Geometrietyp ' + str(part_type))
+            list_parts.extend(part_coords)
+        return geom_type, list_parts, offset
+    raise ValueError('Nicht unterstuetzter Geometrietyp ' + str(geom_type))
+
+
+def parse_wkb(wkb):
+    """
+    Liest Punkt- und Liniengeometrien (auch Multi-, Z- und M-Geometrien) aus WKB
+    :param bytes wkb
+    :return: tuple (Geometrietyp: 1 Punkt, 2 Linie, 4 Multipunkt, 5 Multilinie,
+        list of np.array (n, 2)) oder None fuer andere Geometrietypen (z.B. Kurven)
+    """
+    try:
+        geom_type, list_parts, _ = read_wkb_geometry(wkb, 0)
+    except (struct.error, ValueError, IndexError):
+        return None
+    return geom_type, list_parts
+
+
+def get_parts_bounds(list_parts):
+    """
+    :param list list_parts: list of np.array (n, 2)
+    :return: tuple (xmin, ymin, xmax, ymax)
+    """
+    coords = np.concatenate(list_parts)
+    return (*coords.min(axis=0), *coords.max(axis=0))
+
+
+def get_tiles(bounds, n_tiles):
+    """
+    Ordnet die Objekte nach dem Mittelpunkt ihrer Boundingbox einem Raster aus Kacheln zu
+    :param np.array bounds: (n, 4) xmin, ymin, xmax, ymax
+    :param int n_tiles: Anzahl der Kacheln je Achse
+    :return: list of np.array: Indizes der Objekte je Kachel (leere Kacheln entfallen)
+    """
+    if len(bounds) == 0:
+        return []
+    centers = (bounds[:, :2] + bounds[:, 2:]) / 2
+    centers_min = centers.min(axis=0)
+    tile_size = np.maximum(centers.max(axis=0) - centers_min, 1e-9) / n_tiles
+    cells = np.minimum(np.floor((centers - centers_min) / tile_size).astype(np.int64), n_tiles - 1)
+    keys = cells[:, 0] * n_tiles + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    _, starts = np.unique(keys[order], return_index=True)
+    return np.split(order, starts[1:])
+
+
+def get_tile_members(bounds, tile_bounds, halo):
+    """
+    Objekte im um den Halo erweiterten Bereich einer Kachel: Der Bereich umfasst die
+    Boundingboxen aller Objekte der Kachel, Vergleiche mit Objekten benachbarter
+    Kacheln sind damit vollstaendig
+    :param np.array bounds: (n, 4)
+    :param np.array tile_bounds: (k, 4) Boundingboxen der Objekte der Kachel
+    :param float halo: Suchraum
+    :return: np.array Indizes
+    """
+    xmin, ymin = tile_bounds[:, :2].min(axis=0) - halo
+    xmax, ymax = tile_bounds[:, 2:].max(axis=0) + halo
+    return np.nonzero(
+        (bounds[:, 0] <= xmax)
+        & (bounds[:, 2] >= xmin)
+        & (bounds[:, 1] <= ymax)
+        & (bounds[:, 3] >= ymin)
+    )[0]
+
+
+def get_duplicate_key(fid, geom_type, list_parts, ignore_direction):
+    """
+    Schluessel aus Geometrietyp und Koordinaten aller Stuetzpunkte; gleiche Schluessel
+    wie get_geometry_hash (ohne Hashkollisionen)
+    :param int fid
+    :param int geom_type
+    :param list list_parts
+    :param bool ignore_direction: umgekehrte Stuetzpunktreihenfolge ergibt denselben Schluessel
+    :return: tuple
+    """
+    coords = np.concatenate(list_parts)
+    if np.isnan(coords).any():
+        return (geom_type, fid)  # NaN ist mit keiner Koordinate gleich
+    coords = coords + 0.0  # -0.0 wie 0.0
+    key = coords.tobytes()
+    if ignore_direction:
+        key = min(key, coords[::-1].tobytes())
+    return (geom_type, key)
+
+
+def find_tile_duplicates(dict_geoms, list_ids, ignore_direction):
+    """
+    Gruppen von Objekten einer Kachel mit gleichem Schluessel (gleiche Geometrien haben
+    dieselbe Boundingbox und liegen daher in derselben Kachel); die Gleichheit wird wie
+    bei check_duplicates_by_hash mit QGIS bestaetigt
+    :param dict dict_geoms: {id: (Geometrietyp, list of np.array)}
+    :param list list_ids
+    :param bool ignore_direction
+    :return: list of lists [[id1, id2, ...], ...]
+    """
+    dict_groups = {}
+    for fid in sorted(list_ids):
+        geom_type, list_parts = dict_geoms[fid]
+        key = get_duplicate_key(fid, geom_type, list_parts, ignore_direction)
+        dict_groups.setdefault(key, []).append(fid)
+    return [group for group in dict_groups.values() if len(group) > 1]
+
+
+def find_tile_crossing_pairs(dict_geoms, list_ids, set_owned):
+    """
+    Kandidatenpaare (sich beruehrende Boundingboxen) mit mindestens einem Objekt der Kachel
+    :param dict dict_geoms: {id: (Geometrietyp, list of np.array)}
+    :param list list_ids: Linien im erweiterten Bereich der Kachel
+    :param set set_owned: ids der Objekte der Kachel
+    :return: list of tuples [(id1, id2), ...] mit id1 < id2
+    """
+    if len(list_ids) < 2:
+        return []
+    bounds = np.array([get_parts_bounds(dict_geoms[fid][1]) for fid in list_ids])
+    tol = 1e-9 * max(1.0, float(np.abs(bounds).max()))
+    idx_i, idx_j = find_overlapping_intervals(
+        np.zeros(len(list_ids), dtype=np.int64),
+        bounds[:, 0] - tol,
+        bounds[:, 2] + tol
+    )
+    in_y = (bounds[idx_i, 1] <= bounds[idx_j, 3] + tol) & (bounds[idx_j, 1] <= bounds[idx_i, 3] + tol)
+    list_pairs = []
+    for i, j in zip(idx_i[in_y].tolist(), idx_j[in_y].tolist()):
+        id_i, id_j = list_ids[i], list_ids[j]
+        if id_i in set_owned or id_j in set_owned:
+            list_pairs.append((min(id_i, id_j), max(id_i, id_j)))
+    return list_pairs
+
+
+def locate_tile_events(dict_geoms, list_ids, dict_gew, tolerance):
+    """
+    Prueft die Lage von Ereignissen (Punkte und Linien mit einem Teil) auf den Gewaessern,
+    wie check_location_points_on_river und check_line_geom_on_line
+    :param dict dict_geoms: {id: (Geometrietyp, list of np.array)}
+    :param list list_ids: ids der Ereignisse der Kachel
+    :param dict dict_gew: {id: list of np.array} Gewaesser im erweiterten Bereich der Kachel
+    :param float tolerance: Suchraum bei Punkten
+    :return: tuple (list of tuples [(id, gew_id oder -1, dict siehe compare_with_reference oder None), ...]
+        (nur fehlerhafte Ereignisse), list der ids von Linien, bei denen mehrere Gewaesser
+        (nahezu) gleich weit entfernt sind: mit QGIS pruefen, dort entscheidet die
+        Reihenfolge des Spatial Index)
+    """
+    list_ereign = []
+    list_gleich_weit = []
+    list_point_ids = [fid for fid in list_ids if dict_geoms[fid][0] in [1, 4]]
+    list_line_ids = [fid for fid in list_ids if dict_geoms[fid][0] in [2, 5]]
+
+    # Punkte: naechste Strecke im Suchraum
+    if len(list_point_ids) > 0:
+        segments = get_parts_segments(dict_gew)
+        _, distances, _ = snap_points_to_segments(
+            np.concatenate([dict_geoms[fid][1][0] for fid in list_point_ids]),
+            segments['p0'],
+            segments['p1'],
+            max_distance=tolerance
+        )
+        list_ereign.extend([
+            (fid, -1, None) for fid, distance in zip(list_point_ids, distances) if not distance <= 1e-6
+        ])
+
+    # Linien: Gewaesser mit der geringsten Summe der Abstaende aller Stuetzpunkte
+    if len(list_line_ids) == 0:
+        return list_ereign, list_gleich_weit
+    gew_ids = np.array(sorted(dict_gew.keys()), dtype=np.int64)
+    gew_bounds = np.array([get_parts_bounds(dict_gew[gew_id]) for gew_id in gew_ids]).reshape(-1, 4)
+    dict_references = {}  # {gew_id: [lineReference je Teil]}
+    for fid in list_line_ids:
+        vtx_coords = dict_geoms[fid][1][0]
+        xmin, ymin, xmax, ymax = get_parts_bounds([vtx_coords])
+        candidates = np.nonzero(
+            (gew_bounds[:, 0] <= xmax)
+            & (gew_bounds[:, 2] >= xmin)
+            & (gew_bounds[:, 1] <= ymax)
+            & (gew_bounds[:, 3] >= ymin)
+        )[0]
+        if len(candidates) == 0:
+            list_ereign.append((fid, -1, None))
+            continue
+        # untere Schranke: Abstand der Stuetzpunkte zur Boundingbox
+        dx = np.maximum(
+            np.maximum(gew_bounds[candidates, 0][:, None] - vtx_coords[None, :, 0], 0),
+            vtx_coords[None, :, 0] - gew_bounds[candidates, 2][:, None]
+        )
+        dy = np.maximum(
+            np.maximum(gew_bounds[candidates, 1][:, None] - vtx_coords[None, :, 1], 0),
+            vtx_coords[None, :, 1] - gew_bounds[candidates, 3][:, None]
+        )
+        lower_bounds = np.hypot(dx, dy).sum(axis=1)
+        best_id = None
+        best_sum = None
+        second_sum = None
+        for pos in np.lexsort((gew_ids[candidates], lower_bounds)).tolist():
+            if best_sum is not None and lower_bounds[pos] > best_sum + get_tie_tolerance(best_sum):
+                break
+            gew_id = int(gew_ids[candidates[pos]])
+            if gew_id not in dict_references.keys():
+                dict_references[gew_id] = [lineReference(coords) for coords in dict_gew[gew_id]]
+            distances = np.min(
+                [reference.locate(vtx_coords)[2] for reference in dict_references[gew_id]],
+                axis=0
+            )
+            sum_i = float(distances.sum())
+            if best_sum is None or sum_i < best_sum:
+                second_sum = best_sum
+                best_id = gew_id
+                best_sum = sum_i
+            elif second_sum is None or sum_i < second_sum:
+                second_sum = sum_i
+        if second_sum is not None and second_sum - best_sum <= get_tie_tolerance(best_sum):
+            list_gleich_weit.append(fid)
+            continue
+        # wie lineReference.from_geometry: erster Teil des Gewaessers
+        dict_vergleich = compare_with_reference(vtx_coords, dict_references[best_id][0])
+        if not all([dict_vergleich[key] == 0 for key in ['Lage', 'Richtung', 'Anzahl']]):
+            list_ereign.append((fid, best_id, dict_vergleich))
+    return list_ereign, list_gleich_weit
+
+
+def get_tie_tolerance(distance_sum):
+    """
+    Toleranz, innerhalb der zwei Abstandssummen als gleich gelten (Rundungsunterschiede
+    zwischen NumPy und GEOS)
+    :param float distance_sum
+    :return: float
+    """
+    return 1e-9 * max(1.0, distance_sum)
+
+
+def check_tile(task):
+    """
+    Prueft die Objekte einer Kachel (wird in den Prozessen des Pools ausgefuehrt)
+    :param dict task: siehe prozessPool.run_tile_checks
+    :return: dict mit den Ergebnissen fuer die Objekte der Kachel:
+        nicht_gelesen: [id, ...] Geometrietyp nicht unterstuetzt, pruefen mit QGIS,
+        mit_qgis: [id, ...] Grenzfaelle der Selbstueberschneidungen und der Lage der
+            Ereignisse, pruefen mit QGIS,
+        selfintersect: [id, ...],
+        duplicates: [[id1, id2, ...], ...] Gruppen moeglicher Duplikate, siehe find_tile_duplicates,
+        crossings: [(id1, id2, np.array (k, 2)), ...],
+        ereign: siehe locate_tile_events
+    """
+    dict_geoms = {}
+    list_unread = []
+    for fid, wkb in zip(task['fids'], task['wkb']):
+        parsed = parse_wkb(wkb)
+        if parsed is None:
+            list_unread.append(fid)
+        elif len(parsed[1]) > 0:
+            dict_geoms[fid] = parsed
+    set_owned = set(task['owned'])
+    list_owned = [fid for fid in task['owned'] if fid in dict_geoms.keys()]
+    result = {
+        'nicht_gelesen': [fid for fid in list_unread if fid in set_owned],
+        'mit_qgis': [],
+        'selfintersect': [],
+        'duplicates': [],
+        'crossings': [],
+        'ereign': []
+    }
+    checks = task['checks']
+    if 'selfintersect' in checks:
+        result['selfintersect'], result['mit_qgis'] = find_self_intersections({
+            fid: dict_geoms[fid][1] for fid in list_owned if dict_geoms[fid][0] in [2, 5]
+        })
+        # Multipunkte sind nicht einfach, wenn Punkte doppelt vorkommen
+        result['selfintersect'].extend([
+            fid for fid in list_owned
+            if dict_geoms[fid][0] == 4
+            and len(np.unique(np.concatenate(dict_geoms[fid][1]), axis=0)) < len(dict_geoms[fid][1])
+        ])
+    if 'duplicates' in checks:
+        result['duplicates'] = find_tile_duplicates(dict_geoms, list_owned, task['ignore_direction'])
+    if 'crossings' in checks:
+        list_lines = [fid for fid in task['fids'] if fid in dict_geoms.keys() and dict_geoms[fid][0] in [2, 5]]
+        result['crossings'] = find_crossings(
+            {fid: dict_geoms[fid][1] for fid in list_lines},
+            find_tile_crossing_pairs(dict_geoms, list_lines, set_owned)
+        )
+    if 'ereign' in checks:
+        dict_gew = {}
+        for gew_id, wkb in zip(task['gew_fids'], task['gew_wkb']):
+            parsed = parse_wkb(wkb)
+            if parsed is not None and len(parsed[1]) > 0:
+                dict_gew[gew_id] = parsed[1]
+        result['ereign'], list_gleich_weit = locate_tile_events(
+            dict_geoms,
+            [fid for fid in list_owned if len(dict_geoms[fid][1]) == 1],
+            dict_gew,
+            task['tolerance']
+        )
+        result['mit_qgis'].extend(list_gleich_weit)
+    return result
+
+
+class wkbCollection:
+    """
+    Geometrien als WKB mit Boundingbox zur Uebergabe an die Prozesse
+    """
+    def __init__(self):
+        self.list_fids = []
+        self.list_wkb = []
+        self.list_bounds = []
+        self.index_of_fid = {}
+
+    def add(self, feature_id, wkb, bounds):
+        """
+        :param int feature_id
+        :param bytes wkb
+        :param tuple bounds: (xmin, ymin, xmax, ymax)
+        """
+        self.index_of_fid[feature_id] = len(self.list_fids)
+        self.list_fids.append(feature_id)
+        self.list_wkb.append(wkb)
+        self.list_bounds.append(bounds)
+
+    def __len__(self):
+        return len(self.list_fids)
+
+    def get_wkb(self, feature_id):
+        return self.list_wkb[self.index_of_fid[feature_id]]
+
+    def get_bounds(self):
+        """
+        :return: np.array (n, 4)
+        """
+        return np.array(self.list_bounds, dtype=float).reshape(-1, 4)
+
+    def select(self, indices):
+        """
+        :param np.array indices
+        :return: tuple (list of ids, list of WKB)
+        """
+        return [self.list_fids[i] for i in indices], [self.list_wkb[i] for i in indices]
+
+
+def get_python_executable():
+    """
+    Python-Interpreter fuer die Prozesse; in QGIS ist sys.executable die Anwendung selbst
+    :return: str
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    for name in ['pythonw.exe', 'python.exe', 'python3', 'python']:
+        path = os.path.join(sys.exec_prefix, name)
+        if os.path.isfile(path):
+            return path
+    return shutil.which('python3') or shutil.which('python') or sys.executable
+
+
+class prozessPool:
+    """
+    Prozess-Pool fuer Geometriepruefungen: Die Objekte werden nach ihrer Lage in Kacheln
+    aufgeteilt, die Kacheln in den Prozessen geprueft und die Ergebnisse zusammengefuehrt
+    """
+    def __init__(self, n_workers):
+        """
+        :param int n_workers: Anzahl der Prozesse
+        """
+        self.n_workers = n_workers
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(get_python_executable())
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=context)
+
+    def run_tile_checks(
+        self,
+        collection,
+        checks,
+        ignore_direction=False,
+        collection_gew=None,
+        tolerance=0.2,
+        feedback=None
+    ):
+        """
+        :param wkbCollection collection: zu pruefende Objekte
+        :param list checks: 'selfintersect', 'duplicates', 'crossings' und / oder 'ereign'
+        :param bool ignore_direction: Duplikate: umgekehrte Stuetzpunktreihenfolge gilt als Duplikat
+        :param wkbCollection collection_gew: Gewaesser, fuer 'ereign'
+        :param float tolerance: Suchraum bei Punktereignissen (Halo der Kacheln)
+        :param QgsProcessingFeedback feedback: zum Abbrechen
+        :return: dict, siehe check_tile (Kreuzungen ohne Wiederholungen, nach ids sortiert)
+        """
+        dict_merged = {
+            key: [] for key in ['nicht_gelesen', 'mit_qgis', 'selfintersect', 'duplicates', 'crossings', 'ereign']
+        }
+        if len(collection) == 0:
+            return dict_merged
+        bounds = collection.get_bounds()
+        if collection_gew is not None:
+            bounds_gew = collection_gew.get_bounds()
+        list_futures = []
+        for owned_idx in get_tiles(bounds, int(math.ceil(math.sqrt(4 * self.n_workers)))):
+            if 'crossings' in checks:
+                member_idx = get_tile_members(bounds, bounds[owned_idx], 0.0)
+            else:
+                member_idx = owned_idx
+            fids, list_wkb = collection.select(member_idx)
+            task = {
+                'checks': checks,
+                'fids': fids,
+                'wkb': list_wkb,
+                'owned': [collection.list_fids[i] for i in owned_idx],
+                'ignore_direction': ignore_direction,
+                'tolerance': tolerance,
+                'gew_fids': [],
+                'gew_wkb': []
+            }
+            if 'ereign' in checks and collection_gew is not None and len(collection_gew) > 0:
+                task['gew_fids'], task['gew_wkb'] = collection_gew.select(
+                    get_tile_members(bounds_gew, bounds[owned_idx], tolerance)
+                )
+            list_futures.append(self.executor.submit(check_tile, task))
+        pending = set(list_futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if feedback and feedback.isCanceled():
+                for future in pending:
+                    future.cancel()
+                return dict_merged
+        set_crossings = set()
+        for future in list_futures:
+            result = future.result()
+            for key in ['nicht_gelesen', 'mit_qgis', 'selfintersect', 'duplicates', 'ereign']:
+                dict_merged[key].extend(result[key])
+            for id1, id2, points in result['crossings']:
+                # Paare aus Objekten verschiedener Kacheln werden in beiden gefunden
+                if (id1, id2) not in set_crossings:
+                    set_crossings.add((id1, id2))
+                    dict_merged['crossings'].append((id1, id2, points))
+        for key in ['nicht_gelesen', 'mit_qgis', 'selfintersect']:
+            dict_merged[key] = sorted(set(dict_merged[key]))
+        dict_merged['duplicates'].sort()
+        dict_merged['crossings'].sort(key=lambda x: (x[0], x[1]))
+        dict_merged['ereign'].sort(key=lambda x: x[0])
+        return dict_merged
+
+    def shutdown(self):
+        # noch nicht begonnene Kacheln (z.B. nach einem Fehler) werden verworfen
+        self.executor.shutdown(cancel_futures=True)
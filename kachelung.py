@@ -0,0 +1,300 @@
+# Dieses Pythonskript enthaelt die Pruefung in Kacheln fuer sehr grosse Datensaetze: je Kachel
+# werden nur die Objekte in der Kachel und einem Randbereich geladen, geprueft und gespeichert
+import numpy as np
+import pandas as pd
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsRectangle
+)
+
+from .check_gew_report import layerReport
+from .defaults import (
+    findGew_tolerance_dist,
+    kachel_halo
+)
+from .hilfsfunktionen import handle_rl_and_dl
+from .layer_cache import (
+    featureStore,
+    spatialIndexRegistry
+)
+from .pruefpipeline import workerFeedback
+from .stationierung_index import stationierungIndex
+
+# Eintraege in params_processing, die fuer den gesamten Datensatz erstellt werden
+# und je Kachel neu erstellt werden muessen
+params_je_kachel = ['line_references', 'layer_rldl', 'gew_collection']
+
+
+def get_kachel_id(i_x, i_y):
+    """
+    :param int i_x: Spalte im Raster
+    :param int i_y: Zeile im Raster
+    :return: str
+    """
+    return str(i_x) + '_' + str(i_y)
+
+
+def get_kacheln(extent, kachelgroesse):
+    """
+    Raster ueber die Ausdehnung; es beginnt immer bei Vielfachen der Kachelgroesse, damit die
+    Kacheln bei jeder Pruefung gleich sind (inkrementelle Pruefung). Die Kacheln reichen ueber
+    den rechten und oberen Rand hinaus, damit jeder Punkt in genau einer Kachel liegt
+    (siehe is_in_kachel)
+    :param QgsRectangle extent
+    :param float kachelgroesse
+    :return: list [[kachel_id, QgsRectangle], ...]
+    """
+    i_x0 = int(np.floor(extent.xMinimum() / kachelgroesse))
+    i_x1 = int(np.floor(extent.xMaximum() / kachelgroesse))
+    i_y0 = int(np.floor(extent.yMinimum() / kachelgroesse))
+    i_y1 = int(np.floor(extent.yMaximum() / kachelgroesse))
+    return [
+        [
+            get_kachel_id(i_x, i_y),
+            QgsRectangle(
+                i_x*kachelgroesse,
+                i_y*kachelgroesse,
+                (i_x+1)*kachelgroesse,
+                (i_y+1)*kachelgroesse
+            )
+        ] for i_y in range(i_y0, i_y1+1) for i_x in range(i_x0, i_x1+1)
+    ]
+
+
+def get_kachel_ids_for_bbox(bbox, kachelgroesse, halo=kachel_halo):
+    """
+    Alle Kacheln, in denen ein Objekt mit dieser Boundingbox geladen wird (siehe load_kachel)
+    :param tuple bbox: (xmin, ymin, xmax, ymax)
+    :param float kachelgroesse
+    :param float halo: Randbereich der Kacheln
+    :return: list of str
+    """
+    xmin, ymin, xmax, ymax = bbox
+    # die Kachel (i_x) wird geladen, wenn (i_x+1)*kachelgroesse >= xmin-halo und
+    # i_x*kachelgroesse <= xmax+halo
+    i_x0 = int(np.ceil((xmin - halo) / kachelgroesse - 1))
+    i_x1 = int(np.floor((xmax + halo) / kachelgroesse))
+    i_y0 = int(np.ceil((ymin - halo) / kachelgroesse - 1))
+    i_y1 = int(np.floor((ymax + halo) / kachelgroesse))
+    return [
+        get_kachel_id(i_x, i_y)
+        for i_y in range(i_y0, i_y1+1) for i_x in range(i_x0, i_x1+1)
+    ]
+
+
+def is_in_kachel(point, kachel):
+    """
+    Punkt in der Kachel (links und unten einschliesslich, rechts und oben ausschliesslich)
+    :param tuple point: (x, y)
+    :param QgsRectangle kachel
+    :return: bool
+    """
+    x, y = point
+    return (
+        kachel.xMinimum() <= x < kachel.xMaximum()
+        and kachel.yMinimum() <= y < kachel.yMaximum()
+    )
+
+
+def get_first_vertex(geom):
+    """
+    :param QgsGeometry geom
+    :return: tuple (x, y) or None
+    """
+    if not isinstance(geom, QgsGeometry) or geom.isNull() or geom.isEmpty():
+        return None
+    vtx = geom.vertexAt(0)
+    return vtx.x(), vtx.y()
+
+
+def get_pair_point(geom1, geom2):
+    """
+    Mittelpunkt der Schnittmenge der Boundingboxen zweier Geometrien; er liegt in beiden
+    Boundingboxen, beide Objekte werden also in der Kachel des Punkts geladen
+    :param QgsGeometry geom1
+    :param QgsGeometry geom2
+    :return: tuple (x, y) or None
+    """
+    if get_first_vertex(geom1) is None or get_first_vertex(geom2) is None:
+        return None
+    bbox1 = geom1.boundingBox()
+    bbox2 = geom2.boundingBox()
+    xmin = max(bbox1.xMinimum(), bbox2.xMinimum())
+    xmax = min(bbox1.xMaximum(), bbox2.xMaximum())
+    ymin = max(bbox1.yMinimum(), bbox2.yMinimum())
+    ymax = min(bbox1.yMaximum(), bbox2.yMaximum())
+    if xmin > xmax or ymin > ymax:
+        return None
+    return (xmin + xmax) / 2, (ymin + ymax) / 2
+
+
+def filter_report_to_kachel(report_object, kachel, kachel_id):
+    """
+    Behaelt nur die Geometriefehler, die der Kachel zugeordnet sind, damit Fehler aus dem
+    Randbereich nicht mehrfach berichtet werden, und traegt die Kachel in der Spalte
+    'kachel' ein (inkrementelle Pruefung). Bezugspunkt ist der erste Stuetzpunkt der
+    Fehlergeometrie, denn sie liegt auf allen beteiligten Objekten (Kreuzungspunkt, Duplikat,
+    Knoten, Ereignis); bei Ueberlappungen der Mittelpunkt der Schnittmenge der
+    Boundingboxen beider Ereignisse (siehe get_pair_point)
+    :param layerReport report_object
+    :param QgsRectangle kachel
+    :param str kachel_id
+    """
+    for dict_layer in report_object.report_dict.values():
+        dict_geoms = dict_layer['geometrien']
+        dict_masks = {}
+        for error_name, df in dict_geoms.items():
+            if not isinstance(df, pd.DataFrame) or 'geometry' not in df.columns:
+                continue
+            list_points = [get_first_vertex(geom) for geom in df['geometry']]
+            if error_name == 'geom_overlap' and 'geom_ereign_auf_gew' in dict_geoms.keys():
+                df_ereign = dict_geoms['geom_ereign_auf_gew']
+                dict_ereign_geoms = dict(zip(df_ereign['feature_id'], df_ereign['geometry']))
+                list_points = [
+                    get_pair_point(
+                        dict_ereign_geoms.get(id1),
+                        dict_ereign_geoms.get(id2)
+                    ) or point
+                    for id1, id2, point in zip(df['id1'], df['id2'], list_points)
+                ]
+            dict_masks[error_name] = [
+                point is None or is_in_kachel(point, kachel) for point in list_points
+            ]
+        # erst danach filtern: die Ueberlappungen benoetigen alle Ereignisse der Kachel
+        for error_name, mask in dict_masks.items():
+            df = dict_geoms[error_name]
+            df = df[np.array(mask, dtype=bool)].reset_index(drop=True)
+            df['kachel'] = kachel_id
+            dict_geoms[error_name] = df
+
+
+def load_kachel(dict_layers, kachel, feedback):
+    """
+    Laedt die Objekte, deren Boundingbox die Kachel mit Randbereich schneidet, und die
+    Gewaesser, auf denen diese Objekte liegen koennten
+    :param dict dict_layers: {layer_key: QgsVectorLayer}
+    :param QgsRectangle kachel
+    :param QgsProcessingFeedback feedback
+    :return: dict layer_dict: {layer_key: {'layer': featureStore, 'count': int, 'steps': float}}
+    """
+    rect_load = kachel.buffered(kachel_halo)
+    dict_stores = {}
+    for layer_key, layer in dict_layers.items():
+        if layer_key != 'gewaesser':
+            dict_stores[layer_key] = featureStore(
+                layer,
+                feedback,
+                request=QgsFeatureRequest().setFilterRect(rect_load)
+            )
+    # Ereignisse koennen ueber den Randbereich hinausreichen
+    rect_gew = QgsRectangle(rect_load)
+    for store in dict_stores.values():
+        extent = store.extent()
+        if not extent.isNull():
+            rect_gew.combineExtentWith(extent)
+    dict_stores['gewaesser'] = featureStore(
+        dict_layers['gewaesser'],
+        feedback,
+        request=QgsFeatureRequest().setFilterRect(rect_gew.buffered(findGew_tolerance_dist))
+    )
+    layer_dict = {}
+    for layer_key in dict_layers.keys():
+        ft_count = dict_stores[layer_key].featureCount()
+        layer_dict[layer_key] = {
+            'layer': dict_stores[layer_key],
+            'count': ft_count,
+            'steps': 100.0/ft_count if ft_count != 0 else 0
+        }
+    return layer_dict
+
+
+def run_kachel_pruefung(
+    dict_layers,
+    main_check,
+    params_processing,
+    kachelgroesse,
+    report_writer,
+    kachel_ids=None
+):
+    """
+    Prueft die Geometrien durch Vergleich mit anderen Geometrien Kachel fuer Kachel und
+    haengt die Ergebnisse jeder Kachel an die Reportdatei an
+    :param dict dict_layers: {layer_key: QgsVectorLayer} in der Reihenfolge der Tests
+    :param function main_check: main_check(layer_key, report_object, params_processing, i_run, teil)
+    :param dict params_processing
+    :param float kachelgroesse
+    :param gpkgReportWriter report_writer
+    :param set kachel_ids: nur diese Kacheln pruefen (inkrementelle Pruefung); None: alle
+    """
+    feedback = params_processing['feedback']
+    extent = None
+    for layer in dict_layers.values():
+        if layer.extent().isNull():
+            continue  # leerer Layer
+        if extent is None:
+            extent = QgsRectangle(layer.extent())
+        else:
+            extent.combineExtentWith(layer.extent())
+    if extent is None:
+        return
+    list_kacheln = get_kacheln(extent, kachelgroesse)
+    if kachel_ids is not None:
+        list_kacheln = [
+            [kachel_id, kachel] for kachel_id, kachel in list_kacheln if kachel_id in kachel_ids
+        ]
+    first_kachel = True
+    for i_kachel, (kachel_id, kachel) in enumerate(list_kacheln):
+        if feedback.isCanceled():
+            break
+        feedback.setProgress(int(100 * i_kachel / len(list_kacheln)))
+        kachel_feedback = workerFeedback(feedback)
+        layer_dict = load_kachel(dict_layers, kachel, kachel_feedback)
+        n_objekte = sum([value['count'] for value in layer_dict.values()])
+        if n_objekte == 0:
+            continue
+        feedback.setProgressText(
+            'Kachel ' + str(i_kachel+1) + '/' + str(len(list_kacheln))
+            + ': ' + str(n_objekte) + ' Objekte'
+        )
+        params_kachel = {
+            key: value for key, value in params_processing.items() if key not in params_je_kachel
+        }
+        params_kachel.update({
+            'layer_dict': layer_dict,
+            'feedback': kachel_feedback,
+            'n_layer': len(layer_dict),
+            'index_registry': spatialIndexRegistry(
+                params_processing['index_registry'].use_segment_index
+            ),
+            # ohne Speicherung: der Index gilt nur fuer die geladenen Gewaesser
+            'line_references': stationierungIndex.from_layer(
+                layer_dict['gewaesser']['layer'],
+                kachel_feedback
+            )
+        })
+        report_kachel = layerReport(layer_dict)
+        handle_rl_and_dl(
+            dict_layers.get('rohrleitungen'),
+            dict_layers.get('durchlaesse'),
+            params_kachel,
+            report_kachel,
+            in_memory=True
+        )
+        for i, layer_key in enumerate(layer_dict.keys()):
+            main_check(
+                layer_key,
+                report_kachel,
+                params_kachel,
+                i,
+                teil='geometrien'
+            )
+        filter_report_to_kachel(report_kachel, kachel, kachel_id)
+        report_dict_prepared = report_kachel.prepare_report_dict(kachel_feedback)
+        report_writer.write_report_dict(report_dict_prepared, kachel_feedback)
+        params_kachel['index_registry'].clear()
+        if first_kachel:
+            # die Schritte der Pruefung werden nur fuer die erste Kachel ausgegeben
+            kachel_feedback.flush()
+            first_kachel = False
+    feedback.setProgress(100)
@@ -0,0 +1,408 @@
+# Dieses Pythonskript enthaelt die Zwischenspeicher (Caches) fuer einen Durchlauf der Pruefroutine
+import threading
+import numpy as np
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsPointXY,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsWkbTypes
+)
+
+from .geometrie_kernels import (
+    cast_ray,
+    get_layer_segments,
+    lineReference
+)
+
+
+class featureStore:
+    """
+    Laedt einen Layer einmalig und haelt Geometrien und Attribute je id() vor.
+    Das Objekt wird in den Pruefroutinen anstelle des QgsVectorLayer uebergeben
+    und stellt dafuer die benoetigten Layer-Methoden bereit
+    """
+    def __init__(self, layer, feedback=None, source=None, request=None):
+        """
+        :param QgsVectorLayer layer
+        :param QgsProcessingFeedback feedback
+        :param QgsVectorLayerFeatureSource source: zum Laden in einem anderen Thread
+            (im Thread des Layers erstellen)
+        :param QgsFeatureRequest request: nur diese Objekte laden (z.B. Kachel per setFilterRect
+            oder nur Attribute mit dem Flag NoGeometry)
+        """
+        self.layer = layer
+        self.layer_fields = layer.fields()
+        self.geometries = {}  # {id(): QgsGeometry}
+        self.attributes = {}  # {id(): [attr1, attr2, ...]}
+        if request is None:
+            request = QgsFeatureRequest()
+        if source is None:
+            features = layer.getFeatures(request)
+        else:
+            features = source.getFeatures(request)
+        for feature in features:
+            if feedback and feedback.isCanceled():
+                break
+            feature_id = feature.id()
+            self.geometries[feature_id] = feature.geometry()
+            self.attributes[feature_id] = feature.attributes()
+
+    # Methoden des QgsVectorLayer
+    def id(self):
+        return self.layer.id()
+
+    def name(self):
+        return self.layer.name()
+
+    def crs(self):
+        return self.layer.crs()
+
+    def sourceCrs(self):
+        return self.layer.sourceCrs()
+
+    def fields(self):
+        return self.layer_fields
+
+    def geometryType(self):
+        return self.layer.geometryType()
+
+    def wkbType(self):
+        return self.layer.wkbType()
+
+    def featureCount(self):
+        return len(self.geometries)
+
+    def extent(self):
+        """
+        Boundingbox aller geladenen Geometrien
+        :return: QgsRectangle (leer, wenn keine Geometrien geladen sind)
+        """
+        extent = None
+        for geom in self.geometries.values():
+            if geom.isNull() or geom.isEmpty():
+                continue
+            if extent is None:
+                extent = QgsRectangle(geom.boundingBox())
+            else:
+                extent.combineExtentWith(geom.boundingBox())
+        if extent is None:
+            return QgsRectangle()
+        return extent
+
+    def getFeature(self, feature_id):
+        """
+        Erstellt das QgsFeature aus dem Zwischenspeicher (ohne Abfrage beim Provider)
+        :param int feature_id
+        :return: QgsFeature
+        """
+        feature = QgsFeature(self.layer_fields, feature_id)
+        feature.setGeometry(self.geometries[feature_id])
+        feature.setAttributes(self.attributes[feature_id])
+        return feature
+
+    def getFeatures(self):
+        """
+        Gibt alle Objekte in der Reihenfolge des Ladens zurueck
+        :return: generator of QgsFeature
+        """
+        for feature_id in self.geometries.keys():
+            yield self.getFeature(feature_id)
+
+    # zusaetzliche Methoden
+    def source_layer(self):
+        """
+        Gibt den urspruenglichen Layer zurueck (z.B. fuer processing.run)
+        :return: QgsVectorLayer
+        """
+        return self.layer
+
+    def ids(self):
+        return list(self.geometries.keys())
+
+    def geometry(self, feature_id):
+        """
+        :param int feature_id
+        :return: QgsGeometry
+        """
+        return self.geometries[feature_id]
+
+    def attribute(self, feature_id, field_name):
+        """
+        :param int feature_id
+        :param str field_name
+        :return: Attributwert
+        """
+        return self.attributes[feature_id][self.layer_fields.indexOf(field_name)]
+
+    def update_feature(self, feature):
+        """
+        Uebernimmt ein neues oder geaendertes Objekt (z.B. waehrend der Bearbeitung)
+        :param QgsFeature feature
+        """
+        self.geometries[feature.id()] = feature.geometry()
+        self.attributes[feature.id()] = feature.attributes()
+
+    def remove_feature(self, feature_id):
+        """
+        Entfernt ein geloeschtes Objekt
+        :param int feature_id
+        """
+        self.geometries.pop(feature_id, None)
+        self.attributes.pop(feature_id, None)
+
+    def create_spatial_index(self):
+        """
+        Erstellt einen QgsSpatialIndex aus den zwischengespeicherten Objekten
+        :return: QgsSpatialIndex
+        """
+        spatial_index = QgsSpatialIndex()
+        for feature in self.getFeatures():
+            spatial_index.addFeature(feature)
+        return spatial_index
+
+
+class segmentIndex:
+    """
+    Spatial Index auf Ebene der Liniensegmente: jeder Eintrag verweist auf das Objekt (id()),
+    den Teil und den ersten Stuetzpunkt der Strecke. Bei langen, gewundenen Linien liefern
+    die Abfragen nur Objekte, die tatsaechlich Strecken in der Naehe haben. Die Methoden
+    intersects() und nearestNeighbor() entsprechen denen des QgsSpatialIndex
+    """
+    def __init__(self, layer, feedback=None, segments=None):
+        """
+        :param QgsVectorLayer or featureStore layer: Linienlayer
+        :param QgsProcessingFeedback feedback
+        :param dict segments: bereits erstellte Strecken des Layers (siehe get_layer_segments)
+        """
+        if segments is None:
+            segments = get_layer_segments(layer, feedback)
+        self.seg_fid = segments['fid']
+        self.seg_part = segments['part']
+        self.seg_vtx = segments['vtx']
+        self.p0 = segments['p0']
+        self.p1 = segments['p1']
+        self.seg_stat = segments['stat']  # Stationierung am Anfang der Strecke im Teil
+        self.part_ranges = None  # {(id(), Teil): (erste Strecke, letzte Strecke + 1)}
+        self.bounds_min = np.minimum(self.p0, self.p1)
+        self.bounds_max = np.maximum(self.p0, self.p1)
+        self.index = QgsSpatialIndex()
+        for seg_id, (xmin, ymin, xmax, ymax) in enumerate(
+            np.hstack([self.bounds_min, self.bounds_max]).tolist()
+        ):
+            self.index.addFeature(seg_id, QgsRectangle(xmin, ymin, xmax, ymax))
+
+    def segments_to_ids(self, seg_ids):
+        """
+        :param list seg_ids: Strecken in der gewuenschten Reihenfolge
+        :return: list der id() der Objekte (ohne Wiederholungen)
+        """
+        fids = self.seg_fid[np.asarray(seg_ids, dtype=np.int64)]
+        _, first_idx = np.unique(fids, return_index=True)
+        return fids[np.sort(first_idx)].tolist()
+
+    def intersects(self, rect):
+        """
+        :param QgsRectangle rect
+        :return: list der id() der Objekte mit Strecken in rect
+        """
+        return self.segments_to_ids(sorted(self.index.intersects(rect)))
+
+    def nearestNeighbor(self, point, neighbors=1, maxDistance=0):
+        """
+        Objekte mit den naechstgelegenen Strecken (Abstand der Boundingboxen der Strecken)
+        :param QgsPointXY point
+        :param int neighbors: Mindestanzahl der Objekte
+        :param float maxDistance
+        :return: list der id() der Objekte, nach Abstand sortiert
+        """
+        n_segments = neighbors
+        while True:
+            seg_ids = self.index.nearestNeighbor(point, n_segments, maxDistance)
+            list_ids = self.segments_to_ids(seg_ids)
+            if len(list_ids) >= neighbors or len(seg_ids) < n_segments:
+                return list_ids
+            n_segments = n_segments * 4
+
+    def locate_point(self, x, y, max_distance=0, feature_id=None, part=None):
+        """
+        Sucht die naechstgelegene Strecke eines Punkts; die Stationierung ergibt sich
+        direkt aus der Strecke (bezogen auf den Teil der Geometrie). Bei gleichem Abstand
+        gilt die erste Strecke (wie lineReference.locate)
+        :param float x
+        :param float y
+        :param float max_distance: 0 = ohne Begrenzung
+        :param int feature_id: nur Strecken dieses Objekts
+        :param int part: nur Strecken dieses Teils
+        :return: tuple (id(), Teil, Index des ersten Stuetzpunkts, Stationierung, Abstand) or None
+        """
+        point = QgsPointXY(x, y)
+        n_segments = 4
+        while True:
+            seg_ids_all = np.array(self.index.nearestNeighbor(point, n_segments, max_distance), dtype=np.int64)
+            seg_ids = seg_ids_all
+            if feature_id is not None:
+                seg_ids = seg_ids[self.seg_fid[seg_ids] == feature_id]
+            if part is not None:
+                seg_ids = seg_ids[self.seg_part[seg_ids] == part]
+            if len(seg_ids) == 0:
+                if len(seg_ids_all) < n_segments:
+                    return None
+                n_segments = n_segments * 4
+                continue
+            p0 = self.p0[seg_ids]
+            seg_vec = self.p1[seg_ids] - p0
+            seg_len_sq = seg_vec[:, 0]**2 + seg_vec[:, 1]**2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = ((x - p0[:, 0])*seg_vec[:, 0] + (y - p0[:, 1])*seg_vec[:, 1]) / seg_len_sq
+            t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+            dist = np.hypot(p0[:, 0] + t*seg_vec[:, 0] - x, p0[:, 1] + t*seg_vec[:, 1] - y)
+            bbox_delta = np.maximum(
+                np.maximum(self.bounds_min[seg_ids_all] - (x, y), (x, y) - self.bounds_max[seg_ids_all]),
+                0
+            )
+            bbox_dist = np.hypot(bbox_delta[:, 0], bbox_delta[:, 1])
+            best = int(np.lexsort((seg_ids, dist))[0])
+            # weitere Strecken koennten naeher liegen, wenn der Abstand die Boundingboxen erreicht
+            if len(seg_ids_all) < n_segments or dist[best] < bbox_dist.max():
+                seg_id = seg_ids[best]
+                return (
+                    int(self.seg_fid[seg_id]),
+                    int(self.seg_part[seg_id]),
+                    int(self.seg_vtx[seg_id]),
+                    float(self.seg_stat[seg_id] + t[best]*np.sqrt(seg_len_sq[best])),
+                    float(dist[best])
+                )
+            n_segments = n_segments * 4
+
+    def get_part_ranges(self):
+        """
+        Die Strecken eines Teils folgen aufeinander (siehe get_parts_segments)
+        :return: dict {(id(), Teil): (erste Strecke, letzte Strecke + 1)}
+        """
+        if self.part_ranges is None:
+            n_seg = len(self.seg_fid)
+            is_start = np.ones(n_seg, dtype=bool)
+            is_start[1:] = (
+                (self.seg_fid[1:] != self.seg_fid[:-1])
+                | (self.seg_part[1:] != self.seg_part[:-1])
+            )
+            starts = np.nonzero(is_start)[0]
+            stops = np.append(starts[1:], n_seg)
+            self.part_ranges = {
+                (fid, part): (start, stop) for fid, part, start, stop in zip(
+                    self.seg_fid[starts].tolist(),
+                    self.seg_part[starts].tolist(),
+                    starts.tolist(),
+                    stops.tolist()
+                )
+            }
+        return self.part_ranges
+
+    def locate_points_on_feature(self, coords, feature_id, part=0):
+        """
+        Stationierung von Punkten auf einem Teil eines Objekts; die Strecken des Teils werden
+        einmal zusammengestellt und alle Punkte gemeinsam projiziert (lineReference.locate)
+        :param np.array coords: (n, 2)
+        :param int feature_id
+        :param int part
+        :return: np.array (n,) or None, wenn das Objekt nicht im Index ist
+        """
+        seg_range = self.get_part_ranges().get((int(feature_id), int(part)))
+        if seg_range is None:
+            return None
+        start, stop = seg_range
+        line_coords = np.concatenate([self.p0[start:stop], self.p1[stop-1:stop]])
+        return lineReference(line_coords).locate(coords)[0]
+
+    def cast_ray(self, x, y, dx, dy, max_distance):
+        """
+        Sucht den naechsten Schnittpunkt eines Strahls mit den Linien
+        :param float x
+        :param float y: Anfang des Strahls
+        :param float dx
+        :param float dy: Richtung des Strahls (Laenge 1)
+        :param float max_distance: maximale Laenge des Strahls
+        :return: tuple (id(), x, y, Abstand) oder None
+        """
+        x_end = x + dx*max_distance
+        y_end = y + dy*max_distance
+        seg_ids = np.array(
+            sorted(self.index.intersects(QgsRectangle(
+                min(x, x_end),
+                min(y, y_end),
+                max(x, x_end),
+                max(y, y_end)
+            ))),
+            dtype=np.int64
+        )
+        if len(seg_ids) == 0:
+            return None
+        hit_idx, distance = cast_ray(
+            (x, y),
+            (dx, dy),
+            self.p0[seg_ids],
+            self.p1[seg_ids],
+            max_distance
+        )
+        if hit_idx < 0:
+            return None
+        return (
+            int(self.seg_fid[seg_ids[hit_idx]]),
+            x + dx*distance,
+            y + dy*distance,
+            distance
+        )
+
+
+class spatialIndexRegistry:
+    """
+    Verwaltet die QgsSpatialIndex-Objekte eines Durchlaufs, damit jeder Index
+    nur einmal erstellt wird (auch bei paralleler Pruefung der Layer)
+    """
+    def __init__(self, use_segment_index=False):
+        """
+        :param bool use_segment_index: fuer Linienlayer einen segmentIndex verwenden
+        """
+        self.use_segment_index = use_segment_index
+        self.index_dict = {}  # {featureStore: QgsSpatialIndex}
+        self.segment_index_dict = {}  # {featureStore: segmentIndex}
+        self.segments_dict = {}  # {featureStore: dict der Strecken}
+        self.lock = threading.RLock()
+
+    def get_index(self, store):
+        """
+        Gibt den Index des featureStore zurueck und erstellt ihn, falls noch nicht vorhanden.
+        Der featureStore ist ein Abbild des Layers, daher wird der Index je featureStore
+        (und nicht je Layer) gespeichert
+        :param featureStore store
+        :return: QgsSpatialIndex or segmentIndex
+        """
+        with self.lock:
+            if self.use_segment_index and store.geometryType() == QgsWkbTypes.LineGeometry:
+                if store not in self.segment_index_dict.keys():
+                    self.segment_index_dict[store] = segmentIndex(
+                        store,
+                        segments=self.get_segments(store)
+                    )
+                return self.segment_index_dict[store]
+            if store not in self.index_dict.keys():
+                self.index_dict[store] = store.create_spatial_index()
+            return self.index_dict[store]
+
+    def get_segments(self, store):
+        """
+        Gibt die Strecken des Linienlayers zurueck und erstellt sie, falls noch nicht vorhanden
+        :param featureStore store
+        :return: dict, siehe get_layer_segments
+        """
+        with self.lock:
+            if store not in self.segments_dict.keys():
+                self.segments_dict[store] = get_layer_segments(store)
+            return self.segments_dict[store]
+
+    def clear(self):
+        self.index_dict = {}
+        self.segment_index_dict = {}
+        self.segments_dict = {}
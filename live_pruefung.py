@@ -0,0 +1,450 @@
+# Dieses Pythonskript enthaelt die Live-Pruefung waehrend der Bearbeitung: Aenderungen an den
+# konfigurierten Layern werden ueber die Signale des QgsVectorLayer erkannt und nur die
+# betroffenen Objekte mit den lokalen Pruefungen erneut geprueft
+from qgis.core import (
+    NULL,
+    QgsFeature,
+    QgsGeometry,
+    QgsProject,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+from .config_tools import (
+    config_layer_if_in_project,
+    get_config_from_json
+)
+from .defaults import (
+    dict_ereign_fehler,
+    dict_report_texts,
+    file_config_user,
+    findGew_tolerance_dist,
+    output_layer_prefixes
+)
+from .geometriepruefungen import (
+    check_geometry_empty_or_null,
+    check_geometry_multi,
+    check_geometry_selfintersect,
+    check_location_event_on_river
+)
+from .hilfsfunktionen import (
+    get_line_candidates_ids,
+    preparedGeometry
+)
+from .layer_cache import featureStore
+
+# Layer, deren Objekte gemeinsam auf Duplikate und Ueberschneidungen geprueft werden
+live_gruppen = {
+    'gewaesser': ['gewaesser'],
+    'rohrleitungen': ['rohrleitungen', 'durchlaesse'],
+    'durchlaesse': ['rohrleitungen', 'durchlaesse'],
+    'wehre': ['wehre'],
+    'schaechte': ['schaechte']
+}
+
+
+def get_fehler_text(error_name, dict_vtx_bericht=None):
+    """
+    Text fuer die Fehlerliste; bei der Lage von Ereignissen mit den Fehlern aus dict_ereign_fehler
+    :param str error_name
+    :param dict dict_vtx_bericht: siehe check_location_event_on_river
+    :return: str
+    """
+    text = dict_report_texts[error_name]
+    if dict_vtx_bericht is not None:
+        list_details = []
+        for spalte in ['Lage', 'Richtung', 'Anzahl']:
+            code = dict_vtx_bericht.get(spalte, 0)
+            if isinstance(code, list):
+                code = code[0]  # [1, [Stuetzpunkte]]
+            if code != 0:
+                list_details.append(dict_ereign_fehler[spalte].get(code, str(code)))
+        if len(list_details) > 0:
+            text = text + ': ' + ', '.join(list_details)
+    return text
+
+
+def get_error_point(geom):
+    """
+    Punkt fuer die Darstellung eines Fehlers (Punkt oder erster Stuetzpunkt)
+    :param QgsGeometry geom
+    :return: QgsGeometry or None
+    """
+    if geom is None or check_geometry_empty_or_null(geom):
+        return None
+    if geom.type() == QgsWkbTypes.PointGeometry and not geom.isMultipart():
+        return QgsGeometry(geom)
+    return QgsGeometry(geom.vertexAt(0))
+
+
+class livePruefung:
+    """
+    Prueft die konfigurierten Layer waehrend der Bearbeitung: Einzelgeometrien, Duplikate und
+    Ueberschneidungen in der Umgebung, Lage der Ereignisse auf den Gewaessern und die
+    Gewaesserschluessel. Geometrien, Attribute und Spatial Index werden einmal geladen und
+    bei jeder Aenderung nachgefuehrt; die Fehler stehen in einem Memory-Layer
+    """
+    def __init__(self):
+        self.user_config_dict = get_config_from_json(file_config_user)
+        self.ereign_gew_id_field = self.user_config_dict['check_layer_defaults']['primaerschluessel_gew']
+        self.emptystrdef = [NULL, '']
+        self.ignore_direction = False
+        self.layers = {}  # {layer_key: QgsVectorLayer}
+        self.stores = {}  # {layer_key: featureStore}
+        self.indexes = {}  # {layer_key: QgsSpatialIndex}
+        self.key_index = {}  # {layer_key: {Gewaesserschluessel: set of id()}}
+        self.fehler = {}  # {(layer_key, id()): [[error_name, Partner (layer_key, id()) or None, QgsGeometry, Text], ...]}
+        self.memory_ids = {}  # {(layer_key, id()): [id() im Memory-Layer, ...]}
+        self.connections = []  # [[signal, slot], ...]
+        self.error_layer = None
+
+    def start(self):
+        """
+        Laedt die konfigurierten Layer des Projekts, prueft sie vollstaendig und verbindet die Signale
+        :return: bool False, wenn keiner der konfigurierten Layer im Projekt ist
+        """
+        dict_layer_names = config_layer_if_in_project(file_config_user)
+        for layer_key, layer_name in dict_layer_names.items():
+            if layer_name is None:
+                continue
+            layer = QgsProject.instance().mapLayersByName(layer_name)[0]
+            self.layers[layer_key] = layer
+        if len(self.layers) == 0:
+            return False
+        self.create_error_layer()
+        for layer_key in self.layers.keys():
+            self.load_layer(layer_key)
+        for layer_key in self.layers.keys():
+            self.check_features([(layer_key, fid) for fid in self.stores[layer_key].ids()])
+        for layer_key, layer in self.layers.items():
+            self.connect(layer.geometryChanged, lambda fid, geom, key=layer_key: self.on_change(key, fid))
+            self.connect(layer.featureAdded, lambda fid, key=layer_key: self.on_change(key, fid))
+            self.connect(layer.featureDeleted, lambda fid, key=layer_key: self.on_change(key, fid))
+            self.connect(
+                layer.attributeValueChanged,
+                lambda fid, idx, value, key=layer_key: self.on_change(key, fid)
+            )
+            # nach dem Speichern haben neue Objekte andere ids, nach dem Verwerfen
+            # gelten wieder die gespeicherten Objekte: Layer neu laden
+            self.connect(layer.afterCommitChanges, lambda key=layer_key: self.reload_layer(key))
+            self.connect(layer.afterRollBack, lambda key=layer_key: self.reload_layer(key))
+            self.connect(layer.willBeDeleted, self.stop)
+        return True
+
+    def stop(self):
+        """
+        Trennt alle Signale und entfernt den Fehler-Layer aus dem Projekt
+        """
+        for signal, slot in self.connections:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass  # Layer bereits geloescht
+        self.connections = []
+        if self.error_layer is not None:
+            try:
+                QgsProject.instance().removeMapLayer(self.error_layer.id())
+            except RuntimeError:
+                pass  # Fehler-Layer bereits entfernt
+            self.error_layer = None
+        self.layers = {}
+        self.stores = {}
+        self.indexes = {}
+
+    def connect(self, signal, slot):
+        signal.connect(slot)
+        self.connections.append([signal, slot])
+
+    def create_error_layer(self):
+        """
+        Memory-Layer fuer die Fehler (Punkte)
+        """
+        crs = list(self.layers.values())[0].crs().authid()
+        self.error_layer = QgsVectorLayer(
+            'Point?crs=' + crs
+            + '&field=layer:string&field=feature_id:integer64&field=fehler:string',
+            'Live-Prüfung',
+            'memory'
+        )
+        QgsProject.instance().addMapLayer(self.error_layer)
+        # ohne Fehler-Layer wird die Live-Pruefung beendet
+        self.connect(self.error_layer.willBeDeleted, self.stop)
+
+    def load_layer(self, layer_key):
+        """
+        Laedt Geometrien, Attribute (einschliesslich Bearbeitungen), Spatial Index und Schluessel
+        :param str layer_key
+        """
+        store = featureStore(self.layers[layer_key])
+        self.stores[layer_key] = store
+        self.indexes[layer_key] = store.create_spatial_index()
+        self.key_index[layer_key] = {}
+        for fid in store.ids():
+            self.add_key(layer_key, fid)
+
+    def reload_layer(self, layer_key):
+        """
+        Laedt einen Layer neu und prueft danach alle Objekte (die Ereignisse haengen
+        von den Gewaessern ab)
+        :param str layer_key
+        """
+        list_alt = [key_fid for key_fid in self.fehler.keys() if key_fid[0] == layer_key]
+        self.load_layer(layer_key)
+        list_key_fids = list_alt + [
+            (other_key, fid) for other_key, store in self.stores.items() for fid in store.ids()
+        ]
+        self.check_features(list_key_fids)
+
+    def get_key(self, layer_key, fid):
+        """
+        :return: Gewaesserschluessel oder None, wenn leer oder das Feld fehlt
+        """
+        store = self.stores[layer_key]
+        if fid not in store.attributes.keys():
+            return None
+        if store.fields().indexOf(self.ereign_gew_id_field) < 0:
+            return None
+        key = store.attribute(fid, self.ereign_gew_id_field)
+        if key in self.emptystrdef:
+            return None
+        return key
+
+    def add_key(self, layer_key, fid):
+        key = self.get_key(layer_key, fid)
+        if key is not None:
+            self.key_index[layer_key].setdefault(key, set()).add(fid)
+
+    def remove_key(self, layer_key, fid):
+        key = self.get_key(layer_key, fid)
+        if key is not None:
+            self.key_index[layer_key][key].discard(fid)
+            if len(self.key_index[layer_key][key]) == 0:
+                del self.key_index[layer_key][key]
+
+    def on_change(self, layer_key, fid):
+        """
+        Fuehrt Zwischenspeicher und Index fuer ein geaendertes, neues oder geloeschtes
+        Objekt nach und prueft die betroffenen Objekte
+        :param str layer_key
+        :param int fid
+        """
+        store = self.stores[layer_key]
+        index = self.indexes[layer_key]
+        list_bbox = []
+        list_keys = []
+        if fid in store.geometries.keys():
+            list_keys.append(self.get_key(layer_key, fid))
+            self.remove_key(layer_key, fid)
+            old_feature = store.getFeature(fid)
+            index.deleteFeature(old_feature)
+            if not check_geometry_empty_or_null(old_feature.geometry()):
+                list_bbox.append(old_feature.geometry().boundingBox())
+            store.remove_feature(fid)
+        feature = self.layers[layer_key].getFeature(fid)
+        if feature.isValid():
+            store.update_feature(feature)
+            index.addFeature(feature)
+            self.add_key(layer_key, fid)
+            list_keys.append(self.get_key(layer_key, fid))
+            if not check_geometry_empty_or_null(feature.geometry()):
+                list_bbox.append(feature.geometry().boundingBox())
+        affected = {(layer_key, fid)}
+        if layer_key == 'gewaesser':
+            # Ereignisse, die auf dem Gewaesser liegen koennten
+            for ereign_key in self.layers.keys():
+                if ereign_key == 'gewaesser':
+                    continue
+                for bbox in list_bbox:
+                    affected.update([
+                        (ereign_key, ereign_id) for ereign_id in
+                        self.indexes[ereign_key].intersects(bbox.buffered(findGew_tolerance_dist))
+                    ])
+            # Gewaesser und Ereignisse mit dem alten oder neuen Schluessel
+            for key in set([key for key in list_keys if key is not None]):
+                for other_key in self.layers.keys():
+                    affected.update([
+                        (other_key, other_id) for other_id in self.key_index[other_key].get(key, [])
+                    ])
+        self.check_features(affected)
+
+    def check_features(self, list_key_fid):
+        """
+        Prueft die Objekte und aktualisiert den Fehler-Layer
+        :param list list_key_fid: [(layer_key, id()), ...]
+        """
+        changed = set()
+        for layer_key, fid in set(list_key_fid):
+            changed.update(self.check_feature(layer_key, fid))
+        self.update_error_layer(changed)
+
+    def clear_fehler(self, key_fid):
+        """
+        Entfernt die Fehler eines Objekts, auch die Paare bei den Partnern
+        :param tuple key_fid: (layer_key, id())
+        :return: set of (layer_key, id()) mit geaenderten Fehlern
+        """
+        changed = {key_fid}
+        for _, partner, _, _ in self.fehler.pop(key_fid, []):
+            if partner is not None and partner in self.fehler.keys():
+                self.fehler[partner] = [
+                    eintrag for eintrag in self.fehler[partner] if eintrag[1] != key_fid
+                ]
+                changed.add(partner)
+        return changed
+
+    def check_feature(self, layer_key, fid):
+        """
+        Prueft ein Objekt mit den lokalen Pruefungen
+        :param str layer_key
+        :param int fid
+        :return: set of (layer_key, id()) mit geaenderten Fehlern
+        """
+        key_fid = (layer_key, fid)
+        changed = self.clear_fehler(key_fid)
+        store = self.stores[layer_key]
+        if fid not in store.geometries.keys():
+            return changed  # geloescht
+        list_fehler = []
+        geom = store.geometry(fid)
+
+        # Einzelgeometrien
+        geom_empty = check_geometry_empty_or_null(geom)
+        if geom_empty:
+            list_fehler.append(['geom_is_empty', None, None, None])
+        if check_geometry_multi(geom, geom_empty):
+            list_fehler.append(['geom_is_multi', None, geom, None])
+        if check_geometry_selfintersect(geom, geom_empty):
+            list_fehler.append(['geom_selfintersect', None, geom, None])
+
+        # Duplikate und Ueberschneidungen in der Umgebung
+        if not geom_empty:
+            list_paare = self.check_neighbours(layer_key, fid, geom)
+            list_fehler.extend(list_paare)
+            for error_name, partner, error_geom, text in list_paare:
+                self.fehler.setdefault(partner, []).append([error_name, key_fid, error_geom, text])
+                changed.add(partner)
+
+        # Lage auf den Gewaessern
+        if layer_key != 'gewaesser' and 'gewaesser' in self.stores.keys() and not geom_empty:
+            dict_vtx_bericht = self.check_event_on_river(layer_key, fid, geom)
+            if dict_vtx_bericht is not None:
+                list_fehler.append([
+                    'geom_ereign_auf_gew',
+                    None,
+                    geom,
+                    get_fehler_text('geom_ereign_auf_gew', dict_vtx_bericht)
+                ])
+
+        # Gewaesserschluessel
+        list_fehler.extend([
+            [error_name, None, geom, None] for error_name in self.check_key(layer_key, fid)
+        ])
+        self.fehler[key_fid] = list_fehler
+        return changed
+
+    def check_neighbours(self, layer_key, fid, geom):
+        """
+        Duplikate und Ueberschneidungen mit den Objekten in der Umgebung (siehe live_gruppen)
+        :return: list [[error_name, Partner (layer_key, id()), QgsGeometry, None], ...]
+        """
+        list_paare = []
+        geom_prepared = preparedGeometry(geom)
+        if geom.type() == QgsWkbTypes.PointGeometry:
+            bbox = geom.boundingBox().buffered(0.2)
+        else:
+            bbox = geom.boundingBox()
+        for other_key in live_gruppen[layer_key]:
+            if other_key not in self.stores.keys():
+                continue
+            other_store = self.stores[other_key]
+            for other_id in self.indexes[other_key].intersects(bbox):
+                if (other_key, other_id) == (layer_key, fid):
+                    continue
+                other_geom = other_store.geometry(other_id)
+                if geom_prepared.equals(other_geom, self.ignore_direction):
+                    list_paare.append(['geom_duplicate', (other_key, other_id), geom, None])
+                if (
+                    geom.type() == QgsWkbTypes.LineGeometry
+                    and geom_prepared.crosses(other_geom)
+                ):
+                    list_paare.append([
+                        'geom_crossings',
+                        (other_key, other_id),
+                        geom.intersection(other_geom),
+                        None
+                    ])
+        return list_paare
+
+    def check_event_on_river(self, layer_key, fid, geom):
+        """
+        :return: dict siehe check_location_event_on_river or None
+        """
+        layer_gew = self.stores['gewaesser']
+        spatial_index_gew = self.indexes['gewaesser']
+        is_point_layer = self.stores[layer_key].geometryType() == QgsWkbTypes.PointGeometry
+        if (
+            not is_point_layer
+            and not check_geometry_multi(geom, geom_empty=False)
+            and len(get_line_candidates_ids(geom, spatial_index_gew)) == 0
+        ):
+            return {'Lage': 1}  # kein Gewaesser in der Naehe
+        return check_location_event_on_river(
+            geom,
+            fid,
+            is_point_layer,
+            layer_gew,
+            spatial_index_gew
+        )
+
+    def check_key(self, layer_key, fid):
+        """
+        Fehlende, mehrfache und ungueltige Gewaesserschluessel
+        :return: list of error_name
+        """
+        store = self.stores[layer_key]
+        if store.fields().indexOf(self.ereign_gew_id_field) < 0:
+            return []
+        key = self.get_key(layer_key, fid)
+        if layer_key == 'gewaesser':
+            if key is None:
+                return ['primary_key_empty']
+            if len(self.key_index['gewaesser'].get(key, [])) > 1:
+                return ['primary_key_duplicat']
+            return []
+        if key is None:
+            return ['gew_key_empty']
+        if 'gewaesser' in self.key_index.keys() and key not in self.key_index['gewaesser'].keys():
+            return ['gew_key_invalid']
+        return []
+
+    def update_error_layer(self, changed):
+        """
+        Ersetzt die Fehler der geaenderten Objekte im Memory-Layer
+        :param set changed: {(layer_key, id()), ...}
+        """
+        provider = self.error_layer.dataProvider()
+        list_delete = []
+        list_features = []
+        list_key_fids = []
+        for key_fid in changed:
+            list_delete.extend(self.memory_ids.pop(key_fid, []))
+            layer_key, fid = key_fid
+            for error_name, partner, error_geom, text in self.fehler.get(key_fid, []):
+                feature = QgsFeature(self.error_layer.fields())
+                if text is None:
+                    text = get_fehler_text(error_name)
+                if partner is not None:
+                    text = text + ' (mit ' + output_layer_prefixes[partner[0]] + ' ' + str(partner[1]) + ')'
+                feature.setAttributes([output_layer_prefixes[layer_key], fid, text])
+                error_point = get_error_point(error_geom)
+                if error_point is not None:
+                    feature.setGeometry(error_point)
+                list_features.append(feature)
+                list_key_fids.append(key_fid)
+        if len(list_delete) > 0:
+            provider.deleteFeatures(list_delete)
+        if len(list_features) > 0:
+            _, list_added = provider.addFeatures(list_features)
+            for key_fid, feature in zip(list_key_fids, list_added):
+                self.memory_ids.setdefault(key_fid, []).append(feature.id())
+        self.error_layer.triggerRepaint()
@@ -49,6 +49,7 @@ from .stationierung_dialog import stationierungDialog
 from .oswegeToolsProvider import oswegeToolsProvider
 from .defaults import file_config_user
 from .config_tools import oswegeToolsConfigDialog
+from .live_pruefung import livePruefung
 
 cmd_folder = os.path.split(inspect.getfile(inspect.currentframe()))[0]
 
@@ -94,6 +95,7 @@ class oswege_tools_buttons:
         # Must be set in initGui() to survive plugin reloads
         self.first_start_stat = None
         self.first_start_config = None
+        self.live_pruefung = None
         
     def initProcessing(self):
         """Init Processing provider for QGIS >= 3.8."""
@@ -220,6 +222,16 @@ class oswege_tools_buttons:
             add_to_menu=False
         )
 
+        self.action_live = self.add_action(
+            icon_path_stat,
+            text=self.tr(u'Live-Prüfung beim Bearbeiten'),
+            callback=self.run_live_pruefung,
+            parent=self.iface.mainWindow(),
+            add_to_menu=False,
+            whats_this='Prüft die konfigurierten Layer bei jeder Änderung'
+        )
+        self.action_live.setCheckable(True)
+
 
         self.first_start_stat = True
         self.first_start_config = True
@@ -234,6 +246,9 @@ class oswege_tools_buttons:
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
         QgsApplication.processingRegistry().removeProvider(self.provider)
+        if self.live_pruefung is not None:
+            self.live_pruefung.stop()
+            self.live_pruefung = None
 
         for action in self.actions:
             self.iface.removePluginMenu(
@@ -260,3 +275,18 @@ class oswege_tools_buttons:
                 json_file=file_config_user
             )
         self.dlg_config.show()
+
+    def run_live_pruefung(self, checked):
+        """Startet oder beendet die Live-Pruefung"""
+        if self.live_pruefung is not None:
+            self.live_pruefung.stop()
+            self.live_pruefung = None
+        if checked:
+            self.live_pruefung = livePruefung()
+            if not self.live_pruefung.start():
+                self.live_pruefung = None
+                self.action_live.setChecked(False)
+                self.iface.messageBar().pushWarning(
+                    'Live-Prüfung',
+                    'Keiner der konfigurierten Layer ist im Projekt vorhanden'
+                )
@@ -0,0 +1,124 @@
+# Dieses Pythonskript enthaelt die Pipeline, mit der jeder Layer nur einmal durchlaufen wird
+import os
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait
+)
+
+
+class layerPipeline:
+    """
+    Durchlaeuft einen Layer genau einmal und uebergibt jedes Objekt an alle
+    registrierten Pruefungen
+    """
+    def __init__(self, layer, layer_steps, feedback):
+        """
+        :param featureStore layer
+        :param float layer_steps
+        :param QgsProcessingFeedback feedback
+        """
+        self.layer = layer
+        self.layer_steps = layer_steps
+        self.feedback = feedback
+        self.visitors = []  # [[description, visit_func, finish_func], ...]
+
+    def register(self, description, visit_func=None, finish_func=None):
+        """
+        Registriert eine Pruefung; die Funktionen werden in der Reihenfolge der
+        Registrierung aufgerufen
+        :param str description: Text fuer das Feedback
+        :param function visit_func: wird fuer jedes Objekt aufgerufen, visit_func(feature)
+        :param function finish_func: wird nach dem Durchlauf aufgerufen, finish_func()
+        """
+        self.visitors.append([description, visit_func, finish_func])
+
+    def run(self):
+        """
+        Durchlaeuft den Layer und schliesst danach alle Pruefungen ab
+        """
+        if len(self.visitors) == 0:
+            return
+        for description, visit_func, finish_func in self.visitors:
+            if description:
+                self.feedback.setProgressText(description)
+        visit_funcs = [visit_func for _, visit_func, _ in self.visitors if visit_func]
+        if len(visit_funcs) > 0:
+            for i, feature in enumerate(self.layer.getFeatures()):
+                self.feedback.setProgress(int((i+1) * self.layer_steps))
+                if self.feedback.isCanceled():
+                    break
+                for visit_func in visit_funcs:
+                    visit_func(feature)
+        for description, visit_func, finish_func in self.visitors:
+            if finish_func:
+                finish_func()
+        self.visitors = []
+
+
+class workerFeedback:
+    """
+    Feedback fuer eine Aufgabe im Thread-Pool: Texte werden gesammelt und nach Abschluss
+    gemeinsam ausgegeben, der Fortschritt wird im Haupt-Thread zusammengefasst und
+    der Abbruch des QgsProcessingFeedback gilt fuer alle Aufgaben
+    """
+    def __init__(self, feedback):
+        """
+        :param QgsProcessingFeedback feedback
+        """
+        self.feedback = feedback
+        self.progress = 0.0
+        self.messages = []  # [[Methode, Text], ...]
+
+    def isCanceled(self):
+        return self.feedback.isCanceled()
+
+    def setProgress(self, progress):
+        self.progress = progress
+
+    def setProgressText(self, text):
+        self.messages.append(['setProgressText', text])
+
+    def pushWarning(self, text):
+        self.messages.append(['pushWarning', text])
+
+    def pushInfo(self, text):
+        self.messages.append(['pushInfo', text])
+
+    def flush(self):
+        """
+        Gibt die gesammelten Texte im QgsProcessingFeedback aus (im Haupt-Thread aufrufen)
+        """
+        for method, text in self.messages:
+            getattr(self.feedback, method)(text)
+        self.messages = []
+
+
+def run_parallel(dict_tasks, feedback, max_workers=None):
+    """
+    Fuehrt unabhaengige Aufgaben in einem Thread-Pool aus
+    :param dict dict_tasks: {key: function(workerFeedback)}; in dieser Reihenfolge werden
+        die Texte ausgegeben
+    :param QgsProcessingFeedback feedback
+    :param int max_workers: default: Anzahl der Aufgaben, hoechstens Anzahl der Prozessoren
+    :return: dict {key: Rueckgabewert der Aufgabe}
+    """
+    if len(dict_tasks) == 0:
+        return {}
+    if max_workers is None:
+        max_workers = min(len(dict_tasks), os.cpu_count() or 1)
+    dict_workers = {key: workerFeedback(feedback) for key in dict_tasks.keys()}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dict_futures = {
+            key: executor.submit(func, dict_workers[key]) for key, func in dict_tasks.items()
+        }
+        pending = set(dict_futures.values())
+        while pending:
+            _, pending = wait(pending, timeout=0.2)
+            feedback.setProgress(
+                sum([worker.progress for worker in dict_workers.values()]) / len(dict_workers)
+            )
+    dict_results = {}
+    for key, future in dict_futures.items():
+        dict_workers[key].flush()
+        dict_results[key] = future.result()  # Fehler der Aufgabe werden hier ausgeloest
+    return dict_results
@@ -1,38 +1,22 @@
-from qgis.core import (
-    QgsGeometry
-)
-
-from .hilfsfunktionen import (
-    get_line_candidates_ids,
-    get_line_to_check
-)
-
-from .geometriepruefungen import check_vtx_distance
+from .geometrie_kernels import snap_points_to_segments
 
 # fuer alle
-def muendet_nicht_in_fg_2ordnung(
-    current_ft_fg,
-    spatial_index_fg,
-    layer_fg
-):
+def get_fg_nicht_in_fg_2ordnung(segments_fg):
     """
-    Ueberprueft, ob ein Objekt des Layers fg in ein anderes objekt des selben Layers muendet.
-    :param QgsFeature current_ft_fg
-    :param QgsSpatialIndex spatial_index_fg
-    :param QgsVectorLayer layer_fg
-    :return bool
+    Ermittelt in einem Schritt alle Objekte des Layers fg, die nicht in ein anderes Objekt
+    des selben Layers muenden: Der erste Stuetzpunkt liegt weiter als 1e-5 von allen
+    anderen Linien entfernt
+    :param dict segments_fg: Strecken des Layers fg, siehe get_layer_segments
+    :return: list der id() in der Reihenfolge des Layers
     """
-    current_ft_id = current_ft_fg.id()
-    vtx_muendung = QgsGeometry(current_ft_fg.geometry().vertexAt(0))
-    intersecting_candidates_1 = get_line_candidates_ids(vtx_muendung, spatial_index_fg)
-    if current_ft_id in intersecting_candidates_1:
-        # die eigene id() entfernen
-        intersecting_candidates_1.remove(current_ft_id)
-    intersecting_ids = [
-        ft_id for ft_id in intersecting_candidates_1 if check_vtx_distance(
-            layer_fg.getFeature(ft_id).geometry(),
-            vtx_muendung,
-            1e-5
-        )
-    ]
-    return len(intersecting_ids)==0  # True wenn keines schneidet
+    is_muendung = (segments_fg['part'] == 0) & (segments_fg['vtx'] == 0)
+    muendung_ids = segments_fg['fid'][is_muendung]
+    seg_idx, _, _ = snap_points_to_segments(
+        segments_fg['p0'][is_muendung],
+        segments_fg['p0'],
+        segments_fg['p1'],
+        1e-5,
+        point_ids=muendung_ids,
+        segment_ids=segments_fg['fid']
+    )
+    return muendung_ids[seg_idx < 0].tolist()  # keine andere Linie in der Naehe
@@ -0,0 +1,323 @@
+# Dieses Pythonskript enthaelt die Stapelpruefung ohne QGIS-Oberflaeche: viele Datensaetze
+# (je ein Geopackage) werden mit der Pruefroutine Gewaesserdaten in einem Prozess-Pool geprueft.
+# Aufruf (der Plugin-Ordner muss im PYTHONPATH liegen, QGIS_PREFIX_PATH wie in der QGIS-Installation):
+#   python -m oswege_tools.stapelpruefung <Ordner oder Manifest.csv> <Ausgabeordner> [--prozesse N]
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed
+)
+import multiprocessing
+import pandas as pd
+
+from qgis.core import (
+    QgsApplication,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsVectorLayer
+)
+
+from .check_gew_daten import checkGewaesserDaten
+from .config_tools import get_config_from_json
+from .defaults import (
+    file_config_user,
+    tabelle_fingerabdruecke,
+    tabelle_pruefparameter
+)
+from .kachel_pruefung import get_python_executable
+
+# Spalten des Manifests mit den Layernamen im Geopackage
+list_layer_keys = ['gewaesser', 'rohrleitungen', 'durchlaesse', 'wehre', 'schaechte']
+
+# Spalten der Zusammenfassung
+columns_zusammenfassung = [
+    'datei',
+    'reportdatei',
+    'status',
+    'dauer_s',
+    'anzahl_fehlerlayer',
+    'anzahl_fehler',
+    'hinweise'
+]
+
+qgs_app = None  # QgsApplication des Prozesses
+
+
+class stapelFeedback(QgsProcessingFeedback):
+    """
+    Sammelt die Warnungen und Fehlermeldungen der Pruefroutine fuer die Zusammenfassung
+    """
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def pushWarning(self, warning):
+        self.messages.append(warning)
+
+    def reportError(self, error, fatalError=False):
+        self.messages.append(error)
+
+
+def init_qgis():
+    """
+    Initialisiert QGIS und Processing einmal je Prozess (ohne Oberflaeche)
+    """
+    global qgs_app
+    if qgs_app is not None:
+        return
+    if 'QGIS_PREFIX_PATH' in os.environ.keys():
+        QgsApplication.setPrefixPath(os.environ['QGIS_PREFIX_PATH'], True)
+    qgs_app = QgsApplication([], False)
+    qgs_app.initQgis()
+    # Processing wird fuer das Zusammenfuehren von Rohrleitungen und Durchlaessen benoetigt
+    sys.path.append(os.path.join(QgsApplication.pkgDataPath(), 'python', 'plugins'))
+    from processing.core.Processing import Processing
+    Processing.initialize()
+
+
+def exit_qgis():
+    global qgs_app
+    if qgs_app is not None:
+        qgs_app.exitQgis()
+        qgs_app = None
+
+
+def get_datensaetze(eingabe, ausgabe_ordner, dict_layer_names):
+    """
+    Liste der Datensaetze aus einem Ordner (alle Geopackages) oder einem Manifest (CSV mit der
+    Spalte 'datei' und optional den Layernamen je Layer, z.B. 'gewaesser', und 'reportdatei')
+    :param str eingabe: Ordner oder Manifest
+    :param str ausgabe_ordner
+    :param dict dict_layer_names: {layer_key: Layername}, wenn im Manifest nicht angegeben
+    :return: list of dict {'datei': str, 'reportdatei': str, 'layer_names': dict}
+    """
+    if os.path.isdir(eingabe):
+        df_manifest = pd.DataFrame({
+            'datei': sorted([
+                fname for fname in os.listdir(eingabe) if fname.lower().endswith('.gpkg')
+            ])
+        })
+        basis_ordner = eingabe
+    else:
+        df_manifest = pd.read_csv(
+            eingabe,
+            sep=None,
+            engine='python',
+            dtype=str,
+            keep_default_na=False
+        )
+        if 'datei' not in df_manifest.columns:
+            raise ValueError('Das Manifest \"' + eingabe + '\" hat keine Spalte \"datei\"')
+        basis_ordner = os.path.dirname(os.path.abspath(eingabe))
+    list_datensaetze = []
+    list_reportdateien = []
+    for row in df_manifest.to_dict('records'):
+        datei = os.path.join(basis_ordner, row['datei'])
+        if os.path.abspath(os.path.dirname(datei)) == os.path.abspath(ausgabe_ordner):
+            continue  # Reportdateien einer frueheren Stapelpruefung
+        reportdatei = row.get('reportdatei', '')
+        if reportdatei == '':
+            reportdatei = os.path.splitext(os.path.basename(datei))[0] + '_report.gpkg'
+        reportdatei = os.path.join(ausgabe_ordner, reportdatei)
+        if reportdatei in list_reportdateien:
+            # gleiche Dateinamen aus verschiedenen Ordnern
+            reportdatei = (
+                os.path.splitext(reportdatei)[0] + '_' + str(len(list_datensaetze)+1) + '.gpkg'
+            )
+        list_reportdateien.append(reportdatei)
+        list_datensaetze.append({
+            'datei': datei,
+            'reportdatei': reportdatei,
+            'layer_names': {
+                layer_key: row.get(layer_key, '') or dict_layer_names.get(layer_key, '')
+                for layer_key in list_layer_keys
+            }
+        })
+    return list_datensaetze
+
+
+def count_errors(reportdatei):
+    """
+    Anzahl der Tabellen und Zeilen in der Reportdatei (ohne die Tabellen der inkrementellen Pruefung)
+    :param str reportdatei
+    :return: tuple (anzahl_fehlerlayer, anzahl_fehler)
+    """
+    if not os.path.exists(reportdatei):
+        return 0, 0  # keine Fehler, keine Reportdatei
+    from osgeo import ogr
+    datasource = ogr.Open(reportdatei)
+    anzahl_fehlerlayer = 0
+    anzahl_fehler = 0
+    for i in range(datasource.GetLayerCount()):
+        table = datasource.GetLayerByIndex(i)
+        if table.GetName() in [tabelle_fingerabdruecke, tabelle_pruefparameter]:
+            continue
+        anzahl_fehlerlayer += 1
+        anzahl_fehler += table.GetFeatureCount()
+    datasource = None
+    return anzahl_fehlerlayer, anzahl_fehler
+
+
+def check_datensatz(datensatz, dict_parameter):
+    """
+    Prueft einen Datensatz mit der Pruefroutine Gewaesserdaten (im Prozess des Pools)
+    :param dict datensatz: siehe get_datensaetze
+    :param dict dict_parameter: weitere Parameter der Pruefroutine, z.B. {'KACHELGROESSE': 1000}
+    :return: dict Zeile der Zusammenfassung (columns_zusammenfassung)
+    """
+    init_qgis()
+    import processing
+    zeit_start = time.perf_counter()
+    dict_zeile = {
+        'datei': datensatz['datei'],
+        'reportdatei': datensatz['reportdatei'],
+        'status': 'ok',
+        'anzahl_fehlerlayer': None,
+        'anzahl_fehler': None,
+        'hinweise': ''
+    }
+    feedback = stapelFeedback()
+    try:
+        algorithm = checkGewaesserDaten()
+        dict_param_layer = {
+            'gewaesser': algorithm.LAYER_GEWAESSER,
+            'rohrleitungen': algorithm.LAYER_ROHRLEITUNGEN,
+            'durchlaesse': algorithm.LAYER_DURCHLAESSE,
+            'wehre': algorithm.LAYER_WEHRE,
+            'schaechte': algorithm.LAYER_SCHAECHTE
+        }
+        parameters = dict(dict_parameter)
+        parameters[algorithm.REPORT] = datensatz['reportdatei']
+        if os.path.exists(datensatz['reportdatei']):
+            # ohne Fehler wird keine Reportdatei erstellt: kein veralteter Report
+            os.remove(datensatz['reportdatei'])
+        list_layers = []
+        for layer_key, layer_name in datensatz['layer_names'].items():
+            if layer_name == '':
+                if layer_key == 'gewaesser':
+                    raise ValueError('Kein Layername für die Gewässer angegeben')
+                continue
+            layer = QgsVectorLayer(
+                datensatz['datei'] + '|layername=' + layer_name,
+                layer_name,
+                'ogr'
+            )
+            if not layer.isValid():
+                raise ValueError(
+                    'Der Layer \"' + layer_name + '\" fehlt in \"' + datensatz['datei'] + '\"'
+                )
+            list_layers.append(layer)
+            parameters[dict_param_layer[layer_key]] = layer
+        processing.run(
+            algorithm,
+            parameters,
+            context=QgsProcessingContext(),
+            feedback=feedback
+        )
+        (
+            dict_zeile['anzahl_fehlerlayer'],
+            dict_zeile['anzahl_fehler']
+        ) = count_errors(datensatz['reportdatei'])
+    except Exception as e:  # der Fehler wird in der Zusammenfassung berichtet
+        dict_zeile['status'] = 'fehler'
+        feedback.messages.append(str(e))
+    dict_zeile['dauer_s'] = round(time.perf_counter() - zeit_start, 2)
+    dict_zeile['hinweise'] = ' | '.join([str(msg) for msg in feedback.messages])
+    return dict_zeile
+
+
+def run_stapelpruefung(list_datensaetze, dict_parameter, n_prozesse, ausgabe=print):
+    """
+    Prueft alle Datensaetze, je Datensatz in einem Prozess des Pools
+    :param list list_datensaetze: siehe get_datensaetze
+    :param dict dict_parameter: siehe check_datensatz
+    :param int n_prozesse: Anzahl der Prozesse; 0: nacheinander in diesem Prozess
+    :param function ausgabe: fuer Statusmeldungen
+    :return: pd.DataFrame Zusammenfassung (columns_zusammenfassung)
+    """
+    list_zeilen = [None] * len(list_datensaetze)  # in der Reihenfolge der Eingabe
+    n_fertig = 0
+    if n_prozesse == 0:
+        for i, datensatz in enumerate(list_datensaetze):
+            list_zeilen[i] = check_datensatz(datensatz, dict_parameter)
+            n_fertig += 1
+            ausgabe(
+                str(n_fertig) + '/' + str(len(list_datensaetze)) + ': '
+                + list_zeilen[i]['datei'] + ' (' + list_zeilen[i]['status'] + ')'
+            )
+        exit_qgis()
+    else:
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(get_python_executable())
+        with ProcessPoolExecutor(
+            max_workers=n_prozesse,
+            mp_context=context,
+            initializer=init_qgis
+        ) as executor:
+            dict_futures = {
+                executor.submit(check_datensatz, datensatz, dict_parameter): i
+                for i, datensatz in enumerate(list_datensaetze)
+            }
+            for future in as_completed(dict_futures.keys()):
+                i = dict_futures[future]
+                list_zeilen[i] = future.result()
+                n_fertig += 1
+                ausgabe(
+                    str(n_fertig) + '/' + str(len(list_datensaetze)) + ': '
+                    + list_zeilen[i]['datei'] + ' (' + list_zeilen[i]['status'] + ')'
+                )
+    return pd.DataFrame(list_zeilen, columns=columns_zusammenfassung)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Prüft viele Datensätze (Geopackages) mit der Prüfroutine Gewässerdaten'
+    )
+    parser.add_argument('eingabe', help='Ordner mit Geopackages oder Manifest (CSV, Spalte "datei")')
+    parser.add_argument('ausgabe', help='Ordner für die Reportdateien und die Zusammenfassung')
+    parser.add_argument(
+        '--prozesse',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Anzahl der Prozesse (0: nacheinander ohne Prozess-Pool)'
+    )
+    parser.add_argument(
+        '--layer',
+        action='append',
+        default=[],
+        metavar='LAYER_KEY=NAME',
+        help='Layername im Geopackage, z.B. gewaesser=gewaesser_linien (sonst aus der Konfiguration)'
+    )
+    parser.add_argument('--kachelgroesse', type=float, default=0, help='Kachelgröße in m (0: ohne Kacheln)')
+    parser.add_argument(
+        '--duplikate-richtung-ignorieren',
+        action='store_true',
+        help='Duplikate mit umgekehrter Stützpunktreihenfolge melden'
+    )
+    args = parser.parse_args(argv)
+
+    dict_layer_names = get_config_from_json(file_config_user)['layer_names']
+    for eintrag in args.layer:
+        layer_key, _, layer_name = eintrag.partition('=')
+        if layer_key not in list_layer_keys:
+            parser.error('Unbekannter Layer \"' + layer_key + '\" (' + ', '.join(list_layer_keys) + ')')
+        dict_layer_names[layer_key] = layer_name
+    os.makedirs(args.ausgabe, exist_ok=True)
+    list_datensaetze = get_datensaetze(args.eingabe, args.ausgabe, dict_layer_names)
+    dict_parameter = {
+        'KACHELGROESSE': args.kachelgroesse,
+        'DUPLIKATE_RICHTUNG': args.duplikate_richtung_ignorieren,
+        'PROZESSE': 0  # die Datensaetze werden bereits in Prozessen geprueft
+    }
+    df_zusammenfassung = run_stapelpruefung(list_datensaetze, dict_parameter, args.prozesse)
+    datei_zusammenfassung = os.path.join(args.ausgabe, 'zusammenfassung.csv')
+    df_zusammenfassung.to_csv(datei_zusammenfassung, sep=';', index=False)
+    print('Zusammenfassung: ' + datei_zusammenfassung)
+    return 0 if (df_zusammenfassung['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
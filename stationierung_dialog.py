@@ -31,9 +31,7 @@ from qgis.PyQt import QtWidgets
 from qgis.core import (
     Qgis,
     QgsCoordinateTransform,
-    QgsGeometry,
     QgsMapLayerProxyModel,
-    QgsPoint,
     QgsProject,
     QgsSnappingConfig,
     QgsTolerance,
@@ -59,6 +57,7 @@ from .defaults import (
 )
 
 from .config_tools import config_layer_if_in_project
+from .stationierung_index import get_stationierung_index
 
 # This loads your .ui file so that PyQt can populate your plugin with the elements from Qt Designer
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
@@ -165,6 +164,8 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
         self.setWindowFlags(Qt.WindowStaysOnTopHint)
         self.map_tool = None
         self.QgsInstance = QgsInstance
+        self.gew_index = None  # wird bei der ersten Abfrage geladen
+        self.connected_gew_layer = None
 
         # mit config probieren
         #print('start')
@@ -172,6 +173,7 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
         if dict_layer_defaults['gewaesser']:
             self.mMapLayerComboBox.setCurrentText(dict_layer_defaults['gewaesser'])
             self.gew_layer = self.mMapLayerComboBox.currentLayer()
+        self.connect_gew_layer()
         
          # canvas und Maptool-Ueberwachung
         self.canvas = canvas
@@ -231,6 +233,7 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
     def reset_gew_layer(self):
         self.gew_layer = self.mMapLayerComboBox.currentLayer()
         self.gew_FieldComboBox.setLayer(self.gew_layer)
+        self.connect_gew_layer()
         list_vlayers = [l for l in QgsInstance.mapLayers().values() if isinstance(l, QgsVectorLayer)]
         self.list_p_l_layer = [l for l in list_vlayers if l.geometryType() in [QgsWkbTypes.LineGeometry, QgsWkbTypes.PointGeometry]]
         self.list_p_l_layer_ohneGew = [l for l in self.list_p_l_layer if l != self.gew_layer]
@@ -238,6 +241,33 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
         self.mComboBox.clear()
         self.mComboBox.addItems(list_p_l_layer_ohneGew_names)
 
+    def connect_gew_layer(self):
+        """
+        Verwirft den Zwischenspeicher und ueberwacht Aenderungen am aktuellen Gewaesserlayer
+        """
+        if self.connected_gew_layer is not None:
+            try:
+                self.connected_gew_layer.dataChanged.disconnect(self.reset_gew_index)
+            except (TypeError, RuntimeError):
+                pass  # Layer wurde schon entfernt
+        self.connected_gew_layer = self.gew_layer
+        if self.gew_layer is not None:
+            self.gew_layer.dataChanged.connect(self.reset_gew_index)
+        self.reset_gew_index()
+
+    def reset_gew_index(self):
+        self.gew_index = None
+
+    def get_gew_index(self):
+        """
+        Gibt den Stationierungsindex des Gewaesserlayers zurueck, der erst bei Bedarf
+        geladen (oder erstellt) wird
+        :return: stationierungIndex
+        """
+        if self.gew_index is None:
+            self.gew_index = get_stationierung_index(self.gew_layer)
+        return self.gew_index
+
     def run_action(self):
         weitere_snaplayer_name = self.mComboBox.checkedItems()
         model = self.mComboBox.model()
@@ -263,6 +293,7 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
 
     def closeEvent(self, evnt):
         self.set_grey()
+        self.reset_gew_index()
         if self.connected_to_map_tool_changed:
             self.canvas.mapToolSet.disconnect(self.on_map_tool_changed)
             self.connected_to_map_tool_changed = False 
@@ -286,21 +317,11 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
         if target_crs != source_crs:
             transform = QgsCoordinateTransform(source_crs, target_crs, self.QgsInstance)
             clicked_point = transform.transform(clicked_point)
-        clicked_point_geom = QgsGeometry(QgsPoint(clicked_point.x(), clicked_point.y()))
-        l = [(i.id(), clicked_point_geom.distance(i.geometry())) for i in self.gew_layer.getFeatures()]
-        df = pd.DataFrame(l, columns=['id', 'dist'])
+        gew_index = self.get_gew_index()
+        # Abstand und Stationierung fuer alle Gewaesser (leere und NULL-Geometrien sind nicht im Index)
+        array_ids, array_dist, array_stat = gew_index.locate_point(clicked_point.x(), clicked_point.y())
+        df = pd.DataFrame({'id': array_ids, 'dist': array_dist, 'stat': array_stat})
         df = df.sort_values('dist', ignore_index=True)
-        df = df.loc[df['dist'] >= 0]  # -1 wird bei NULL-geometrien gesetzt
-        droplist = [] # damit leere geometrien rausgeworfen werden
-        for i in df.index:
-            id_i = df.loc[i,'id']
-            geom_i = self.gew_layer.getFeature(id_i).geometry()
-            if geom_i.isEmpty():
-                droplist.append(i)
-            if geom_i.isNull():
-                droplist.append(i)
-        droplist = list(set(droplist))
-        df = df.drop(droplist)
         df2 = df.loc[df['dist'] < findGew_tolerance_dist]
         if len(df2) > 0:
             pass  # ok
@@ -314,17 +335,8 @@ class stationierungDialog(QtWidgets.QDialog, FORM_CLASS):
         self.show_text = ''
         for i in df2.index:
             clicked_gew_ft_id = df2.loc[i,'id']
-            clicked_line_ft = self.gew_layer.getFeature(clicked_gew_ft_id)
-            result_tuple = clicked_line_ft.geometry().closestSegmentWithContext(clicked_point)
-            if clicked_line_ft.geometry().isMultipart():
-                clicked_line_geom = clicked_line_ft.geometry().asMultiPolyline()
-                first_segment = clicked_line_geom[0][:result_tuple[2]]+[result_tuple[1]]
-            else:
-                clicked_line_geom = clicked_line_ft.geometry().asPolyline()
-                first_segment = clicked_line_geom[:result_tuple[2]]+[result_tuple[1]]
-            first_segment = [QgsPoint(p) for p in first_segment]
-            first_segment_geom = QgsGeometry.fromPolyline(first_segment)
-            stationierung = round(first_segment_geom.length(),2)
+            clicked_line_ft = self.gew_layer.getFeature(int(clicked_gew_ft_id))
+            stationierung = round(df2.loc[i,'stat'],2)
             gew_name = clicked_line_ft.attribute(self.gew_FieldComboBox.currentText())
             self.show_text = (
                 self.show_text +
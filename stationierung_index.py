@@ -0,0 +1,239 @@
+# Dieses Pythonskript enthaelt den Stationierungsindex (lineare Referenzierung) der Gewaesser,
+# der als Dateien im NumPy-Format gespeichert und per Memory-Mapping geladen wird
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from qgis.core import QgsProviderRegistry
+
+from .geometrie_kernels import (
+    get_coords_parts,
+    lineReference
+)
+from .layer_cache import featureStore
+from .defaults import stationierung_index_ordner
+
+index_arrays = ['fids', 'offsets', 'coords', 'cum_len']
+# Version des Formats; gespeicherte Indizes einer anderen Version werden neu erstellt
+index_version = 2
+
+
+class stationierungIndex:
+    """
+    Stuetzpunkte und kumulierte Laengen aller Linienteile eines Layers in zusammenhaengenden
+    Arrays; der Teil i liegt in coords[offsets[i]:offsets[i+1]], die Teile einer Linie folgen
+    aufeinander (erster Teil zuerst)
+    """
+    def __init__(self, fids, offsets, coords, cum_len):
+        """
+        :param np.array fids: (m,) id() der Linie je Teil
+        :param np.array offsets: (m+1,)
+        :param np.array coords: (n, 2)
+        :param np.array cum_len: (n,) kumulierte Laenge je Stuetzpunkt innerhalb des Teils
+        """
+        self.fids = fids
+        self.offsets = offsets
+        self.coords = coords
+        self.cum_len = cum_len
+        # erster Teil je Linie
+        self.row_of_fid = {}
+        for i, fid in enumerate(fids.tolist()):
+            self.row_of_fid.setdefault(fid, i)
+        self.references = {}  # {id(): lineReference}
+        self.segments = None
+
+    @classmethod
+    def from_layer(cls, layer, feedback=None):
+        """
+        :param QgsVectorLayer or featureStore layer
+        :param QgsProcessingFeedback feedback
+        :return: stationierungIndex
+        """
+        list_fids = []
+        list_coords = []
+        list_cum_len = []
+        for feature in layer.getFeatures():
+            if feedback and feedback.isCanceled():
+                break
+            geom = feature.geometry()
+            if geom.isNull() or geom.isEmpty():
+                continue
+            for coords in get_coords_parts(geom):
+                if len(coords) == 0:
+                    continue
+                seg_len = np.hypot(*(coords[1:] - coords[:-1]).T)
+                list_fids.append(feature.id())
+                list_coords.append(coords)
+                list_cum_len.append(np.concatenate([[0.0], np.cumsum(seg_len)]))
+        offsets = np.zeros(len(list_coords) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(coords) for coords in list_coords])
+        if len(list_coords) == 0:
+            return cls(np.empty(0, dtype=np.int64), offsets, np.empty((0, 2)), np.empty(0))
+        return cls(
+            np.array(list_fids, dtype=np.int64),
+            offsets,
+            np.concatenate(list_coords),
+            np.concatenate(list_cum_len)
+        )
+
+    def save(self, index_dir, key):
+        """
+        Speichert die Arrays (.npy) und den Schluessel (key.json) im Ordner index_dir
+        :param str index_dir
+        :param dict key: siehe get_index_key
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        for name in index_arrays:
+            np.save(os.path.join(index_dir, name + '.npy'), getattr(self, name))
+        # key.json zuletzt schreiben: ein unvollstaendiger Index ist ungueltig
+        with open(os.path.join(index_dir, 'key.json'), 'w') as key_file:
+            json.dump(key, key_file)
+
+    @classmethod
+    def load(cls, index_dir, key):
+        """
+        Laedt den Index per Memory-Mapping, falls der gespeicherte Schluessel passt
+        :param str index_dir
+        :param dict key: siehe get_index_key
+        :return: stationierungIndex or None
+        """
+        try:
+            with open(os.path.join(index_dir, 'key.json')) as key_file:
+                if json.load(key_file) != key:
+                    return None
+            arrays = [
+                np.load(os.path.join(index_dir, name + '.npy'), mmap_mode='r')
+                for name in index_arrays
+            ]
+        except (OSError, ValueError):
+            return None
+        return cls(*arrays)
+
+    def get(self, feature_id):
+        """
+        Wie lineReference.from_geometry wird nur der erste Teil der Linie verwendet
+        :param int feature_id
+        :return: lineReference
+        """
+        if feature_id not in self.references.keys():
+            row = self.row_of_fid[int(feature_id)]
+            start, stop = self.offsets[row], self.offsets[row+1]
+            self.references[feature_id] = lineReference(
+                self.coords[start:stop],
+                self.cum_len[start:stop]
+            )
+        return self.references[feature_id]
+
+    def get_segments(self):
+        """
+        Strecken aller Teile (Teile mit einem Stuetzpunkt als Strecke der Laenge 0)
+        :return: tuple (row, idx_start, idx_end)
+        """
+        if self.segments is None:
+            n_vtx = np.diff(self.offsets)
+            n_seg = np.maximum(n_vtx - 1, 1)
+            row = np.repeat(np.arange(len(n_vtx)), n_seg)
+            seg_offsets = np.concatenate([[0], np.cumsum(n_seg)[:-1]]).astype(np.int64)
+            idx_start = self.offsets[:-1][row] + np.arange(len(row)) - seg_offsets[row]
+            idx_end = np.minimum(idx_start + 1, self.offsets[1:][row] - 1)
+            self.segments = (row, idx_start, idx_end)
+        return self.segments
+
+    def locate_point(self, x, y):
+        """
+        Abstand und Stationierung eines Punkts fuer alle Linien; der Abstand gilt fuer die
+        gesamte Linie (alle Teile), die Stationierung fuer den Teil mit dem naechsten Punkt
+        :param float x
+        :param float y
+        :return: tuple of np.array (fids, distances, stations)
+        """
+        if len(self.fids) == 0:
+            return self.fids, np.empty(0), np.empty(0)
+        row, idx_start, idx_end = self.get_segments()
+        p0 = self.coords[idx_start]
+        seg_vec = self.coords[idx_end] - p0
+        seg_len_sq = seg_vec[:, 0]**2 + seg_vec[:, 1]**2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = ((x - p0[:, 0])*seg_vec[:, 0] + (y - p0[:, 1])*seg_vec[:, 1]) / seg_len_sq
+        t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+        dist = np.hypot(p0[:, 0] + t*seg_vec[:, 0] - x, p0[:, 1] + t*seg_vec[:, 1] - y)
+        stat = self.cum_len[idx_start] + t*np.sqrt(seg_len_sq)
+        # je Linie die naechste Strecke
+        seg_fids = self.fids[row]
+        order = np.lexsort((dist, seg_fids))
+        first = order[np.concatenate([[0], np.nonzero(np.diff(seg_fids[order]))[0] + 1])]
+        return seg_fids[first], dist[first], stat[first]
+
+
+def get_index_key(layer):
+    """
+    Schluessel aus Datenquelle, Aenderungszeitpunkt und Groesse der Datei; bei Geopackages
+    auch der -wal-Datei, in der gespeicherte Aenderungen bis zum Checkpoint stehen (die
+    -shm-Datei aendert sich auch beim Lesen und wird nicht beruecksichtigt)
+    :param QgsVectorLayer layer
+    :return: dict or None, wenn die Quelle keine Datei ist oder ungespeicherte Aenderungen hat
+    """
+    if layer.isModified():
+        return None
+    uri_parts = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    path = uri_parts.get('path', '')
+    if not path or not os.path.isfile(path):
+        return None
+    dict_dateien = {}
+    for file_path in [path, path + '-wal']:
+        if os.path.isfile(file_path):
+            file_stat = os.stat(file_path)
+            dict_dateien[os.path.basename(file_path)] = [file_stat.st_mtime_ns, file_stat.st_size]
+    return {
+        'version': index_version,
+        'source': layer.source(),
+        'dateien': dict_dateien,
+        'feature_count': layer.featureCount()
+    }
+
+
+def get_index_dirs(layer):
+    """
+    Moegliche Speicherorte des Index: neben den Daten und im temp-Verzeichnis
+    :param QgsVectorLayer layer
+    :return: list of str
+    """
+    uri_parts = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    source_hash = hashlib.sha1(layer.source().encode('utf-8')).hexdigest()[:16]
+    return [
+        os.path.join(os.path.dirname(uri_parts['path']), stationierung_index_ordner, source_hash),
+        os.path.join(tempfile.gettempdir(), 'oswege_index', source_hash)
+    ]
+
+
+def get_stationierung_index(layer, feedback=None):
+    """
+    Laedt den gespeicherten Stationierungsindex oder erstellt (und speichert) ihn;
+    nach einem Abbruch wird der unvollstaendige Index nicht gespeichert
+    :param QgsVectorLayer or featureStore layer
+    :param QgsProcessingFeedback feedback
+    :return: stationierungIndex
+    """
+    if isinstance(layer, featureStore):
+        source_layer = layer.source_layer()
+    else:
+        source_layer = layer
+    key = get_index_key(source_layer)
+    if key is None:
+        return stationierungIndex.from_layer(layer, feedback)
+    list_index_dirs = get_index_dirs(source_layer)
+    for index_dir in list_index_dirs:
+        index = stationierungIndex.load(index_dir, key)
+        if index is not None:
+            return index
+    index = stationierungIndex.from_layer(layer, feedback)
+    if feedback and feedback.isCanceled():
+        return index  # unvollstaendig, nicht speichern
+    for index_dir in list_index_dirs:
+        try:
+            index.save(index_dir, key)
+            break
+        except OSError:
+            continue  # nicht beschreibbar
+    return index
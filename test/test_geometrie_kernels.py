@@ -0,0 +1,80 @@
+# Tests der vektorisierten Geometriefunktionen (nur NumPy, ohne QGIS)
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from geometrie_kernels import (
+    find_self_intersections,
+    snap_points_to_segments
+)
+
+
+def snap_brute_force(points, p0, p1, max_distance):
+    """
+    Vergleichswerte: Abstand jedes Punkts zu jeder Strecke
+    """
+    seg_vec = p1 - p0
+    d = points[:, None, :] - p0[None, :, :]
+    seg_len_sq = (seg_vec**2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (d*seg_vec[None, :, :]).sum(axis=2) / seg_len_sq[None, :]
+    t = np.clip(np.nan_to_num(t, nan=0.0), 0, 1)
+    dist = np.hypot(*(d - t[:, :, None]*seg_vec[None, :, :]).transpose(2, 0, 1))
+    seg_idx = np.argmin(dist, axis=1)
+    distances = dist[np.arange(len(points)), seg_idx]
+    seg_idx[distances > max_distance] = -1
+    return seg_idx, distances
+
+
+class snapPointsToSegmentsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        # 1000 kurze Strecken und eine lange Diagonale (7 km)
+        p0 = rng.uniform(0, 7000, (1000, 2))
+        p1 = p0 + rng.uniform(-5, 5, (1000, 2))
+        self.p0 = np.vstack([p0, [[0.0, 0.0]]])
+        self.p1 = np.vstack([p1, [[7000.0, 7000.0]]])
+
+    def test_long_diagonal_segment_memory(self):
+        points = np.column_stack([np.linspace(100, 6900, 10), np.linspace(100, 6900, 10) + 0.5])
+        tracemalloc.start()
+        seg_idx, distances, t = snap_points_to_segments(points, self.p0, self.p1, 1.0)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertLess(peak, 50 * 1024**2)
+        expected_idx, expected_dist = snap_brute_force(points, self.p0, self.p1, 1.0)
+        np.testing.assert_array_equal(seg_idx, expected_idx)
+        np.testing.assert_allclose(distances, expected_dist)
+        self.assertTrue((seg_idx == len(self.p0) - 1).all())
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(2)
+        points = rng.uniform(0, 7000, (500, 2))
+        points[:50] = self.p0[:50] + rng.uniform(-2, 2, (50, 2))
+        seg_idx, distances, t = snap_points_to_segments(points, self.p0, self.p1, 3.0)
+        expected_idx, expected_dist = snap_brute_force(points, self.p0, self.p1, 3.0)
+        found = expected_idx >= 0
+        np.testing.assert_array_equal(seg_idx, expected_idx)
+        np.testing.assert_allclose(distances[found], expected_dist[found])
+
+
+class findSelfIntersectionsTest(unittest.TestCase):
+
+    def test_sicher_und_grenzfaelle(self):
+        dict_parts = {
+            1: [np.array([[0, 0], [1, 0], [2, 1.]])],  # einfach
+            2: [np.array([[0, 0], [2, 2], [2, 0], [0, 2.]])],  # Kreuzung
+            3: [np.array([[0, 0], [2, 0], [2, 1], [1, 1e-12], [1, -1.]])],  # Beruehrung innerhalb der Toleranz
+            4: [np.array([[0, 0], [1, 0.]]), np.array([[1, 0], [2, 1.]])],  # Teile mit gleichem Endpunkt
+            5: [np.array([[0, 0], [1, 0], [1, 1], [0, 0.]])],  # geschlossen
+            6: [np.array([[0, 0], [2, 0], [1, 0.]])]  # Ueberlagerung
+        }
+        not_simple, grenzfaelle = find_self_intersections(dict_parts)
+        self.assertEqual(not_simple, [2])
+        self.assertEqual(grenzfaelle, [3, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()